@@ -0,0 +1,685 @@
+#!/usr/bin/env python3
+"""
+Benchmarki wydajności Portainer Templates Converter
+
+Generują syntetyczne katalogi szablonów v2 i mierzą czas oraz szczytowe
+zużycie pamięci (tracemalloc) wybranych etapów konwersji.
+
+Użycie:
+    python benchmark.py --list
+    python benchmark.py stream-ingest --count 100000
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from portainer_converter import PortainerTemplateConverter, iter_json_array_items
+from patches._patch_loader import PatchLoader
+
+CATEGORIES = ['Web', 'Tools', 'Media', 'Networking', 'Security', 'Database', 'Monitoring']
+
+
+def make_v2_template(i: int, rng: random.Random) -> Dict[str, Any]:
+    """Tworzy syntetyczny szablon v2 podobny do szablonów z prawdziwych źródeł"""
+    name = f"app-{i}"
+    return {
+        'type': 1,
+        'title': f"App {i}",
+        'name': name,
+        'description': f"Synthetic application number {i} " + 'lorem ipsum ' * rng.randint(1, 8),
+        'categories': rng.sample(CATEGORIES, rng.randint(1, 3)),
+        'platform': 'linux',
+        'logo': f"https://example.com/logos/{name}.png",
+        'image': f"example/{name}:latest",
+        'restart_policy': 'unless-stopped',
+        'ports': [f"{8000 + i % 1000}:80/tcp"],
+        'volumes': [{'container': '/config', 'bind': f"/opt/{name}/config"}],
+        'env': [
+            {'name': 'PUID', 'label': 'PUID', 'default': '1000'},
+            {'name': 'PGID', 'label': 'PGID', 'default': '1000'},
+            {'name': 'TZ', 'label': 'Timezone', 'default': 'Europe/Warsaw'},
+        ],
+    }
+
+
+def make_v2_catalog(count: int, seed: int = 42) -> Dict[str, Any]:
+    """Tworzy syntetyczny katalog v2 z `count` szablonami"""
+    rng = random.Random(seed)
+    return {'version': '2', 'templates': [make_v2_template(i, rng) for i in range(count)]}
+
+
+def measure(label: str, func: Callable[[], Any]) -> Dict[str, Any]:
+    """Mierzy czas i szczytowe zużycie pamięci wywołania func()"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {'label': label, 'seconds': elapsed, 'peak_mb': peak / (1024 * 1024)}
+    print(f"   • {label:<40} {elapsed:8.3f}s   szczyt pamięci: {result['peak_mb']:9.1f} MB")
+    return result
+
+
+def bench_stream_ingest(args) -> List[Dict[str, Any]]:
+    """
+    Pełne json.load() vs strumieniowe parsowanie tablicy 'templates' - oba
+    warianty wykonują całą konwersję (deduplikacja, ID) i zapisują plik v3
+    """
+    import hashlib
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'templates_v2.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(make_v2_catalog(args.count), f)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"📦 Katalog syntetyczny: {args.count} szablonów, {size_mb:.1f} MB")
+
+        converter = PortainerTemplateConverter()
+        outputs = {'full': os.path.join(tmp, 'out-full.json'), 'stream': os.path.join(tmp, 'out-stream.json')}
+
+        def full_load():
+            with open(path, 'rb') as f:
+                data = json.loads(f.read())
+            with contextlib.redirect_stdout(io.StringIO()):
+                converter.save_v3_templates(converter.convert_v2_to_v3(data), outputs['full'])
+
+        def streaming():
+            with open(path, 'rb') as f, contextlib.redirect_stdout(io.StringIO()):
+                chunks = iter(lambda: f.read(64 * 1024), b'')
+                v3_data = converter.iter_convert_v2_to_v3({'templates': iter_json_array_items(chunks)})
+                converter.save_v3_templates(v3_data, outputs['stream'])
+
+        results = [
+            measure('json.load + konwersja + zapis', full_load),
+            measure('strumieniowo + konwersja + zapis', streaming),
+        ]
+        digests = set()
+        for output in outputs.values():
+            with open(output, 'rb') as f:
+                digests.add(hashlib.sha256(f.read()).hexdigest())
+        print(f"     plik {'identyczny' if len(digests) == 1 else 'RÓŻNY'} w obu wariantach")
+        return results
+
+
+def make_duplicated_v3_templates(count: int, duplicate_ratio: float = 0.5, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Tworzy szablony v3, z których `duplicate_ratio` to duplikaty nazw
+    (kolejne duplikaty są coraz bardziej kompletne, więc wypierają poprzednie)
+    """
+    rng = random.Random(seed)
+    converter = PortainerTemplateConverter()
+    unique = max(1, int(count * (1 - duplicate_ratio)))
+    templates = []
+    for i in range(count):
+        template = converter.convert_template(make_v2_template(i % unique, rng), i + 1)
+        template['categories'] = template['categories'] + [f"extra-{n}" for n in range(i // unique)]
+        templates.append(template)
+    rng.shuffle(templates)
+    return templates
+
+
+def bench_dedup(args) -> List[Dict[str, Any]]:
+    """Skalowanie deduplicate_templates przy 50% duplikatów"""
+    converter = PortainerTemplateConverter()
+    results = []
+    for count in (args.count // 4, args.count // 2, args.count):
+        templates = make_duplicated_v3_templates(count)
+        result = measure(f"deduplikacja {count} szablonów", lambda: converter.deduplicate_templates(templates))
+        print(f"     {result['seconds'] / count * 1e6:.2f} µs / szablon")
+        results.append(result)
+    return results
+
+
+def make_aliased_sources(count: int, seed: int = 42) -> List[Any]:
+    """
+    Dwa źródła po `count` / 2 szablonów v2; połowa szablonów drugiego źródła
+    to szablony pierwszego z obrazem zapisanym inaczej (docker.io/..., bez tagu)
+    """
+    rng = random.Random(seed)
+    half = count // 2
+    first = [make_v2_template(i, rng) for i in range(half)]
+    second = []
+    for i in range(half):
+        if i % 2:
+            template = make_v2_template(half + i, rng)
+        else:
+            template = make_v2_template(i, rng)
+            template['image'] = f"docker.io/example/app-{i}" if i % 4 else f"example/app-{i}"
+        second.append(template)
+    return [('a', {'templates': first}), ('b', {'templates': second})]
+
+
+def bench_merge_images(args) -> List[Dict[str, Any]]:
+    """Skalowanie merge_templates z kluczem dosłownym i znormalizowanym obrazem (--normalize-images)"""
+    converter = PortainerTemplateConverter()
+    results = []
+    for count in (args.count // 4, args.count // 2, args.count):
+        for normalize in (False, True):
+            sources = make_aliased_sources(count)
+            converter.normalize_images = normalize
+            output = {}
+
+            def merge():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    output['data'], output['stats'] = converter.merge_templates(sources)
+
+            label = f"scalanie {count} szablonów{' (normalizacja)' if normalize else ''}"
+            result = measure(label, merge)
+            print(f"     {result['seconds'] / count * 1e6:.2f} µs / szablon, "
+                  f"po scaleniu: {output['stats']['total_after']}")
+            results.append(result)
+    return results
+
+
+def make_v3_templates(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Tworzy `count` przekonwertowanych szablonów v3"""
+    converter = PortainerTemplateConverter()
+    rng = random.Random(seed)
+    return [converter.convert_template(make_v2_template(i, rng), i + 1) for i in range(count)]
+
+
+def make_near_duplicate_templates(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    `count` szablonów v3, z czego co dziesiąty to kopia wcześniejszego
+    z innym tytułem (ten sam obraz, podobieństwo Jaccarda ok. 0.88)
+    """
+    templates = make_v3_templates(count - count // 10, seed)
+    for i in range(count // 10):
+        fork = copy.deepcopy(templates[i * 9])
+        fork['title'] += f" Fork{i}"
+        templates.append(fork)
+    return templates
+
+
+def bench_near_duplicates(args) -> List[Dict[str, Any]]:
+    """Skalowanie etapu prawie-duplikatów MinHash + LSH (--near-duplicates)"""
+    converter = PortainerTemplateConverter()
+    converter.near_duplicate_threshold = 0.8
+    results = []
+    for count in (args.count // 4, args.count // 2, args.count):
+        templates = make_near_duplicate_templates(count)
+
+        def detect():
+            with contextlib.redirect_stdout(io.StringIO()):
+                converter.remove_near_duplicates(templates)
+
+        # Czas bez tracemalloc (śledzenie alokacji spowalnia MinHash kilkanaście razy),
+        # szczyt pamięci tylko dla najmniejszego katalogu
+        started = time.perf_counter()
+        detect()
+        elapsed = time.perf_counter() - started
+        label = f"prawie-duplikaty {count} szablonów"
+        print(f"   • {label:<40} {elapsed:8.3f}s")
+        stats = converter.near_duplicate_stats
+        print(f"     {elapsed / count * 1e6:.1f} µs / szablon, klastry: {stats['clusters']} "
+              f"z {count // 10}, kandydaci LSH: {stats['candidates']}, weryfikacje: {stats['estimated']}")
+        results.append({'label': label, 'seconds': elapsed})
+        if not results[:-1]:
+            results.append(measure(f"{label} (pamięć)", detect))
+    return results
+
+
+def make_patches(count: int, templates_count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Tworzy `count` patch-y, każdy z operacjami UPDATE po nazwie,
+    UPDATE z wildcardem image i REMOVE po id
+    """
+    rng = random.Random(seed)
+    patches = []
+    for i in range(count):
+        target = rng.randrange(templates_count)
+        patches.append({
+            'metadata': {'version': '1', 'id': f"{i:04d}-bench", 'title': f"Bench {i}", 'description': 'bench'},
+            'operations': [
+                {'operation': 'update', 'filter': {'name': f"APP-{target}"}, 'changes': {'note': f"patched {i}"}},
+                {'operation': 'update', 'filter': {'image': f"example/app-{target}*"},
+                 'changes': {'env': [{'name': 'TZ', 'label': 'Timezone', 'default': 'UTC'}]}},
+                {'operation': 'remove', 'filter': {'id': rng.randrange(1, templates_count + 1)}},
+            ]
+        })
+    return patches
+
+
+def apply_patch_set(patches: List[Dict[str, Any]], templates: List[Dict[str, Any]]) -> Any:
+    """Aplikuje patch-e nowym PatchLoaderem bez wypisywania postępu"""
+    loader = PatchLoader(patches_dir=tempfile.gettempdir())
+    loader.patches = patches
+    with contextlib.redirect_stdout(io.StringIO()):
+        return loader.apply_patches(templates)
+
+
+def bench_patches(args) -> List[Dict[str, Any]]:
+    """Aplikowanie patchy-ów (UPDATE/REMOVE z filtrami) na dużym katalogu"""
+    results = []
+    for patches_count in (50, 200):
+        templates = make_v3_templates(args.count)
+        patches = make_patches(patches_count, args.count)
+        results.append(measure(f"{patches_count} patch-y × {args.count} szablonów",
+                               lambda: apply_patch_set(patches, templates)))
+    return results
+
+
+def make_add_merge_patches(adds: int, env_size: int, templates_count: int) -> List[Dict[str, Any]]:
+    """
+    Tworzy patch z `adds` operacjami ADD (co druga z istniejącym ID)
+    i UPDATE scalającymi listy env po `env_size` elementów
+    """
+    env = [{'name': f"VAR_{n}", 'label': f"Var {n}", 'default': str(n)} for n in range(env_size)]
+    operations = []
+    for i in range(adds):
+        template_id = templates_count + i if i % 2 else i + 1
+        operations.append({'operation': 'add', 'template': {
+            'id': template_id, 'type': 1, 'title': f"Added {i}", 'name': f"added-{i}", 'image': f"added/{i}:latest",
+        }})
+    for target in range(1, 11):
+        operations.append({'operation': 'update', 'filter': {'id': target}, 'changes': {'env': env}})
+        operations.append({'operation': 'update', 'filter': {'id': target},
+                           'changes': {'env': [dict(reversed(list(item.items()))) for item in env]}})
+    return [{
+        'metadata': {'version': '1', 'id': '0001-bench-add', 'title': 'Bench ADD', 'description': 'bench'},
+        'operations': operations,
+    }]
+
+
+def bench_patch_add_merge(args) -> List[Dict[str, Any]]:
+    """Tysiące operacji ADD i scalanie dużych list env w UPDATE"""
+    results = []
+    for adds, env_size in ((1000, 1000), (5000, 5000)):
+        templates = make_v3_templates(args.count)
+        patches = make_add_merge_patches(adds, env_size, args.count)
+        results.append(measure(f"{adds} ADD + env {env_size} × {args.count} szablonów",
+                               lambda: apply_patch_set(patches, templates)))
+    return results
+
+
+def bench_patch_bundle(args) -> List[Dict[str, Any]]:
+    """Ładowanie kilkuset patch files: bez cache, z bundle i po zmianie jednego pliku"""
+    files_count = 300
+    with tempfile.TemporaryDirectory() as patches_dir, tempfile.TemporaryDirectory() as cache_dir:
+        rng = random.Random(42)
+        converter = PortainerTemplateConverter()
+        for i, patch in enumerate(make_patches(files_count, args.count)):
+            # Jak w prawdziwym patches/ - głównie ADD z pełnymi szablonami
+            for n in range(10):
+                template = converter.convert_template(make_v2_template(args.count + i * 10 + n, rng), 0)
+                template['id'] = args.count + i * 10 + n
+                patch['operations'].append({'operation': 'add', 'template': template})
+            with open(os.path.join(patches_dir, f"{patch['metadata']['id']}.json"), 'w', encoding='utf-8') as f:
+                json.dump(patch, f, indent=2)
+        print(f"📦 {files_count} patch files po {len(patch['operations'])} operacji")
+
+        def load(use_cache: bool) -> Callable[[], Any]:
+            def run():
+                # Jak w run(): odcisk patchy-ów do manifestu budowania + ładowanie
+                loader = PatchLoader(patches_dir=patches_dir, cache_dir=cache_dir if use_cache else None)
+                loader.fingerprint()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    loader.load_patches()
+            return run
+
+        results = [measure('bez cache', load(False)), measure('zimny start (budowa bundle)', load(True)),
+                   measure('ciepły start (bundle)', load(True))]
+
+        changed = os.path.join(patches_dir, f"{files_count // 2:04d}-bench.json")
+        with open(changed, 'a', encoding='utf-8') as f:
+            f.write('\n')
+        results.append(measure('po zmianie jednego pliku', load(True)))
+        return results
+
+
+def bench_patch_memo(args) -> List[Dict[str, Any]]:
+    """Pamięć wyników patchy-ów: bez pamięci, zimny start, ciepły start i zmiana jednego patch-a"""
+    templates = make_v3_templates(args.count)
+    patches = make_patches(200, args.count)
+    rng = random.Random(7)
+    for patch in patches:
+        # Filtry na polach bez indeksu - plan sprawdza je dla każdego szablonu
+        target = rng.randrange(args.count)
+        patch['operations'].append({'operation': 'update',
+                                    'filter': {'logo': f"https://example.com/logos/app-{target}.png"},
+                                    'changes': {'note': 'logo'}})
+    print(f"📦 {len(patches)} patch-y po {len(patches[0]['operations'])} operacje × {args.count} szablonów")
+
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label, use_memo in (('bez pamięci wyników', False), ('zimny start (zapis pamięci)', True),
+                                ('ciepły start (odtworzenie)', True), ('po zmianie jednego patch-a', True)):
+            if label.startswith('po zmianie'):
+                patches[len(patches) // 2]['operations'][0]['changes'] = {'note': 'changed'}
+            copies = copy.deepcopy(templates)
+
+            def run():
+                loader = PatchLoader(patches_dir=tempfile.gettempdir(), cache_dir=cache_dir if use_memo else None)
+                loader.patches = patches
+                with contextlib.redirect_stdout(io.StringIO()):
+                    loader.apply_patches(copies)
+
+            results.append(measure(label, run))
+    return results
+
+
+def bench_schema_validation(args) -> List[Dict[str, Any]]:
+    """Walidacja JSON Schema: Draft7Validator całego dokumentu vs skompilowany walidator szablonów"""
+    from jsonschema import Draft7Validator
+    from schema_validator import SchemaValidator
+
+    converter = PortainerTemplateConverter()
+    schema = converter.load_schema()
+    results = []
+    for count in (args.count // 10, args.count):
+        document = {'version': '3', 'templates': make_v3_templates(count)}
+        results.append(measure(f"Draft7Validator × {count} szablonów",
+                               lambda: list(Draft7Validator(schema).iter_errors(document))))
+        results.append(measure(f"skompilowany × {count} szablonów",
+                               lambda: list(SchemaValidator(schema).iter_errors(document, 10))))
+    return results
+
+
+def bench_validation_jobs(args) -> List[Dict[str, Any]]:
+    """validate_v3_format (schema + sprawdzenia biznesowe) w 1/2/4 procesach"""
+    document = {'version': '3', 'templates': make_v3_templates(args.count)}
+    results = []
+    for jobs in (1, 2, 4):
+        converter = PortainerTemplateConverter()
+        converter.validation_jobs = jobs
+
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                converter.validate_v3_format(document)
+
+        results.append(measure(f"--jobs {jobs} × {args.count} szablonów", run))
+    return results
+
+
+def bench_incremental(args) -> List[Dict[str, Any]]:
+    """Pełne budowanie run() vs --incremental: pierwsze, bez zmian w szablonach i po zmianie jednego"""
+    catalog = make_v2_catalog(args.count)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'templates.json')
+        output_file = os.path.join(tmp, 'out.json')
+
+        def build(label: str, incremental: bool, **dump_options) -> Dict[str, Any]:
+            with open(source, 'w', encoding='utf-8') as f:
+                json.dump(catalog, f, **dump_options)
+            converter = PortainerTemplateConverter()
+            converter.cache_dir = os.path.join(tmp, 'cache')
+            converter.incremental = incremental
+
+            def run():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    converter.run(source_url=source, output_file=output_file)
+            return measure(label, run)
+
+        results.append(build('pełne budowanie', False))
+        results.append(build('--incremental (pierwsze)', True))
+        # Inne bajty źródła (formatowanie), te same szablony - --skip-unchanged tu nie pomaga
+        results.append(build('--incremental bez zmian w szablonach', True, indent=2))
+        catalog['templates'][args.count // 2]['description'] = 'changed'
+        results.append(build('--incremental po zmianie jednego', True, indent=2))
+    return results
+
+
+def bench_checkpoints(args) -> List[Dict[str, Any]]:
+    """run() z --checkpoint i --resume: po błędzie zapisu i po dodaniu patch-a"""
+    import shutil
+
+    catalog = make_v2_catalog(args.count)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'templates.json')
+        with open(source, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f)
+        patches_dir = os.path.join(tmp, 'patches')
+        shutil.copytree(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'patches'), patches_dir)
+
+        def build(label: str, checkpoints: bool, resume: bool = False, fail_write: bool = False) -> Dict[str, Any]:
+            converter = PortainerTemplateConverter()
+            converter.cache_dir = os.path.join(tmp, 'cache')
+            # Bez cache źródeł, pamięci patchy-ów i walidacji - mierzone są same checkpointy
+            converter.use_cache = False
+            converter.patch_loader = PatchLoader(patches_dir=patches_dir)
+            converter.checkpoints = checkpoints
+            converter.resume = resume
+            if fail_write:
+                def save_v3_templates(*_):
+                    raise OSError('disk full')
+                converter.save_v3_templates = save_v3_templates
+
+            def run():
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(SystemExit):
+                    converter.run(source_url=source, output_file=os.path.join(tmp, 'out.json'))
+            return measure(label, run)
+
+        results.append(build('pełne budowanie', False))
+        results.append(build('bez checkpointów (błąd zapisu)', False, fail_write=True))
+        results.append(build('--checkpoint (błąd zapisu)', True, fail_write=True))
+        results.append(build('--resume po błędzie zapisu', True, resume=True))
+        patch = make_patches(1, args.count)[0]
+        with open(os.path.join(patches_dir, 'zz-bench.json'), 'w', encoding='utf-8') as f:
+            json.dump(patch, f)
+        results.append(build('--resume po dodaniu patch-a', True, resume=True))
+    return results
+
+
+def bench_convert_jobs(args) -> List[Dict[str, Any]]:
+    """convert_v2_to_v3 w 1/2/4/8 procesach; wynik musi być identyczny bajt w bajt"""
+    import hashlib
+
+    catalog = make_v2_catalog(args.count)
+    results = []
+    expected = None
+    for jobs in (1, 2, 4, 8):
+        converter = PortainerTemplateConverter()
+        converter.conversion_jobs = jobs
+        v2_data = copy.deepcopy(catalog)
+        converted = {}
+
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                converted['v3'] = converter.convert_v2_to_v3(v2_data)
+
+        results.append(measure(f"--convert-jobs {jobs} × {args.count} szablonów", run))
+        digest = hashlib.sha256(''.join(converter.iter_v3_json(converted['v3'])).encode('utf-8')).hexdigest()
+        expected = expected or digest
+        print(f"     wynik {'identyczny' if digest == expected else 'RÓŻNY'} z konwersją szeregową")
+    return results
+
+
+def bench_stream_pipeline(args) -> List[Dict[str, Any]]:
+    """run() na listach vs potok strumieniowy (--stream) z dwóch źródeł; plik musi być identyczny"""
+    import hashlib
+
+    catalog = make_v2_catalog(args.count)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Dwa źródła, ~10% szablonów w obu - scalanie i deduplikacja mają co robić
+        half = args.count // 2
+        sources = [os.path.join(tmp, 'a.json'), os.path.join(tmp, 'b.json')]
+        for source, templates in zip(sources, (catalog['templates'][:half + args.count // 10],
+                                               catalog['templates'][half:])):
+            with open(source, 'w', encoding='utf-8') as f:
+                json.dump({'version': '2', 'templates': templates}, f)
+        del catalog, templates
+
+        digests = {}
+        for stream in (False, True):
+            converter = PortainerTemplateConverter()
+            converter.use_cache = False
+            converter.stream = stream
+            output_file = os.path.join(tmp, f"out-{int(stream)}.json")
+
+            def run():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    converter.run(multiple_sources=sources, output_file=output_file)
+
+            results.append(measure('--stream (potok strumieniowy)' if stream else 'listy (domyślnie)', run))
+            with open(output_file, 'rb') as f:
+                digests[stream] = hashlib.sha256(f.read()).hexdigest()
+        print(f"     plik {'identyczny' if digests[True] == digests[False] else 'RÓŻNY'} w obu trybach, "
+              f"szczyt pamięci: {results[1]['peak_mb'] / results[0]['peak_mb']:.0%} ścieżki listowej")
+    return results
+
+
+def bench_compact_model(args) -> List[Dict[str, Any]]:
+    """Szablony v3 jako słowniki vs model zwarty (template_model) oraz run() z --compact"""
+    import gc
+    import hashlib
+    from template_model import CompactTemplateList
+
+    converter = PortainerTemplateConverter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        encoded = json.dumps(converter.convert_v2_to_v3(make_v2_catalog(args.count))['templates'])
+    results = []
+    held = {}
+
+    def retained(label: str, func: Callable[[], Any]) -> Dict[str, Any]:
+        # Pamięć zajęta przez wynik po zakończeniu (nie szczyt w trakcie)
+        gc.collect()
+        tracemalloc.start()
+        started = time.perf_counter()
+        held['value'] = func()
+        elapsed = time.perf_counter() - started
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"   • {label:<40} {elapsed:8.3f}s   zajęta pamięć:  {current / (1024 * 1024):9.1f} MB")
+        return {'label': label, 'seconds': elapsed, 'retained_mb': current / (1024 * 1024)}
+
+    results.append(retained(f"{args.count} szablonów jako słowniki", lambda: json.loads(encoded)))
+    held.pop('value')
+    results.append(retained('model zwarty (parsowanie + kompaktowanie)',
+                            lambda: CompactTemplateList.from_list(json.loads(encoded))))
+    compact = held.pop('value')
+    started = time.perf_counter()
+    identical = json.dumps(list(compact)) == encoded
+    print(f"     odtworzenie słowników: {time.perf_counter() - started:.3f}s, "
+          f"wynik {'identyczny' if identical else 'RÓŻNY'}")
+    del compact
+
+    with tempfile.TemporaryDirectory() as tmp:
+        half = args.count // 2
+        catalog = make_v2_catalog(args.count)
+        sources = [os.path.join(tmp, 'a.json'), os.path.join(tmp, 'b.json')]
+        for source, templates in zip(sources, (catalog['templates'][:half], catalog['templates'][half:])):
+            with open(source, 'w', encoding='utf-8') as f:
+                json.dump({'version': '2', 'templates': templates}, f)
+        del catalog, templates
+
+        digests = []
+        for compact in (False, True):
+            converter = PortainerTemplateConverter()
+            converter.use_cache = False
+            converter.compact = compact
+            output_file = os.path.join(tmp, f"out-{int(compact)}.json")
+
+            def run():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    converter.run(multiple_sources=sources, output_file=output_file)
+
+            results.append(measure('run() --compact' if compact else 'run() na słownikach', run))
+            with open(output_file, 'rb') as f:
+                digests.append(hashlib.sha256(f.read()).hexdigest())
+        print(f"     plik {'identyczny' if digests[0] == digests[1] else 'RÓŻNY'} w obu trybach")
+    return results
+
+
+def bench_string_interning(args) -> List[Dict[str, Any]]:
+    """Parsowanie źródła v2 bez i z internowaniem powtarzalnych wartości (StringInterner)"""
+    import gc
+    from template_model import StringInterner
+
+    catalog = make_v2_catalog(args.count)
+    for i, template in enumerate(catalog['templates']):
+        # Pola prawdziwych źródeł, których nie ma make_v2_template
+        template['maintainer'] = f"https://github.com/maintainer-{i % 50}"
+        template['labels'] = [{'name': 'com.centurylinklabs.watchtower.enable', 'value': 'true'}]
+        if i % 4 == 0:
+            template['type'] = 3
+            template['repository'] = {'url': f"https://github.com/stacks-{i % 20}/templates",
+                                      'stackfile': f"stacks/{template['name']}/docker-compose.yml"}
+    body = json.dumps(catalog).encode('utf-8')
+    del catalog
+    results = []
+    held = {}
+
+    def retained(label: str, func: Callable[[], Any]) -> Dict[str, Any]:
+        # Czas bez tracemalloc (śledzenie zwalnianych kopii ciągów znaków
+        # wielokrotnie wydłuża internowanie), pamięć w osobnym przebiegu
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        gc.collect()
+        tracemalloc.start()
+        held['value'] = func()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"   • {label:<40} {elapsed:8.3f}s   zajęta pamięć:  {current / (1024 * 1024):9.1f} MB")
+        return {'label': label, 'seconds': elapsed, 'retained_mb': current / (1024 * 1024)}
+
+    def interned():
+        held['interner'] = StringInterner()
+        data = json.loads(body)
+        held['interner'].intern_templates(data['templates'])
+        return data
+
+    results.append(retained(f"{args.count} szablonów - json.loads", lambda: json.loads(body)))
+    plain = held.pop('value')
+    results.append(retained('json.loads + internowanie', interned))
+    interner = held.pop('interner')
+    print(f"     wyszukania: {interner.stats['lookups']}, trafienia: {interner.hit_rate:.1%}, "
+          f"unikalne: {len(interner.table)}, zaoszczędzono ~{interner.stats['saved_bytes'] / (1024 * 1024):.1f} MB, "
+          f"wynik {'identyczny' if held.pop('value') == plain else 'RÓŻNY'}")
+    return results
+
+
+BENCHMARKS = {
+    'stream-ingest': bench_stream_ingest,
+    'dedup': bench_dedup,
+    'patches': bench_patches,
+    'patch-add-merge': bench_patch_add_merge,
+    'patch-bundle': bench_patch_bundle,
+    'patch-memo': bench_patch_memo,
+    'schema-validation': bench_schema_validation,
+    'validation-jobs': bench_validation_jobs,
+    'incremental': bench_incremental,
+    'checkpoints': bench_checkpoints,
+    'convert-jobs': bench_convert_jobs,
+    'stream-pipeline': bench_stream_pipeline,
+    'compact-model': bench_compact_model,
+    'string-interning': bench_string_interning,
+    'merge-images': bench_merge_images,
+    'near-duplicates': bench_near_duplicates,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarki Portainer Templates Converter")
+    parser.add_argument('benchmark', nargs='?', choices=sorted(BENCHMARKS), help='Nazwa benchmarku')
+    parser.add_argument('--count', type=int, default=100000, help='Liczba szablonów (domyślnie: 100000)')
+    parser.add_argument('--list', action='store_true', help='Wyświetl dostępne benchmarki')
+    args = parser.parse_args()
+
+    if args.list or not args.benchmark:
+        print("📚 Dostępne benchmarki:")
+        for name, func in sorted(BENCHMARKS.items()):
+            print(f"   • {name}: {func.__doc__}")
+        return
+
+    print(f"⏱️  Benchmark: {args.benchmark}")
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main()
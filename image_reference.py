@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Parser i normalizacja referencji obrazów Docker (registry/namespace/repo:tag@digest)
+
+Ten sam obraz bywa zapisany w źródłach na wiele sposobów: `nginx`,
+`library/nginx`, `docker.io/library/nginx:latest` czy
+`index.docker.io/library/nginx`. Postać znormalizowana uzupełnia domyślny
+rejestr (docker.io), przestrzeń nazw `library` dla oficjalnych obrazów
+Docker Hub i tag `latest`, zgodnie z regułami klienta Docker.
+
+ImageIndex normalizuje każdy różny zapis obrazu tylko raz (pamięć wyników)
+i zbiera zapisy wskazujące na ten sam obraz.
+
+Użycie:
+    index = ImageIndex()
+    index.normalize('nginx')        # 'docker.io/library/nginx:latest'
+"""
+
+import re
+from typing import Dict, Optional, Set
+
+DEFAULT_REGISTRY = 'docker.io'
+DEFAULT_NAMESPACE = 'library'
+DEFAULT_TAG = 'latest'
+
+# Inne nazwy rejestru Docker Hub
+DOCKER_HUB_ALIASES = frozenset({'docker.io', 'index.docker.io', 'registry-1.docker.io', 'registry.hub.docker.com'})
+
+# Składnia z distribution/reference (po zamianie na małe litery)
+_PATH_COMPONENT = re.compile(r'^[a-z0-9]+(?:(?:[._]|__|-+)[a-z0-9]+)*$')
+_TAG = re.compile(r'^[\w][\w.-]{0,127}$')
+_DIGEST = re.compile(r'^[a-z0-9]+(?:[.+_-][a-z0-9]+)*:[a-f0-9]{32,}$')
+
+
+class ImageReference:
+    """Referencja obrazu rozłożona na części; tag None tylko przy samym digest"""
+
+    __slots__ = ('registry', 'namespace', 'repository', 'tag', 'digest')
+
+    def __init__(self, registry: str, namespace: str, repository: str,
+                 tag: Optional[str] = None, digest: Optional[str] = None):
+        self.registry = registry
+        self.namespace = namespace
+        self.repository = repository
+        self.tag = tag
+        self.digest = digest
+
+    def __str__(self) -> str:
+        path = f"{self.namespace}/{self.repository}" if self.namespace else self.repository
+        reference = f"{self.registry}/{path}"
+        if self.tag:
+            reference += f":{self.tag}"
+        if self.digest:
+            reference += f"@{self.digest}"
+        return reference
+
+    def __repr__(self) -> str:
+        return f"ImageReference({str(self)!r})"
+
+
+def parse_image_reference(image: str) -> Optional[ImageReference]:
+    """
+    Rozkłada zapis obrazu na rejestr, przestrzeń nazw, repozytorium, tag i digest
+
+    Wielkość liter nie ma znaczenia (jak przy dotychczasowym kluczu scalania).
+
+    Returns:
+        ImageReference albo None, gdy zapis nie jest poprawną referencją
+        (np. zmienna szablonu ${IMAGE} lub spacje)
+    """
+    reference = image.strip().lower()
+    digest = None
+    if '@' in reference:
+        reference, digest = reference.split('@', 1)
+        if not _DIGEST.match(digest):
+            return None
+
+    # Tag to część po ostatnim ':' w ostatnim członie ścieżki (':' wcześniej to port rejestru)
+    tag = None
+    slash = reference.rfind('/')
+    colon = reference.rfind(':')
+    if colon > slash:
+        reference, tag = reference[:colon], reference[colon + 1:]
+        if not _TAG.match(tag):
+            return None
+
+    # Pierwszy człon jest rejestrem, gdy wygląda jak host (kropka, port lub localhost)
+    parts = reference.split('/')
+    registry = DEFAULT_REGISTRY
+    if len(parts) > 1 and ('.' in parts[0] or ':' in parts[0] or parts[0] == 'localhost'):
+        registry = parts.pop(0)
+        if registry in DOCKER_HUB_ALIASES:
+            registry = DEFAULT_REGISTRY
+    if not all(_PATH_COMPONENT.match(part) for part in parts):
+        return None
+
+    if registry == DEFAULT_REGISTRY and len(parts) == 1:
+        parts.insert(0, DEFAULT_NAMESPACE)
+    if tag is None and digest is None:
+        tag = DEFAULT_TAG
+    return ImageReference(registry, '/'.join(parts[:-1]), parts[-1], tag, digest)
+
+
+class ImageIndex:
+    """
+    Indeks znormalizowanych referencji obrazów z pamięcią wyników
+
+    Każdy różny zapis obrazu jest parsowany raz; niepoprawne zapisy są
+    porównywane dosłownie (po zamianie na małe litery).
+    """
+
+    def __init__(self):
+        self._normalized: Dict[str, str] = {}    # zapis -> postać znormalizowana
+        self.variants: Dict[str, Set[str]] = {}  # postać znormalizowana -> różne zapisy (małymi literami)
+        self.stats = {'lookups': 0, 'parsed': 0, 'invalid': 0}
+
+    def normalize(self, image: str) -> str:
+        """Zwraca znormalizowaną referencję obrazu (z pamięci wyników, gdy już znana)"""
+        self.stats['lookups'] += 1
+        normalized = self._normalized.get(image)
+        if normalized is None:
+            self.stats['parsed'] += 1
+            literal = image.strip().lower()
+            reference = parse_image_reference(image)
+            if reference is None:
+                self.stats['invalid'] += 1
+                normalized = literal
+            else:
+                normalized = str(reference)
+            self._normalized[image] = normalized
+            self.variants.setdefault(normalized, set()).add(literal)
+        return normalized
+
+    def aliased(self) -> Dict[str, Set[str]]:
+        """Obrazy zapisane w źródłach na więcej niż jeden sposób (poza wielkością liter)"""
+        return {normalized: images for normalized, images in self.variants.items() if len(images) > 1}
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Wykrywanie prawie-duplikatów szablonów (MinHash + LSH)
+
+Różne katalogi opisują tę samą aplikację nieco innym tytułem i opisem,
+więc dokładne klucze (name, image) ich nie łączą. Porównywane są tylko
+szablony o tej samej tożsamości wdrożenia: typ, znormalizowany obraz
+z tagiem (image_reference) i ścieżki wolumenów w kontenerze albo
+repozytorium i plik stosu - inne aplikacje, warianty tagu lub konfiguracji
+i typy wdrożenia nigdy nie są łączone. Szablon
+jest zbiorem tokenów (słowa tytułu i opisu), a podobieństwo to
+współczynnik Jaccarda tych zbiorów.
+
+Sygnatura MinHash skraca zbiór do NUM_PERM minimów, a LSH dzieli ją na
+pasma: szablony o tej samej tożsamości i identycznym paśmie trafiają do
+jednego kubełka i tylko takie pary są kandydatami, więc koszt rośnie
+liniowo z liczbą szablonów, a nie z liczbą par. Kandydaci są weryfikowani
+dokładnym Jaccardem, a klaster tworzą szablony podobne do jego pierwszego
+szablonu (bez łączenia przechodniego).
+
+Użycie:
+    detector = NearDuplicateDetector(threshold=0.8)
+    clusters = detector.find_clusters(templates)   # listy indeksów, rosnąco
+"""
+
+import hashlib
+import random
+import re
+from array import array
+from collections import Counter
+from operator import eq
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from image_reference import ImageIndex
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+_MASK64 = (1 << 64) - 1
+
+
+def template_tokens(template: Dict[str, Any]) -> FrozenSet[str]:
+    """Tokeny szablonu: słowa tytułu i opisu"""
+    text = f"{template.get('title') or ''} {template.get('description') or ''}".lower()
+    return frozenset(_WORD.findall(text))
+
+
+def template_identity(template: Dict[str, Any], images: ImageIndex) -> Optional[tuple]:
+    """
+    Tożsamość wdrożenia szablonu: typ, znormalizowany obraz (z tagiem)
+    i ścieżki wolumenów w kontenerze albo typ, repozytorium i plik stosu;
+    None, gdy szablon nie ma żadnego z nich (takie szablony nie są łączone)
+    """
+    image = template.get('image')
+    if isinstance(image, str) and image.strip():
+        volumes = template.get('volumes') or []
+        containers = tuple(sorted(str(volume.get('container')) for volume in volumes if isinstance(volume, dict)))
+        return (template.get('type'), images.normalize(image), containers)
+    repository = template.get('repository')
+    if isinstance(repository, dict) and repository.get('stackfile'):
+        url = str(repository.get('url') or '').strip().lower().rstrip('/')
+        if url.endswith('.git'):
+            url = url[:-4]
+        return (template.get('type'), url, str(repository['stackfile']).strip())
+    return None
+
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    """Współczynnik Jaccarda dwóch zbiorów tokenów"""
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+def lsh_bands(num_perm: int, threshold: float, margin: float = 0.1) -> Tuple[int, int]:
+    """
+    Dobiera liczbę pasm i wierszy (pasma * wiersze <= num_perm)
+
+    Próg LSH to ok. (1 / pasma) ** (1 / wiersze) - wybierany jest największy
+    nie wyższy niż threshold - margin, żeby pary tuż nad progiem
+    podobieństwa nie umykały weryfikacji.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        estimate = (1 / bands) ** (1 / rows)
+        if estimate <= threshold - margin and estimate > (1 / best[0]) ** (1 / best[1]):
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicateDetector:
+    """
+    Grupuje szablony o podobieństwie Jaccarda tokenów >= threshold
+
+    Permutacje i skróty tokenów są deterministyczne, więc ten sam katalog
+    daje te same klastry przy każdym uruchomieniu.
+    """
+
+    NUM_PERM = 64
+    # Kubełek porównywany jest z co najwyżej tyloma ostatnimi szablonami
+    # (częste słowa tworzą kubełki z tysiącami szablonów)
+    MAX_BUCKET_COMPARISONS = 8
+    # Margines szacunku z sygnatur (odchylenie ok. 0.06 przy 64 permutacjach)
+    ESTIMATE_SLACK = 0.1
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = NUM_PERM, seed: int = 1):
+        if not 0 < threshold <= 1:
+            raise ValueError("próg podobieństwa musi być w przedziale (0, 1]")
+        self.threshold = threshold
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        rng = random.Random(seed)
+        self._permutations = [(rng.getrandbits(64) | 1, rng.getrandbits(64)) for _ in range(num_perm)]
+        self._token_vectors: Dict[str, array] = {}   # token -> wartości wszystkich permutacji
+        self.stats = {'templates': 0, 'candidates': 0, 'estimated': 0, 'verified': 0}
+
+    def _token_vector(self, token: str) -> array:
+        vector = self._token_vectors.get(token)
+        if vector is None:
+            value = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+            vector = array('I', [((a * value + b) & _MASK64) >> 32 for a, b in self._permutations])
+            self._token_vectors[token] = vector
+        return vector
+
+    def signature(self, tokens: FrozenSet[str]) -> array:
+        """
+        Sygnatura MinHash - minimum każdej permutacji (mnożenie i przesunięcie
+        modulo 2^64); wartości permutacji są liczone raz na token
+        """
+        vectors = [self._token_vector(token) for token in tokens]
+        if len(vectors) == 1:
+            return vectors[0]
+        return array('I', map(min, *vectors))
+
+    def find_clusters(self, templates: Sequence[Dict[str, Any]]) -> List[List[int]]:
+        """
+        Zwraca klastry prawie-duplikatów (co najmniej 2 indeksy, rosnąco)
+
+        Sygnatury liczone są tylko dla szablonów, których tożsamość
+        wdrożenia (template_identity) ma więcej niż jeden szablon. Każdy
+        szablon jest porównywany z szablonami z tych samych kubełków LSH
+        (podobieństwo szacowane z sygnatur); dokładnym Jaccardem weryfikowane
+        są tylko pary, których szacunek przekracza próg pomniejszony
+        o ESTIMATE_SLACK. Klaster to pierwszy szablon i szablony podobne
+        właśnie do niego - podobieństwo nie przenosi się przez pośredników.
+        """
+        rows, num_perm = self.rows, len(self._permutations)
+        images = ImageIndex()
+        identities = [template_identity(template, images) for template in templates]
+        shared = {identity for identity, count in Counter(identities).items() if count > 1 and identity is not None}
+        buckets: List[Dict[int, Any]] = [{} for _ in range(self.bands)]
+        signatures: Dict[int, array] = {}
+        pending = []
+        candidates = 0
+        for index, template in enumerate(templates):
+            identity = identities[index]
+            if identity not in shared:
+                continue
+            tokens = template_tokens(template)
+            if not tokens:
+                continue
+            signature = self.signature(tokens)
+            signatures[index] = signature
+
+            partners = set()
+            for band, table in enumerate(buckets):
+                key = hash((identity, tuple(signature[band * rows:(band + 1) * rows])))
+                members = table.get(key)
+                if members is None:
+                    table[key] = index
+                    continue
+                if type(members) is int:
+                    members = table[key] = [members]
+                partners.update(members[-self.MAX_BUCKET_COMPARISONS:])
+                members.append(index)
+
+            candidates += len(partners)
+            for partner in partners:
+                estimate = sum(map(eq, signature, signatures[partner])) / num_perm
+                if estimate >= self.threshold - self.ESTIMATE_SLACK:
+                    pending.append((partner, index))
+        del buckets, signatures
+
+        # Weryfikacja dokładnym Jaccardem - tokeny liczone tylko dla par z pending
+        tokens_of: Dict[int, FrozenSet[str]] = {}
+        similar: Dict[int, List[int]] = {}    # wcześniejszy szablon -> późniejsze podobne do niego
+        verified = 0
+        for first, second in pending:
+            if identities[first] != identities[second]:
+                continue    # kolizja skrótu kubełka
+            for index in (first, second):
+                if index not in tokens_of:
+                    tokens_of[index] = template_tokens(templates[index])
+            if jaccard(tokens_of[first], tokens_of[second]) >= self.threshold:
+                verified += 1
+                similar.setdefault(first, []).append(second)
+
+        # Reprezentant to najwcześniejszy nieprzydzielony szablon; do klastra
+        # trafiają tylko szablony zweryfikowane względem niego
+        assigned = set()
+        clusters = []
+        for representative in sorted(similar):
+            if representative in assigned:
+                continue
+            members = sorted(index for index in set(similar[representative]) if index not in assigned)
+            if members:
+                assigned.update(members)
+                clusters.append([representative] + members)
+
+        self.stats = {'templates': len(templates), 'candidates': candidates,
+                      'estimated': len(pending), 'verified': verified}
+        return clusters
@@ -38,6 +38,6 @@ Format:
 __version__ = "1.0.0"
 __author__ = "bauerpawel"
 
-from ._patch_loader import PatchLoader
+from ._patch_loader import PatchLoader, CompiledFilter
 
-__all__ = ['PatchLoader']
+__all__ = ['PatchLoader', 'CompiledFilter']
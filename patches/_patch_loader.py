@@ -12,24 +12,368 @@ Data: 2026-01-10
 """
 
 import json
+import hashlib
+import marshal
 import os
-from typing import Dict, Any, List, Tuple, Optional
+import tempfile
+from bisect import bisect_left, bisect_right, insort
+from functools import partial
+from typing import Dict, Any, Iterable, Iterator, List, Tuple, Optional, Callable
 from pathlib import Path
 import re
 
 
+# Bundle skompilowanych patchy-ów w katalogu cache (zmiana formatu = przebudowa)
+BUNDLE_FILE = 'patch_bundle.json'
+BUNDLE_FORMAT = 2
+
+# Pamięć wyników operacji (szablon -> operacje, które go zmieniły) w katalogu cache
+MEMO_FILE = 'patch_memo.json'
+MEMO_FORMAT = 2
+
+# Znaki specjalne wyrażeń regularnych - kończą stały prefiks wzorca image
+_REGEX_SPECIAL = set('*.^$+?{}[]\\|()')
+
+
+def _index_key(value: Any) -> Optional[tuple]:
+    """
+    Klucz indeksu zgodny z semantyką dopasowania filtrów:
+    stringi bez rozróżniania wielkości liter, pozostałe wartości przez ==
+    Zwraca None dla wartości niehashowalnych (nie są indeksowane)
+    """
+    if isinstance(value, str):
+        return ('s', value.lower())
+    try:
+        hash(value)
+    except TypeError:
+        return None
+    return ('v', value)
+
+
+def _wildcard_check(key: str, regex, t: Dict[str, Any]) -> bool:
+    return key in t and regex.match(str(t[key])) is not None
+
+
+def _string_check(key: str, lowered: str, t: Dict[str, Any]) -> bool:
+    return key in t and isinstance(t[key], str) and t[key].lower() == lowered
+
+
+def _exact_check(key: str, criteria_value: Any, t: Dict[str, Any]) -> bool:
+    return key in t and not (criteria_value != t[key])
+
+
+def _freeze(value: Any) -> Any:
+    """
+    Zwraca haszowalny klucz kanoniczny wartości JSON: słowniki równe (==)
+    dają równe klucze niezależnie od kolejności pól, listy zachowują kolejność
+    """
+    if isinstance(value, dict):
+        return ('dict', frozenset((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ('list', tuple(_freeze(v) for v in value))
+    hash(value)
+    return value
+
+
+class CompiledFilter:
+    """
+    Filtr operacji skompilowany raz przy ładowaniu patchy-ów
+
+    Semantyka identyczna z PatchLoader._matches_filter (case-insensitive
+    dla stringów, wildcardy dla image), a dodatkowo filtr udostępnia klucze
+    do odpytania indeksów szablonów (_TemplateIndex).
+    """
+
+    def __init__(self, filter_criteria: Dict[str, Any]):
+        self.criteria = filter_criteria
+        self.checks: List[Callable[[Dict[str, Any]], bool]] = []
+        self.lookups: List[Tuple[str, tuple]] = []     # (pole, klucz indeksu)
+        self.image_prefix: Optional[str] = None
+
+        for key, criteria_value in filter_criteria.items():
+            if key == 'image' and isinstance(criteria_value, str) and '*' in criteria_value:
+                pattern = criteria_value.replace('*', '.*')
+                regex = re.compile(f"^{pattern}$", re.IGNORECASE)
+                self.checks.append(self._wildcard_check(key, regex))
+                self.image_prefix = self._literal_prefix(criteria_value)
+            elif isinstance(criteria_value, str):
+                self.checks.append(self._string_check(key, criteria_value.lower()))
+                if key in _TemplateIndex.FIELDS:
+                    self.lookups.append((key, ('s', criteria_value.lower())))
+            else:
+                self.checks.append(self._exact_check(key, criteria_value))
+                lookup = _index_key(criteria_value)
+                if key in _TemplateIndex.FIELDS and lookup is not None:
+                    self.lookups.append((key, lookup))
+
+    # Sprawdzenia to partial-e funkcji modułu
+    @staticmethod
+    def _wildcard_check(key: str, regex) -> Callable[[Dict[str, Any]], bool]:
+        return partial(_wildcard_check, key, regex)
+
+    @staticmethod
+    def _string_check(key: str, lowered: str) -> Callable[[Dict[str, Any]], bool]:
+        return partial(_string_check, key, lowered)
+
+    @staticmethod
+    def _exact_check(key: str, criteria_value: Any) -> Callable[[Dict[str, Any]], bool]:
+        return partial(_exact_check, key, criteria_value)
+
+    @staticmethod
+    def _literal_prefix(criteria_value: str) -> Optional[str]:
+        """
+        Zwraca stały prefiks wzorca image, który musi mieć każde dopasowanie
+        (None gdy takiego prefiksu nie da się bezpiecznie wyznaczyć)
+        """
+        if '|' in criteria_value:
+            return None
+        prefix = ''
+        for i, char in enumerate(criteria_value):
+            if char in _REGEX_SPECIAL:
+                # Kwantyfikator po znaku czyni ten znak opcjonalnym
+                if char in '?{+' and prefix:
+                    prefix = prefix[:-1]
+                break
+            prefix += char
+        if not prefix or not prefix.isascii():
+            return None
+        return prefix.casefold()
+
+    def matches(self, template: Dict[str, Any]) -> bool:
+        for check in self.checks:
+            if not check(template):
+                return False
+        return True
+
+
+class _TemplateIndex:
+    """
+    Indeksy nad aktualną listą szablonów używane przez operacje patchy-ów:
+    - haszowe dla równości na polach name / id / title
+    - posortowana lista obrazów dla wildcardów image ze stałym prefiksem
+
+    Szablony identyfikowane są przez id(obiektu); indeks trzeba aktualizować
+    (reindex) po zmianie indeksowanych pól szablonu.
+    """
+
+    FIELDS = ('name', 'id', 'title')
+
+    def __init__(self, templates: List[Dict[str, Any]]):
+        self.buckets = {field: {} for field in self.FIELDS}   # pole -> klucz -> {id: szablon}
+        self.images = []                                       # posortowane (image, seq, id)
+        self.entries = {}                                      # id -> (klucze pól, wpis image, id szablonu)
+        self.templates = {}                                    # id -> szablon
+        self.ids = {}                                          # wartość pola id -> liczba szablonów
+        self.unhashable_ids = {}                               # id -> szablon z niehaszowalnym polem id
+        self.sequence = 0
+        for template in templates:
+            self.add(template, sort=False)
+        self.images.sort()
+
+    def add(self, template: Dict[str, Any], sort: bool = True) -> None:
+        ident = id(template)
+        keys = []
+        for field in self.FIELDS:
+            key = _index_key(template[field]) if field in template else None
+            keys.append(key)
+            if key is not None:
+                self.buckets[field].setdefault(key, {})[ident] = template
+
+        image_entry = None
+        if 'image' in template:
+            self.sequence += 1
+            image_entry = (str(template['image']).casefold(), self.sequence, ident)
+            if sort:
+                insort(self.images, image_entry)
+            else:
+                self.images.append(image_entry)
+
+        # Surowa wartość id (bez normalizacji) - ADD porównuje ją operatorem ==
+        template_id = template.get('id')
+        try:
+            self.ids[template_id] = self.ids.get(template_id, 0) + 1
+        except TypeError:
+            self.unhashable_ids[ident] = template
+
+        self.entries[ident] = (keys, image_entry, template_id)
+        self.templates[ident] = template
+
+    def remove(self, template: Dict[str, Any]) -> None:
+        ident = id(template)
+        keys, image_entry, template_id = self.entries.pop(ident)
+        del self.templates[ident]
+        if self.unhashable_ids.pop(ident, None) is None:
+            count = self.ids[template_id] - 1
+            if count:
+                self.ids[template_id] = count
+            else:
+                del self.ids[template_id]
+        for field, key in zip(self.FIELDS, keys):
+            if key is not None:
+                bucket = self.buckets[field][key]
+                del bucket[ident]
+                if not bucket:
+                    del self.buckets[field][key]
+        if image_entry is not None:
+            del self.images[bisect_left(self.images, image_entry)]
+
+    def reindex(self, template: Dict[str, Any]) -> None:
+        self.remove(template)
+        self.add(template)
+
+    def has_id(self, value: Any) -> bool:
+        """Sprawdza czy istnieje szablon z polem id równym (==) value"""
+        try:
+            if self.ids.get(value):
+                return True
+        except TypeError:
+            return any(t.get('id') == value for t in self.templates.values())
+        return any(t.get('id') == value for t in self.unhashable_ids.values())
+
+    def candidates(self, compiled: CompiledFilter) -> Optional[List[Dict[str, Any]]]:
+        """
+        Zwraca szablony, które mogą spełniać filtr (nadzbiór dopasowań)
+        albo None, gdy filtra nie da się odpowiedzieć z indeksu
+        """
+        best = None
+        for field, key in compiled.lookups:
+            bucket = self.buckets[field].get(key, {})
+            if best is None or len(bucket) < len(best):
+                best = bucket
+        if best is not None:
+            return list(best.values())
+
+        if compiled.image_prefix is not None:
+            prefix = compiled.image_prefix
+            start = bisect_left(self.images, (prefix,))
+            result = []
+            for image, _, ident in self.images[start:]:
+                if not image.startswith(prefix):
+                    break
+                result.append(self.templates[ident])
+            return result
+
+        return None
+
+
+class _PlanStep:
+    """Krok planu patchy-ów (jedna operacja) wraz z wynikiem wykonania"""
+
+    def __init__(self, position: int, metadata: Dict[str, Any], op_idx: int, operation: Dict[str, Any]):
+        self.position = position
+        self.metadata = metadata
+        self.op_idx = op_idx
+        self.operation = operation
+        self.kind = operation['operation']
+        self.compiled: Optional[CompiledFilter] = None
+        self.changes: Optional[Dict[str, Any]] = None
+        self.template: Optional[Dict[str, Any]] = None
+        self.reindex = False
+        self.error: Optional[Exception] = None
+        self.matched = 0
+        self.title = None
+        self.key: Optional[str] = None      # klucz treści operacji (pamięć wyników)
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+
+class _PatchPlan:
+    """
+    Wszystkie operacje załadowanych patchy-ów w kolejności aplikowania
+    z indeksem odwróconym: klucz pola / prefiks image -> pozycje operacji,
+    których filtr może dopasować szablon o takiej wartości.
+
+    Plan zapisuje też, w których krokach szablony miały dane ID
+    (przedziały [początek, koniec) pozycji), żeby ADD mógł sprawdzić
+    istnienie ID w chwili swojego wykonania.
+    """
+
+    def __init__(self, groups: List[Tuple[Dict[str, Any], List[_PlanStep]]]):
+        self.groups = groups
+        self.steps = [step for _, steps in groups for step in steps]
+        self.by_key = {field: {} for field in _TemplateIndex.FIELDS}    # pole -> klucz -> [pozycja]
+        self.by_prefix = {}                                              # prefiks image -> [pozycja]
+        self.always = []                                                 # filtry nieindeksowalne
+        self.ids = {}                                                    # id -> [(początek, koniec)]
+        self.unhashable_ids = []                                         # [(id, początek, koniec)]
+
+        for step in self.steps:
+            compiled = step.compiled
+            if compiled is None or step.error is not None:
+                continue
+            if compiled.lookups:
+                field, key = compiled.lookups[0]
+                self.by_key[field].setdefault(key, []).append(step.position)
+            elif compiled.image_prefix is not None:
+                self.by_prefix.setdefault(compiled.image_prefix, []).append(step.position)
+            else:
+                self.always.append(step.position)
+        self.prefix_lengths = sorted({len(prefix) for prefix in self.by_prefix})
+        self.fresh: Optional['_PatchPlan'] = None    # operacje nieznane pamięci wyników
+
+    def candidates(self, template: Dict[str, Any], after: int) -> List[int]:
+        """
+        Zwraca rosnące pozycje (> after) operacji UPDATE/REMOVE, których
+        filtr może pasować do szablonu w jego obecnym stanie
+        """
+        buckets = [self.always]
+        for field in _TemplateIndex.FIELDS:
+            if field in template:
+                key = _index_key(template[field])
+                if key is not None and key in self.by_key[field]:
+                    buckets.append(self.by_key[field][key])
+        if self.by_prefix and 'image' in template:
+            image = str(template['image']).casefold()
+            for length in self.prefix_lengths:
+                if length > len(image):
+                    break
+                bucket = self.by_prefix.get(image[:length])
+                if bucket:
+                    buckets.append(bucket)
+
+        positions = []
+        for bucket in buckets:
+            positions.extend(bucket[bisect_right(bucket, after):])
+        positions.sort()
+        return positions
+
+    def record_id(self, value: Any, start: int, end: int) -> None:
+        """Zapisuje, że szablon z polem id == value istniał przed krokami [start, end)"""
+        try:
+            self.ids.setdefault(value, []).append((start, end))
+        except TypeError:
+            self.unhashable_ids.append((value, start, end))
+
+    def has_id(self, value: Any, position: int) -> bool:
+        """Sprawdza czy przed krokiem position istniał szablon z polem id równym (==) value"""
+        try:
+            spans = self.ids.get(value, ())
+        except TypeError:
+            spans = [span for other, other_spans in self.ids.items() if other == value for span in other_spans]
+        if any(start <= position < end for start, end in spans):
+            return True
+        return any(other == value and start <= position < end for other, start, end in self.unhashable_ids)
+
+
 class PatchLoader:
     """Ładuje i aplikuje patch-y do szablonów Portainer v3"""
 
-    def __init__(self, patches_dir: str = 'patches'):
+    def __init__(self, patches_dir: str = 'patches', cache_dir: Optional[str] = None):
         """
         Inicjalizuje loader patchy-ów
         
         Args:
             patches_dir: katalog z plikami patchy-ów
+            cache_dir: katalog na bundle zwalidowanych patchy-ów (None = bez cache)
         """
         self.patches_dir = Path(patches_dir)
+        self.cache_dir = cache_dir
+        self.bundle_stats = {'reused': 0, 'parsed': 0}
         self.patches = []
+        self._filters = {}      # id(operacji) -> CompiledFilter
+        self._index = None      # indeks szablonów na czas apply_patches
+        self.fused = True       # jeden przebieg planu zamiast aplikowania patch po patchu
+        self.interner = None    # wspólna tablica internowania wartości (StringInterner konwertera)
         self.stats = {
             'loaded': 0,
             'applied': 0,
@@ -42,10 +386,218 @@ class PatchLoader:
             'errors': []
         }
 
+    def _patch_files(self) -> List[Path]:
+        """
+        Zwraca posortowaną listę patch files (bez TEMPLATE.json i archived.json)
+        """
+        return sorted([
+            f for f in self.patches_dir.glob('*.json')
+            if f.name != 'TEMPLATE.json' and f.name != 'archived.json'
+        ])
+
+    def fingerprint(self) -> Optional[str]:
+        """
+        Zwraca skrót zestawu patch files (nazwy + zawartość)
+
+        Returns:
+            Skrót SHA-256 lub None jeśli katalog nie istnieje
+        """
+        if not self.patches_dir.exists():
+            return None
+
+        digest = hashlib.sha256()
+        for patch_file, _, sha256, _ in self._scan_files(self._load_bundle(payload=False)):
+            digest.update(patch_file.name.encode('utf-8') + b'\0')
+            digest.update(bytes.fromhex(sha256))
+        return digest.hexdigest()
+
+    def _bundle_path(self) -> Optional[Path]:
+        return Path(self.cache_dir) / BUNDLE_FILE if self.cache_dir else None
+
+    @staticmethod
+    def _code_hash() -> str:
+        """Skrót kodu loadera - bundle z innej wersji kodu jest przebudowywany"""
+        return hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+
+    def _load_bundle(self, payload: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Wczytuje bundle zwalidowanych patchy-ów z cache
+
+        Plik zawiera dwa wiersze JSON: nagłówek (nazwa -> rozmiar, mtime,
+        skrót) i właściwą treść, więc sam odcisk (fingerprint) czyta tylko
+        nagłówek. Bundle to same dane (cache bywa przywracany z zewnątrz) -
+        struktura patch-y jest sprawdzana ponownie, a filtry kompilowane
+        przy wczytaniu.
+
+        Args:
+            payload: czy wczytać też patch-e
+
+        Returns:
+            Słownik nazwa pliku -> wpis bundle (pusty, gdy brak lub nieaktualny)
+        """
+        path = self._bundle_path()
+        if path is None or not path.exists():
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                if header.get('format') != BUNDLE_FORMAT or header.get('code') != self._code_hash():
+                    return {}
+                files = header['files']
+                for entry in files.values():
+                    if not (isinstance(entry['size'], int) and isinstance(entry['mtime_ns'], int)
+                            and isinstance(entry['sha256'], str)):
+                        return {}
+                if payload:
+                    for name, stored in json.loads(f.readline()).items():
+                        entry = files[name]
+                        entry.update(patch=stored['patch'], error=stored['error'], printed=bool(stored['printed']),
+                                     filters=None)
+                        if entry['error'] is None:
+                            if not self._validate_patch_structure(entry['patch']):
+                                return {}
+                            entry['filters'] = self._compile_filters(entry['patch'])
+            return files
+        except Exception:
+            # Uszkodzony bundle - zostanie przebudowany
+            return {}
+
+    def _save_bundle(self, files: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Zapisuje bundle atomowo
+        """
+        path = self._bundle_path()
+        header_keys = ('size', 'mtime_ns', 'sha256')
+        header = {
+            'format': BUNDLE_FORMAT,
+            'code': self._code_hash(),
+            'files': {name: {key: entry[key] for key in header_keys} for name, entry in files.items()},
+        }
+        stored = {name: {key: entry[key] for key in ('patch', 'error', 'printed')} for name, entry in files.items()}
+        try:
+            self._write_json_lines(path, header, stored)
+        except Exception as e:
+            print(f"   ⚠️  Nie udało się zapisać bundle patchy-ów: {e}")
+
+    @staticmethod
+    def _write_json_lines(path: Path, *objects: Any) -> None:
+        """Zapisuje obiekty jako kolejne wiersze JSON do pliku atomowo (plik tymczasowy + os.replace)"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for obj in objects:
+                    f.write(json.dumps(obj, ensure_ascii=False, separators=(',', ':')))
+                    f.write('\n')
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _load_memo(self, plan: '_PatchPlan') -> Optional[Dict[bytes, Tuple[str, ...]]]:
+        """
+        Wczytuje pamięć wyników operacji i przygotowuje plan do odtwarzania
+
+        Operacje są identyfikowane kluczem treści (id patch-a + operacja),
+        więc przesunięcie operacji w pliku nie unieważnia pamięci. Operacje
+        nieznane pamięci trafiają do plan.fresh - tylko ich filtry są
+        sprawdzane dla szablonów odtwarzanych z pamięci.
+
+        Returns:
+            Słownik odcisk szablonu -> klucze operacji, które go zmieniły
+            (pusty przy braku pamięci) albo None, gdy cache jest wyłączony
+        """
+        if not self.cache_dir:
+            return None
+
+        occurrences = {}
+        for step in plan.steps:
+            digest = hashlib.sha256(json.dumps([step.metadata.get('id'), step.operation], sort_keys=True,
+                                               default=str).encode('utf-8')).hexdigest()[:32]
+            occurrences[digest] = occurrences.get(digest, 0) + 1
+            step.key = f"{digest}#{occurrences[digest]}"
+        self.stats['memo'] = {'hits': 0, 'misses': 0, 'operations': {}}
+
+        memo, previous = {}, []
+        path = Path(self.cache_dir) / MEMO_FILE
+        if path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('format') == MEMO_FORMAT and data.get('code') == self._code_hash():
+                    # Same dane JSON: odcisk (hex) -> klucze operacji; błędny typ unieważnia całą pamięć
+                    previous = data['operations']
+                    memo = {bytes.fromhex(fingerprint): tuple(keys) for fingerprint, keys in data['templates'].items()}
+                    if not all(isinstance(key, str) for keys in [previous, *memo.values()] for key in keys):
+                        memo, previous = {}, []
+            except Exception:
+                # Uszkodzona pamięć wyników - zostanie zapisana od nowa
+                pass
+
+        # Zmiana kolejności wspólnych operacji zmienia wynik dowolnego szablonu
+        current = [step.key for step in plan.steps]
+        common = set(previous) & set(current)
+        if [key for key in previous if key in common] != [key for key in current if key in common]:
+            memo = {}
+
+        known = set(previous)
+        fresh = [step for step in plan.steps if step.key not in known]
+        if fresh and memo:
+            plan.fresh = _PatchPlan([({}, fresh)])
+        return memo
+
+    def _save_memo(self, plan: '_PatchPlan', templates: Dict[bytes, Tuple[str, ...]]) -> None:
+        """Zapisuje pamięć wyników operacji atomowo"""
+        data = {
+            'format': MEMO_FORMAT,
+            'code': self._code_hash(),
+            'operations': [step.key for step in plan.steps],
+            'templates': {fingerprint.hex(): keys for fingerprint, keys in templates.items()},
+        }
+        try:
+            self._write_json_lines(Path(self.cache_dir) / MEMO_FILE, data)
+        except Exception as e:
+            print(f"   ⚠️  Nie udało się zapisać pamięci wyników patchy-ów: {e}")
+
+    @staticmethod
+    def _template_fingerprint(template: Dict[str, Any]) -> Optional[bytes]:
+        """
+        Odcisk szablonu przed aplikowaniem patchy-ów (None gdy nie da się go wyznaczyć)
+
+        marshal w wersji 2 nie zapisuje referencji współdzielonych obiektów,
+        więc równe szablony (z tą samą kolejnością pól) dają te same bajty.
+        """
+        try:
+            return hashlib.blake2b(marshal.dumps(template, 2), digest_size=16).digest()
+        except ValueError:
+            return None
+
+    def _scan_files(self, bundle: Dict[str, Dict[str, Any]]) -> List[Tuple[Path, os.stat_result, str, Optional[bytes]]]:
+        """
+        Zwraca (plik, stat, sha256, zawartość) dla patch files
+
+        Gdy rozmiar i mtime zgadzają się z wpisem bundle, skrót jest brany
+        z bundle bez czytania pliku (zawartość = None).
+        """
+        result = []
+        for patch_file in self._patch_files():
+            stat = patch_file.stat()
+            entry = bundle.get(patch_file.name)
+            if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                result.append((patch_file, stat, entry['sha256'], None))
+            else:
+                data = patch_file.read_bytes()
+                result.append((patch_file, stat, hashlib.sha256(data).hexdigest(), data))
+        return result
+
     def load_patches(self) -> List[Dict[str, Any]]:
         """
         Ładuje wszystkie patch files z katalogu
         Pliki są ładowane w porządku numerycznym (0001, 0002...)
+
+        Gdy ustawiony jest cache_dir, zwalidowane patch-e ze skompilowanymi
+        filtrami są brane z bundle (klucz: nazwa, rozmiar i skrót pliku),
+        a parsowane są tylko pliki nowe lub zmienione.
         
         Returns:
             Lista załadowanych patchy-ów
@@ -55,43 +607,133 @@ class PatchLoader:
             return []
 
         # Zbieramy wszystkie .json files
-        patch_files = sorted([
-            f for f in self.patches_dir.glob('*.json')
-            if f.name != 'TEMPLATE.json' and f.name != 'archived.json'
-        ])
+        bundle = self._load_bundle()
+        scanned = self._scan_files(bundle)
 
-        if not patch_files:
+        if not scanned:
             print(f"ℹ️  Brak patch files w {self.patches_dir}")
             return []
 
         print(f"🔍 Ładowanie patchy-ów z {self.patches_dir}...")
 
         self.patches = []
-        for patch_file in patch_files:
-            try:
-                with open(patch_file, 'r', encoding='utf-8') as f:
-                    patch_data = json.load(f)
+        self.bundle_stats = {'reused': 0, 'parsed': 0}
+        files = {}
+        changed = set(bundle) != {patch_file.name for patch_file, _, _, _ in scanned}
+        for patch_file, stat, sha256, data in scanned:
+            entry = bundle.get(patch_file.name)
+            if entry is not None and entry['sha256'] == sha256:
+                self.bundle_stats['reused'] += 1
+                if (entry['size'], entry['mtime_ns']) != (stat.st_size, stat.st_mtime_ns):
+                    entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                    changed = True
+                fresh = False
+            else:
+                entry = self._compile_patch_file(patch_file.name, data)
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha256=sha256)
+                self.bundle_stats['parsed'] += 1
+                changed = True
+                fresh = True
+            files[patch_file.name] = entry
 
-                # Walidujemy strukturę patch file
-                if not self._validate_patch_structure(patch_data):
-                    self.stats['errors'].append(f"Invalid structure: {patch_file.name}")
-                    continue
+            if entry['error'] is not None:
+                self.stats['errors'].append(entry['error'])
+                if entry['printed']:
+                    print(f"   ❌ {entry['error']}")
+                continue
 
-                self.patches.append(patch_data)
-                self.stats['loaded'] += 1
+            patch_data = entry['patch']
+            for operation, compiled in zip(patch_data['operations'], entry['filters']):
+                if compiled is not None:
+                    self._filters[id(operation)] = compiled
+            self.patches.append(patch_data)
+            self.stats['loaded'] += 1
+            if fresh:
                 print(f"   ✅ {patch_file.name}: {patch_data['metadata']['title']}")
 
-            except json.JSONDecodeError as e:
-                error_msg = f"JSON error in {patch_file.name}: {e}"
-                self.stats['errors'].append(error_msg)
-                print(f"   ❌ {error_msg}")
-            except Exception as e:
-                error_msg = f"Error loading {patch_file.name}: {e}"
-                self.stats['errors'].append(error_msg)
-                print(f"   ❌ {error_msg}")
+        if self.bundle_stats['reused']:
+            print(f"   ♻️  {self.bundle_stats['reused']} patch file(ów) bez zmian - z bundle w cache")
+
+        # Szablony ADD i zmiany UPDATE współdzielą powtarzalne wartości ze źródłami
+        if self.interner is not None:
+            self.interner.intern_templates(
+                operation.get('template') or operation.get('changes')
+                for patch_data in self.patches for operation in patch_data['operations'])
+
+        if changed and self.cache_dir:
+            self._save_bundle(files)
 
         return self.patches
 
+    def _compile_patch_file(self, name: str, data: bytes) -> Dict[str, Any]:
+        """
+        Parsuje, waliduje i kompiluje jeden patch file
+
+        Returns:
+            Wpis bundle: patch, skompilowane filtry operacji albo błąd
+            (w pliku bundle zapisywane są patch i błąd, bez filtrów)
+        """
+        entry = {'patch': None, 'filters': None, 'error': None, 'printed': True}
+        try:
+            patch_data = json.loads(data.decode('utf-8'))
+
+            # Walidujemy strukturę patch file
+            if not self._validate_patch_structure(patch_data):
+                entry.update(error=f"Invalid structure: {name}", printed=False)
+                return entry
+
+            entry['filters'] = self._compile_filters(patch_data)
+            entry['patch'] = patch_data
+
+        except json.JSONDecodeError as e:
+            entry['error'] = f"JSON error in {name}: {e}"
+        except Exception as e:
+            entry['error'] = f"Error loading {name}: {e}"
+        return entry
+
+    def _compile_filters(self, patch: Dict[str, Any]) -> List[Optional[CompiledFilter]]:
+        """
+        Kompiluje filtry wszystkich operacji patch-a (raz, przy ładowaniu)
+
+        Returns:
+            Skompilowane filtry w kolejności operacji (None dla operacji bez filtra
+            i z niepoprawnym wzorcem image - taki filtr kompiluje dopiero _get_filter,
+            a błąd trafia do statystyk tylko tej operacji)
+        """
+        compiled = []
+        for operation in patch['operations']:
+            filter_criteria = operation.get('filter')
+            if isinstance(filter_criteria, dict) and filter_criteria:
+                try:
+                    compiled.append(CompiledFilter(filter_criteria))
+                except re.error:
+                    compiled.append(None)
+            else:
+                compiled.append(None)
+        return compiled
+
+    def _get_filter(self, operation: Dict[str, Any]) -> CompiledFilter:
+        """
+        Zwraca skompilowany filtr operacji (kompilując go, jeśli patch
+        nie przeszedł przez load_patches)
+        """
+        compiled = self._filters.get(id(operation))
+        if compiled is None or compiled.criteria is not operation['filter']:
+            compiled = CompiledFilter(operation['filter'])
+            self._filters[id(operation)] = compiled
+        return compiled
+
+    def _find_matching(self, compiled: CompiledFilter,
+                       templates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Zwraca szablony spełniające filtr - kandydatów bierze z indeksu,
+        a gdy filtr nie jest indeksowalny, przegląda całą listę
+        """
+        candidates = self._index.candidates(compiled) if self._index is not None else None
+        if candidates is None:
+            candidates = templates
+        return [t for t in candidates if compiled.matches(t)]
+
     def _validate_patch_structure(self, patch: Dict[str, Any]) -> bool:
         """
         Waliduje strukturę patch file
@@ -129,6 +771,11 @@ class PatchLoader:
     def apply_patches(self, templates: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
         Aplikuje wszystkie załadowane patchy-y do szablonów
+
+        Operacje wszystkich patchy-ów są kompilowane do jednego planu
+        i wykonywane jednym przebiegiem po szablonach (_iter_fused);
+        gdy plan nie może zagwarantować identycznego wyniku, patch-e są
+        aplikowane po kolei (_apply_sequential).
         
         Args:
             templates: lista szablonów v3
@@ -139,18 +786,254 @@ class PatchLoader:
         if not self.patches:
             return templates, self.stats
 
+        return list(self.iter_apply_patches(templates)), self.stats
+
+    def iter_apply_patches(self, templates: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Strumieniowy odpowiednik apply_patches
+
+        Przy planie (_iter_fused) szablony są zwracane od razu po przejściu
+        przez swoje operacje, a szablony dodane przez ADD - po ostatnim;
+        między szablonami pamiętane są tylko zapisy ID planu i wpisy pamięci
+        wyników. Raport i statystyki (self.stats) są gotowe po wyczerpaniu
+        generatora. Bez planu patch-e są aplikowane na liście.
+        """
+        if not self.patches:
+            yield from templates
+            return
+
         print(f"\n🔧 Aplikowanie {len(self.patches)} patch file(ów)...")
 
         # Resetujemy statystyki operacji
         self.stats['operations'] = {'update': 0, 'add': 0, 'remove': 0}
         self.stats['applied'] = 0
         self.stats['skipped'] = 0
+        self.stats.pop('memo', None)
+
+        plan = self._build_plan() if self.fused else None
+        if plan is None:
+            yield from self._apply_sequential(list(templates))
+        else:
+            yield from self._iter_fused(plan, templates)
+
+    def _apply_sequential(self, templates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Aplikuje patch-e w kolejności, operacja po operacji, korzystając z indeksów szablonów
+        """
+        self._index = _TemplateIndex(templates)
+        try:
+            for patch in self.patches:
+                templates = self._apply_single_patch(patch, templates)
+        finally:
+            self._index = None
+        return templates
+
+    def _build_plan(self) -> Optional['_PatchPlan']:
+        """
+        Kompiluje operacje wszystkich patchy-ów do jednego planu
 
-        # Aplikujemy patchy w kolejności
+        Błędy walidacji operacji są zapamiętywane w planie (zgłaszane przy
+        raporcie, jak przy aplikowaniu sekwencyjnym).
+
+        Returns:
+            Plan albo None, gdy patch-e mają strukturę, której plan nie
+            obsługuje (wtedy używane jest aplikowanie sekwencyjne)
+        """
+        groups = []
+        position = 0
         for patch in self.patches:
-            templates = self._apply_single_patch(patch, templates)
+            try:
+                if not self._validate_patch_structure(patch):
+                    return None
+                if any(op['operation'] == 'update' and not isinstance(op.get('changes', {}), dict)
+                       for op in patch['operations']):
+                    return None
+            except Exception:
+                return None
+
+            steps = []
+            groups.append((patch['metadata'], steps))
+            for op_idx, operation in enumerate(patch['operations'], 1):
+                op_type = operation['operation']
+                step = _PlanStep(position, patch['metadata'], op_idx, operation)
+                position += 1
+                try:
+                    if op_type == 'update':
+                        step.compiled, step.changes = self._prepare_update(operation)
+                        step.reindex = any(key in _TemplateIndex.FIELDS or key == 'image' for key in step.changes)
+                    elif op_type == 'add':
+                        step.template = self._prepare_add(operation)
+                    else:
+                        step.compiled = self._prepare_remove(operation)
+                except Exception as e:
+                    step.error = e
+                steps.append(step)
+
+        return _PatchPlan(groups)
+
+    def _iter_fused(self, plan: '_PatchPlan', templates: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Wykonuje plan jednym przebiegiem po szablonach
+
+        Każdy szablon przechodzi tylko przez operacje-kandydatów z indeksu
+        odwróconego planu. Jedyną zależnością między szablonami jest ADD
+        (istnienie ID w chwili operacji) - dlatego przebieg zapisuje, w których
+        krokach planu szablon miał dane ID, a szablony dodane przez ADD
+        przechodzą potem przez kolejne operacje planu.
+        """
+        memo = self._load_memo(plan)
+        if memo is None:
+            for template in templates:
+                if self._run_plan(plan, template, 0):
+                    yield template
+        else:
+            yield from self._iter_memoized(plan, templates, memo)
+
+        for step in plan.steps:
+            if step.kind != 'add' or step.error is not None:
+                continue
+            new_template = step.template
+            step.title = new_template['title']
+            if plan.has_id(new_template['id'], step.position):
+                step.matched = 0
+                continue
+            step.matched = 1
+            if self._run_plan(plan, new_template, step.position + 1):
+                yield new_template
+
+        self._report_plan(plan)
+
+    def _iter_memoized(self, plan: '_PatchPlan', templates: Iterable[Dict[str, Any]],
+                       memo: Dict[bytes, Tuple[str, ...]]) -> Iterator[Dict[str, Any]]:
+        """
+        Przebieg planu z pamięcią wyników z poprzedniego uruchomienia
+
+        Dla szablonu o znanym odcisku operacje, które go wtedy zmieniły,
+        są odtwarzane (zmiany aplikowane bez sprawdzania filtrów), a filtry
+        sprawdzane są tylko dla operacji nowych lub zmienionych. Gdy któraś
+        z nich zmieni szablon, dalsze kroki wykonywane są normalnie.
+        """
+        positions = {step.key: step.position for step in plan.steps
+                     if step.compiled is not None and step.error is None}
+        entries = {}
+        for template in templates:
+            fingerprint = self._template_fingerprint(template)
+            recorded = memo.get(fingerprint) if fingerprint is not None else None
+            if recorded is not None:
+                try:
+                    recorded = [positions[key] for key in recorded]
+                except KeyError:
+                    # Operacja, która zmieniła szablon, została usunięta lub zmieniona
+                    recorded = None
+            self.stats['memo']['hits' if recorded is not None else 'misses'] += 1
+
+            trace = []
+            kept = self._run_plan(plan, template, 0, trace, recorded)
+            if fingerprint is not None:
+                entries[fingerprint] = tuple(plan.steps[position].key for position in trace) if trace else ()
+            if kept:
+                yield template
+
+        self._save_memo(plan, entries)
+
+    def _run_plan(self, plan: '_PatchPlan', template: Dict[str, Any], start: int,
+                  trace: Optional[List[int]] = None, recorded: Optional[List[int]] = None) -> bool:
+        """
+        Przeprowadza szablon przez kroki planu od pozycji start
+
+        Args:
+            trace: lista, do której dopisywane są pozycje dopasowanych kroków
+            recorded: pozycje kroków odtwarzanych z pamięci wyników
+
+        Returns:
+            True jeśli szablon nie został usunięty
+        """
+        replay = set(recorded) if recorded is not None else None
+        id_start = start
+        position = start - 1
+        candidates = self._plan_candidates(plan, template, position, replay)
+        i = 0
+        while i < len(candidates):
+            position = candidates[i]
+            i += 1
+            step = plan.steps[position]
+            diverged = False
+            if replay is not None and position in replay:
+                step.memo_hits += 1
+            elif not step.compiled.matches(template):
+                continue
+            else:
+                if trace is not None:
+                    step.memo_misses += 1
+                if replay is not None:
+                    # Nowa operacja zmieniła szablon - dalej bez pamięci wyników
+                    replay = None
+                    diverged = True
+
+            step.matched += 1
+            if trace is not None:
+                trace.append(position)
+            if step.kind == 'remove':
+                plan.record_id(template.get('id'), id_start, position + 1)
+                return False
+
+            if 'id' in step.changes:
+                plan.record_id(template.get('id'), id_start, position + 1)
+                id_start = position + 1
+            self._apply_changes(template, step.changes)
+            if step.reindex or diverged:
+                candidates = self._plan_candidates(plan, template, position, replay)
+                i = 0
+
+        plan.record_id(template.get('id'), id_start, len(plan.steps) + 1)
+        return True
+
+    @staticmethod
+    def _plan_candidates(plan: '_PatchPlan', template: Dict[str, Any], after: int,
+                         replay: Optional[set]) -> List[int]:
+        """
+        Kandydaci planu dla szablonu; przy odtwarzaniu z pamięci wyników
+        tylko kroki odtwarzane i operacje nowe lub zmienione
+        """
+        if replay is None:
+            return plan.candidates(template, after)
+        positions = [position for position in replay if position > after]
+        if plan.fresh is not None:
+            positions.extend(plan.fresh.candidates(template, after))
+        positions.sort()
+        return positions
+
+    def _report_plan(self, plan: '_PatchPlan') -> None:
+        """
+        Wypisuje wyniki i aktualizuje statystyki kroków planu w kolejności patchy-ów
+        """
+        for metadata, steps in plan.groups:
+            print(f"\n   📋 Patch: {metadata['id']} - {metadata['title']}")
+
+            for step in steps:
+                if 'memo' in self.stats and step.key is not None:
+                    self.stats['memo']['operations'][f"{metadata['id']} #{step.op_idx}"] = {
+                        'hits': step.memo_hits, 'misses': step.memo_misses,
+                    }
+                if step.error is not None:
+                    self._report_error(metadata['id'], step.op_idx, step.error)
+                    continue
 
-        return templates, self.stats
+                if step.kind == 'update':
+                    self._report_update(step.operation, step.matched)
+                elif step.kind == 'add':
+                    self._report_add(step.operation, step.template, step.title, bool(step.matched))
+                else:
+                    self._report_remove(step.operation, step.matched)
+
+                self.stats['operations'][step.kind] += 1
+                self.stats['applied'] += 1
+
+    def _report_error(self, patch_id: str, op_idx: int, error: Exception) -> None:
+        error_msg = f"Error in {patch_id} operation {op_idx}: {error}"
+        self.stats['errors'].append(error_msg)
+        print(f"      ❌ {error_msg}")
+        self.stats['skipped'] += 1
 
     def _apply_single_patch(self, patch: Dict[str, Any], templates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -187,46 +1070,64 @@ class PatchLoader:
                 self.stats['applied'] += 1
 
             except Exception as e:
-                error_msg = f"Error in {patch_id} operation {op_idx}: {e}"
-                self.stats['errors'].append(error_msg)
-                print(f"      ❌ {error_msg}")
-                self.stats['skipped'] += 1
+                self._report_error(patch_id, op_idx, e)
 
         return templates
 
-    def _apply_update(self, operation: Dict[str, Any], templates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _prepare_update(self, operation: Dict[str, Any]) -> Tuple[CompiledFilter, Dict[str, Any]]:
         """
-        Aplikuje operację UPDATE - zmiana istniejących szablonów
-        
-        Kryteria filtrowania mogą używać dowolnych pól szablonu
+        Waliduje operację UPDATE i zwraca (skompilowany filtr, zmiany)
         """
         filter_criteria = operation.get('filter', {})
         changes = operation.get('changes', {})
-        op_desc = operation.get('description', '')
 
         if not filter_criteria or not changes:
             raise ValueError("UPDATE requires 'filter' and 'changes'")
 
+        return self._get_filter(operation), changes
+
+    def _apply_update(self, operation: Dict[str, Any], templates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Aplikuje operację UPDATE - zmiana istniejących szablonów
+        
+        Kryteria filtrowania mogą używać dowolnych pól szablonu
+        """
+        compiled, changes = self._prepare_update(operation)
+
+        reindex = self._index is not None and any(
+            key in _TemplateIndex.FIELDS or key == 'image' for key in changes
+        )
+
         matched = 0
-        for template in templates:
-            if self._matches_filter(template, filter_criteria):
-                # Aplikujemy zmiany
-                for key, value in changes.items():
-                    if key in ['env', 'volumes', 'labels', 'categories', 'ports']:
-                        # Dla pól listowych - scal zamiast zamień
-                        if isinstance(value, list):
-                            if key not in template:
-                                template[key] = []
-                            # Scalanie - unikaj duplikatów
-                            self._merge_list_field(template, key, value)
-                        else:
-                            template[key] = value
-                    else:
-                        # Dla zwykłych pól - zamień
-                        template[key] = value
+        for template in self._find_matching(compiled, templates):
+            self._apply_changes(template, changes)
+            if reindex:
+                self._index.reindex(template)
+            matched += 1
 
-                matched += 1
+        self._report_update(operation, matched)
+        return templates
 
+    def _apply_changes(self, template: Dict[str, Any], changes: Dict[str, Any]) -> None:
+        """
+        Aplikuje zmiany operacji UPDATE do jednego szablonu
+        """
+        for key, value in changes.items():
+            if key in ['env', 'volumes', 'labels', 'categories', 'ports']:
+                # Dla pól listowych - scal zamiast zamień
+                if isinstance(value, list):
+                    if key not in template:
+                        template[key] = []
+                    # Scalanie - unikaj duplikatów
+                    self._merge_list_field(template, key, value)
+                else:
+                    template[key] = value
+            else:
+                # Dla zwykłych pól - zamień
+                template[key] = value
+
+    def _report_update(self, operation: Dict[str, Any], matched: int) -> None:
+        op_desc = operation.get('description', '')
         if matched > 0:
             print(f"      ✅ UPDATE: zaktualizowano {matched} szablon(ów)")
             if op_desc:
@@ -234,14 +1135,11 @@ class PatchLoader:
         else:
             print(f"      ⚠️  UPDATE: brak szablonów spełniających kryteria")
 
-        return templates
-
-    def _apply_add(self, operation: Dict[str, Any], templates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _prepare_add(self, operation: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Aplikuje operację ADD - dodanie nowych szablonów
+        Waliduje operację ADD i zwraca dodawany szablon
         """
         new_template = operation.get('template')
-        op_desc = operation.get('description', '')
 
         if not new_template:
             raise ValueError("ADD requires 'template' field")
@@ -257,41 +1155,69 @@ class PatchLoader:
             if field not in new_template:
                 raise ValueError(f"ADD template missing required field: {field}")
 
+        return new_template
+
+    def _apply_add(self, operation: Dict[str, Any], templates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Aplikuje operację ADD - dodanie nowych szablonów
+        """
+        new_template = self._prepare_add(operation)
+
         # Sprawdzamy czy template o takim ID już istnieje
         new_id = new_template['id']
-        existing = next((t for t in templates if t.get('id') == new_id), None)
+        if self._index is not None:
+            existing = self._index.has_id(new_id)
+        else:
+            existing = any(t.get('id') == new_id for t in templates)
 
-        if existing:
-            print(f"      ⚠️  ADD: szablon o ID {new_id} już istnieje, pomijam")
+        if not existing:
+            # Dodajemy nowy template
+            templates.append(new_template)
+            if self._index is not None:
+                self._index.add(new_template)
+
+        self._report_add(operation, new_template, new_template['title'], not existing)
+        return templates
+
+    def _report_add(self, operation: Dict[str, Any], new_template: Dict[str, Any], title: Any, added: bool) -> None:
+        op_desc = operation.get('description', '')
+        if not added:
+            print(f"      ⚠️  ADD: szablon o ID {new_template['id']} już istnieje, pomijam")
             self.stats['skipped'] += 1
-            return templates
+            return
 
-        # Dodajemy nowy template
-        templates.append(new_template)
-        print(f"      ✅ ADD: dodano nowy szablon '{new_template['title']}'")
+        print(f"      ✅ ADD: dodano nowy szablon '{title}'")
         if op_desc:
             print(f"         {op_desc}")
 
-        return templates
+    def _prepare_remove(self, operation: Dict[str, Any]) -> CompiledFilter:
+        """
+        Waliduje operację REMOVE i zwraca skompilowany filtr
+        """
+        if not operation.get('filter', {}):
+            raise ValueError("REMOVE requires 'filter'")
+        return self._get_filter(operation)
 
     def _apply_remove(self, operation: Dict[str, Any], templates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Aplikuje operację REMOVE - usunięcie szablonów
         """
-        filter_criteria = operation.get('filter', {})
-        reason = operation.get('reason', '')
-        op_desc = operation.get('description', '')
-
-        if not filter_criteria:
-            raise ValueError("REMOVE requires 'filter'")
+        compiled = self._prepare_remove(operation)
 
         initial_count = len(templates)
-        templates = [
-            t for t in templates
-            if not self._matches_filter(t, filter_criteria)
-        ]
-        removed_count = initial_count - len(templates)
+        removed = {id(t) for t in self._find_matching(compiled, templates)}
+        if removed:
+            templates = [t for t in templates if id(t) not in removed]
+            if self._index is not None:
+                for ident in removed:
+                    self._index.remove(self._index.templates[ident])
 
+        self._report_remove(operation, initial_count - len(templates))
+        return templates
+
+    def _report_remove(self, operation: Dict[str, Any], removed_count: int) -> None:
+        reason = operation.get('reason', '')
+        op_desc = operation.get('description', '')
         if removed_count > 0:
             print(f"      ✅ REMOVE: usunięto {removed_count} szablon(ów)")
             if op_desc:
@@ -301,8 +1227,6 @@ class PatchLoader:
         else:
             print(f"      ⚠️  REMOVE: brak szablonów spełniających kryteria")
 
-        return templates
-
     def _matches_filter(self, template: Dict[str, Any], filter_criteria: Dict[str, Any]) -> bool:
         """
         Sprawdza czy szablon spełnia kryteria filtrowania
@@ -312,27 +1236,7 @@ class PatchLoader:
         - Wildcardy dla image (zadam/* -> zadam/*)  
         - Case-insensitive dla string pól
         """
-        for key, criteria_value in filter_criteria.items():
-            if key not in template:
-                return False
-
-            template_value = template[key]
-
-            # Dla image field - obsługuj wildcardy
-            if key == 'image' and isinstance(criteria_value, str) and '*' in criteria_value:
-                pattern = criteria_value.replace('*', '.*')
-                if not re.match(f"^{pattern}$", str(template_value), re.IGNORECASE):
-                    return False
-            # Dla string pól - case-insensitive
-            elif isinstance(criteria_value, str) and isinstance(template_value, str):
-                if criteria_value.lower() != template_value.lower():
-                    return False
-            # Dla pozostałych - dokładne dopasowanie
-            else:
-                if criteria_value != template_value:
-                    return False
-
-        return True
+        return CompiledFilter(filter_criteria).matches(template)
 
     def _merge_list_field(self, template: Dict[str, Any], field: str, values: List[Any]) -> None:
         """
@@ -351,8 +1255,25 @@ class PatchLoader:
             current = [current]
             template[field] = current
 
+        # Zbiór kanonicznych kluczy zamiast `value not in current` na liście
+        # słowników - scalanie liniowe zamiast kwadratowego
+        try:
+            seen = {_freeze(item) for item in current}
+        except TypeError:
+            for value in values:
+                if value not in current:
+                    current.append(value)
+            return
+
         for value in values:
-            if value not in current:
+            try:
+                key = _freeze(value)
+            except TypeError:
+                if value not in current:
+                    current.append(value)
+                continue
+            if key not in seen:
+                seen.add(key)
                 current.append(value)
 
     def get_statistics(self) -> Dict[str, Any]:
@@ -372,6 +1293,9 @@ class PatchLoader:
         print(f"     - ADD: {self.stats['operations']['add']}")
         print(f"     - REMOVE: {self.stats['operations']['remove']}")
         print(f"   • Pominięte: {self.stats['skipped']}")
+        if 'memo' in self.stats:
+            print(f"   • Pamięć wyników: {self.stats['memo']['hits']} szablon(ów) odtworzonych, "
+                  f"{self.stats['memo']['misses']} wykonanych od nowa")
         print(f"   • Błędy: {len(self.stats['errors'])}")
 
         if self.stats['errors']:
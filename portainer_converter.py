@@ -25,13 +25,53 @@ Wersja: 2.0.0 (ze wsparciem patch-ów)
 """
 
 import json
+import base64
+import binascii
+import codecs
+import contextlib
+import gc
+import gzip
+import hashlib
+import io
+import itertools
+import lzma
+import marshal
+import mmap
+import queue
+import re
 import requests
+import shutil
 import argparse
 import sys
 import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 from typing import Dict, Any, Optional, List
 from datetime import datetime
-from jsonschema import validate, ValidationError, Draft7Validator
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse, unquote
+from urllib.request import url2pathname
+from schema_validator import get_validator
+from image_reference import ImageIndex
+from near_duplicates import NearDuplicateDetector
+from template_model import CompactTemplateList, StringInterner, TemplateCompactor
+
+# Opcjonalna obsługa plików .zst
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Opcjonalna kompresja brotli wariantów wyjściowych (.br)
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
 
 # Importujemy PatchLoader
 try:
@@ -41,6 +81,398 @@ except ImportError:
     PATCH_LOADER_AVAILABLE = False
     print("⚠️  Ostrzeżenie: Patch loader nie jest dostępny. System patch-ów będzie wyłączony.")
 
+_JSON_WHITESPACE = ' \t\n\r'
+
+
+class _HashingWriter:
+    """Przekazuje zapisy do pliku, licząc rozmiar i skrót SHA-256"""
+
+    def __init__(self, f):
+        self.f = f
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        self.digest.update(data)
+        return self.f.write(data)
+
+    def flush(self) -> None:
+        self.f.flush()
+
+
+class _OutputSink:
+    """
+    Plik wyjściowy zapisywany atomowo: treść trafia do pliku tymczasowego
+    obok docelowego, a commit() podmienia go przez os.replace
+
+    compression: None, 'gzip' lub 'br'; threaded=True przenosi kompresję
+    i zapis do osobnego wątku (zapisy są kolejkowane)
+    """
+
+    _DONE = object()
+
+    def __init__(self, path: str, compression: Optional[str] = None, threaded: bool = False):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+        self.file = os.fdopen(fd, 'wb')
+        self.writer = _HashingWriter(self.file)
+        self.compression = compression
+        self.compressor = None
+        if compression == 'gzip':
+            # mtime=0 i pusta nazwa - identyczna treść daje identyczny plik .gz
+            self.compressor = gzip.GzipFile(filename='', mode='wb', fileobj=self.writer, compresslevel=9, mtime=0)
+        elif compression == 'br':
+            self.compressor = brotli.Compressor(quality=11)
+        self.error = None
+        self.queue = None
+        self.thread = None
+        if threaded:
+            self.queue = queue.Queue(maxsize=256)
+            self.thread = threading.Thread(target=self._worker, name=f"sink-{os.path.basename(path)}", daemon=True)
+            self.thread.start()
+
+    def _write_now(self, data: bytes) -> None:
+        if self.compression == 'gzip':
+            self.compressor.write(data)
+        elif self.compression == 'br':
+            self.writer.write(self.compressor.process(data))
+        else:
+            self.writer.write(data)
+
+    def _finish_now(self) -> None:
+        if self.compression == 'gzip':
+            self.compressor.close()
+        elif self.compression == 'br':
+            self.writer.write(self.compressor.finish())
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+    def _worker(self) -> None:
+        while True:
+            data = self.queue.get()
+            if data is self._DONE:
+                if self.error is None:
+                    try:
+                        self._finish_now()
+                    except Exception as e:
+                        self.error = e
+                return
+            if self.error is None:
+                try:
+                    self._write_now(data)
+                except Exception as e:
+                    self.error = e
+
+    def write(self, data: bytes) -> None:
+        if self.queue is not None:
+            self.queue.put(data)
+        else:
+            self._write_now(data)
+
+    def close(self) -> None:
+        """Kończy zapis (czeka na wątek) i zgłasza ewentualny błąd zapisu"""
+        if self.queue is not None:
+            self.queue.put(self._DONE)
+            self.thread.join()
+        else:
+            self._finish_now()
+        if self.error is not None:
+            raise self.error
+
+    @property
+    def size(self) -> int:
+        return self.writer.size
+
+    @property
+    def sha256(self) -> str:
+        return self.writer.digest.hexdigest()
+
+    def commit(self) -> None:
+        """Nadaje uprawnienia jak zwykły open() i podmienia plik docelowy"""
+        try:
+            mode = os.stat(self.path).st_mode & 0o7777
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(self.tmp_path, mode)
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self) -> None:
+        """Porzuca plik tymczasowy (po błędzie)"""
+        if self.thread is not None and self.thread.is_alive():
+            self.error = self.error or IOError('zapis przerwany')
+            self.queue.put(self._DONE)
+            self.thread.join()
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
+
+
+class _TemplateSpool:
+    """
+    Szablony odłożone do pliku tymczasowego (marshal) i czytane po pozycji
+
+    Etapy potoku strumieniowego, które muszą zobaczyć wszystkie szablony przed
+    wydaniem pierwszego (scalanie, deduplikacja), trzymają w pamięci tylko
+    indeks pozycji; plik jest usuwany przy zamknięciu.
+    """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile(prefix='templates-', suffix='.spool')
+
+    def append(self, template: Dict[str, Any]) -> int:
+        offset = self.file.tell()
+        data = marshal.dumps(template)
+        # Długość przed rekordem - marshal.load z pliku czyta go małymi kawałkami
+        self.file.write(len(data).to_bytes(4, 'little'))
+        self.file.write(data)
+        return offset
+
+    def load(self, offset: int) -> Dict[str, Any]:
+        self.file.seek(offset)
+        size = int.from_bytes(self.file.read(4), 'little')
+        return marshal.loads(self.file.read(size))
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def iter_json_array_items(chunks, key: str = 'templates', meta: Optional[Dict[str, Any]] = None):
+    """
+    Parsuje przyrostowo dokument JSON będący obiektem i zwraca kolejno
+    elementy tablicy pod kluczem `key` (np. szablony z pliku v2)
+
+    W pamięci trzymany jest tylko bieżący element i nieprzetworzona reszta
+    ostatniego kawałka, a nie całe drzewo dokumentu.
+
+    Args:
+        chunks: iterator kawałków dokumentu (bytes w UTF-8 lub str)
+        key: klucz tablicy do strumieniowania
+        meta: opcjonalny słownik, do którego trafiają pozostałe klucze
+              najwyższego poziomu (np. 'version')
+
+    Raises:
+        json.JSONDecodeError: gdy dokument jest niepoprawny
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    state = {'buf': '', 'pos': 0, 'eof': False}
+
+    def fill() -> bool:
+        # Dokłada kolejny kawałek do bufora, odrzucając już przetworzony prefiks
+        if state['eof']:
+            return False
+        for chunk in chunks:
+            text = utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                state['buf'] = state['buf'][state['pos']:] + text
+                state['pos'] = 0
+                return True
+        tail = utf8.decode(b'', final=True)
+        state['buf'] = state['buf'][state['pos']:] + tail
+        state['pos'] = 0
+        state['eof'] = True
+        return bool(tail)
+
+    def peek() -> str:
+        # Pomija białe znaki i zwraca następny znak ('' na końcu dokumentu)
+        while True:
+            buf, pos = state['buf'], state['pos']
+            while pos < len(buf) and buf[pos] in _JSON_WHITESPACE:
+                pos += 1
+            state['pos'] = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return ''
+
+    def expect(chars: str) -> str:
+        char = peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", state['buf'], state['pos'])
+        state['pos'] += 1
+        return char
+
+    def value():
+        # Dekoduje jedną wartość; liczba na końcu bufora mogłaby być ucięta,
+        # więc wymagamy znaku za wartością albo końca strumienia
+        peek()
+        while True:
+            try:
+                result, end = decoder.raw_decode(state['buf'], state['pos'])
+            except json.JSONDecodeError:
+                if not fill():
+                    raise
+                continue
+            if end < len(state['buf']) or state['eof']:
+                state['pos'] = end
+                return result
+            fill()
+
+    expect('{')
+    if peek() == '}':
+        return
+    while True:
+        name = value()
+        expect(':')
+        if name == key and peek() == '[':
+            state['pos'] += 1
+            if peek() == ']':
+                state['pos'] += 1
+            else:
+                while True:
+                    yield value()
+                    if expect(',]') == ']':
+                        break
+        else:
+            item = value()
+            if meta is not None:
+                meta[name] = item
+        if expect(',}') == '}':
+            return
+
+
+class TemplateValidationFailed(Exception):
+    """Walidacja szablonów w potoku strumieniowym nie powiodła się (plik nie jest zapisywany)"""
+
+
+# Walidator JSON Schema procesu roboczego walidacji (kompilowany raz na proces)
+_worker_validator = None
+
+
+def _init_validation_worker(schema: Optional[Dict[str, Any]]) -> None:
+    global _worker_validator
+    _worker_validator = get_validator(schema) if schema is not None else None
+
+
+def _validate_templates_shard(templates: list, schema_limit: Optional[int]) -> list:
+    """Sprawdza fragment szablonów w procesie roboczym (zob. check_templates)"""
+    return check_templates(_worker_validator, templates, schema_limit)
+
+
+def check_template(validator, template: Dict[str, Any]) -> tuple:
+    """
+    Jeden przebieg po szablonie: JSON Schema i sprawdzenia biznesowe v3
+
+    Wynik nie zależy od pozycji szablonu w katalogu, więc może trafić
+    do cache walidacji.
+
+    Returns:
+        (błędy schema jako (ścieżka względem szablonu, komunikat) albo None
+        bez sprawdzenia schema, stare pola v2, czy 'labels' nie jest listą)
+    """
+    schema_errors = None
+    if validator is not None:
+        schema_errors = tuple((tuple(error.path), error.message)
+                              for error in validator.template_errors(None, template))
+
+    # Sprawdzenie starych pól z v2
+    old_fields = tuple(field for field in ('restart_policy', 'platform') if field in template)
+
+    # Sprawdzenie czy labels jest listą (jeśli istnieje)
+    labels_invalid = 'labels' in template and not isinstance(template['labels'], list)
+
+    return schema_errors, old_fields, labels_invalid
+
+
+# Wynik check_template dla szablonu bez błędów
+_VALID_VERDICT = ((), (), False)
+
+
+def check_templates(validator, templates: list, schema_limit: Optional[int] = None) -> list:
+    """
+    Sprawdza szablony po kolei (check_template)
+
+    Args:
+        validator: SchemaValidator (None = bez walidacji JSON Schema)
+        templates: szablony do sprawdzenia
+        schema_limit: po tylu błędach schema kolejne szablony nie są sprawdzane schema (None = bez limitu)
+    """
+    verdicts = []
+    found = 0
+    for template in templates:
+        active = validator if schema_limit is None or found < schema_limit else None
+        verdict = check_template(active, template)
+        if verdict[0]:
+            found += len(verdict[0])
+        verdicts.append(verdict)
+    return verdicts
+
+
+def template_cache_key(template: Dict[str, Any]) -> bytes:
+    """
+    Skrót szablonu (klucz cache walidacji)
+
+    marshal w wersji 2 nie zapisuje referencji współdzielonych obiektów, więc
+    równe szablony z tą samą kolejnością pól (konwerter zawsze ją zachowuje)
+    dają te same bajty - a jest ok. 2× szybszy od json.dumps(sort_keys=True),
+    który kosztowałby więcej niż sama walidacja szablonu.
+    """
+    try:
+        data = marshal.dumps(template, 2)
+    except ValueError:
+        data = json.dumps(template, sort_keys=True, default=repr).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+# Pola v2 kopiowane do v3 bez zmian, w kolejności pól szablonu v3
+V3_COPY_FIELDS = (
+    'categories', 'description', 'env', 'image', 'logo',
+    'maintainer', 'name', 'ports', 'title', 'type', 'volumes',
+    'note', 'repository', 'hostname', 'command', 'network_mode',
+    'privileged', 'interactive', 'administrator_only'
+)
+
+
+_worker_converter = None
+
+
+def _init_conversion_worker(converter_class: type) -> None:
+    """Tworzy konwerter procesu roboczego (raz na proces, bez komunikatów z __init__)"""
+    global _worker_converter
+    with contextlib.redirect_stdout(io.StringIO()):
+        _worker_converter = converter_class()
+
+
+def _convert_templates_shard(start: int, templates: list) -> list:
+    """Konwertuje fragment szablonów w procesie roboczym; ID jak w przebiegu szeregowym"""
+    convert = _worker_converter.convert_template
+    return [convert(template, idx) for idx, template in enumerate(templates, start + 1)]
+
+
+def canonical_template_hash(template: Dict[str, Any]) -> bytes:
+    """
+    Skrót kanonicznej postaci szablonu v2 (tryb przyrostowy)
+
+    W przeciwieństwie do template_cache_key nie zależy od kolejności pól ani
+    kategorii - źródła zapisują je dowolnie, a scalanie buduje kategorie ze zbioru.
+    """
+    categories = template.get('categories')
+    if isinstance(categories, list) and all(isinstance(c, str) for c in categories):
+        template = dict(template, categories=sorted(categories))
+    data = json.dumps(template, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=repr)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).digest()
+
+
+def template_change_key(template: Dict[str, Any]) -> str:
+    """
+    Klucz szablonu w zbiorach zmian: nazwa (lub tytuł) i obraz
+    (lub repozytorium stosu), jak przy scalaniu źródeł
+    """
+    name = str(template.get('name') or template.get('title') or '').lower().strip()
+    image = template.get('image')
+    if not image:
+        repository = template.get('repository') or {}
+        image = f"{repository.get('url', '')}/{repository.get('stackfile', '')}" if repository else ''
+    return f"{name}|{str(image).lower().strip()}"
+
+
 class PortainerTemplateConverter:
     """Klasa do konwersji szablonów Portainer z v2 na v3"""
 
@@ -52,6 +484,54 @@ class PortainerTemplateConverter:
         self.patch_loader = None
         self.patch_stats = None
 
+        # Ustawienia pobierania
+        self.download_timeout = 30        # limit czasu na jedno źródło (sekundy)
+        self.total_timeout = None         # limit czasu na wszystkie źródła (sekundy)
+        self.max_concurrency = 4          # maksymalna liczba równoległych pobrań
+        self.max_retries = 3              # liczba ponowień po błędzie przejściowym
+        self.backoff_base = 0.5           # bazowe opóźnienie ponowienia (sekundy)
+        self.backoff_max = 10.0           # maksymalne opóźnienie ponowienia (sekundy)
+        self.max_connections_per_host = 4 # limit połączeń w puli na jeden host
+        self.session = None               # współdzielona sesja HTTP (tworzona leniwie)
+        self.fetch_attempts = []          # statystyki prób pobrania (url, próba, status, czas)
+        self.stream = False               # potok strumieniowy od źródła do pliku wyjściowego
+        self.compact = False              # szablony od wczytania źródeł w modelu zwartym (template_model)
+        self.intern_strings = False       # internowanie powtarzalnych wartości źródeł i patch-y (--intern-strings)
+        self.normalize_images = False     # scalanie źródeł po znormalizowanej referencji obrazu (image_reference)
+        self.near_duplicate_threshold = None  # próg Jaccarda etapu prawie-duplikatów (None = wyłączony)
+        self.near_duplicate_stats = None  # klastry i usunięte szablony etapu prawie-duplikatów
+        self.source_templates_count = 0   # liczba szablonów źródłowych w ostatniej konwersji
+        self.output_summary = None        # liczba, typy i kategorie szablonów zapisanych strumieniowo
+        self.output_stats = None          # rozmiar i skrót ostatnio zapisanego pliku
+        self.precompress = False          # zapis wariantów .min.json / .gz / .br
+        self.schema_error_limit = 10      # walidacja JSON Schema kończy się po tylu błędach (0 = bez limitu)
+        self.validation_jobs = 1          # liczba procesów walidacji szablonów
+        self.conversion_jobs = 1          # liczba procesów konwersji v2 -> v3
+        self.use_validation_cache = True  # wyniki walidacji niezmienionych szablonów z cache
+        self.validation_stats = None      # liczba szablonów sprawdzonych / wziętych z cache walidacji
+
+        # Ekstrakcja logo zapisanych inline (data:image/...;base64)
+        self.logo_assets_dir = None       # katalog na pliki logo (None = wyłączone)
+        self.logo_base_url = None         # bazowy URL, pod którym serwowany jest katalog
+        self.logo_stats = None
+        self._logo_staging = None         # katalog tymczasowy logo bieżącego budowania (przenoszone po zapisie)
+
+        # Cache źródeł (ETag / Last-Modified) i manifest ostatniego budowania
+        self.cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+        self.use_cache = True
+        self.skip_unchanged = False
+        self.incremental = False          # budowanie przyrostowe (zbiory zmian szablonów)
+        self.template_changes = None      # klucze szablonów dodanych / zmienionych / usuniętych
+        self._conversion_state = None     # odciski szablonów bieżącego budowania (zapis po sukcesie)
+        self.checkpoints = False          # zapis checkpointów etapów run() w katalogu cache
+        self.resume = False               # wznawianie od ostatniego aktualnego checkpointu
+        self.source_fingerprints = {}     # url -> sha256 treści źródła
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        self._stats_lock = threading.Lock()
+        self._session_lock = threading.Lock()   # get_session bywa wołane z wątków pobierania
+        self._compactor = TemplateCompactor()   # wspólna tablica wartości modelu zwartego (--compact)
+        self.interner = StringInterner()        # internowanie powtarzalnych wartości źródeł i patch-y
+
         # Inicjalizujemy patch loader jeśli dostępny
         if PATCH_LOADER_AVAILABLE:
             try:
@@ -106,18 +586,149 @@ class PortainerTemplateConverter:
             print("   Walidacja JSON Schema zostanie pominięta")
             return None
 
-    def download_v2_templates(self, url: str, source_name: str = None) -> Optional[Dict[str, Any]]:
+    # Rozszerzenia plików v2 zbieranych z katalogów źródłowych
+    LOCAL_SOURCE_EXTENSIONS = ('.json', '.json.gz', '.json.xz', '.json.zst')
+
+    def local_source_path(self, source: str) -> Optional[str]:
+        """
+        Zwraca ścieżkę lokalną dla źródła file:// lub istniejącej ścieżki
+        (None dla źródeł HTTP)
+        """
+        if source.startswith('file://'):
+            return url2pathname(unquote(urlparse(source).path))
+        if '://' not in source:
+            return source
+        return None
+
+    def expand_sources(self, sources: list) -> list:
+        """
+        Rozwija katalogi na listę zawartych w nich plików v2
+        (posortowanych po nazwie); pozostałe źródła zostawia bez zmian
+        """
+        expanded = []
+        for source in sources:
+            path = self.local_source_path(source)
+            if path and os.path.isdir(path):
+                files = sorted(
+                    os.path.join(path, name) for name in os.listdir(path)
+                    if name.lower().endswith(self.LOCAL_SOURCE_EXTENSIONS)
+                    and os.path.isfile(os.path.join(path, name))
+                )
+                if not files:
+                    print(f"⚠️  Katalog {path} nie zawiera plików v2 ({', '.join(self.LOCAL_SOURCE_EXTENSIONS)})")
+                expanded.extend(files)
+            else:
+                expanded.append(source)
+        return expanded
+
+    # Błędy odczytu źródła (sieć, plik, uszkodzona kompresja) - źródło jest pomijane
+    SOURCE_READ_ERRORS = (OSError, EOFError, lzma.LZMAError) + ((zstandard.ZstdError,) if ZSTD_AVAILABLE else ())
+
+    def _open_compressed(self, path: str):
+        """
+        Otwiera plik skompresowany (gzip/xz/zstd - rozpoznawane po nagłówku)
+        Zwraca obiekt plikowy z rozpakowaną treścią lub None dla pliku zwykłego
+        """
+        with open(path, 'rb') as f:
+            magic = f.read(6)
+
+        if magic.startswith(b'\x1f\x8b'):
+            return gzip.open(path, 'rb')
+        if magic.startswith(b'\xfd7zXZ\x00'):
+            return lzma.open(path, 'rb')
+        if magic.startswith(b'\x28\xb5\x2f\xfd'):
+            if not ZSTD_AVAILABLE:
+                raise OSError(f"plik {path} jest skompresowany zstd, a pakiet 'zstandard' nie jest zainstalowany")
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return None
+
+    def _iter_local_chunks(self, path: str, chunk_size: int = 64 * 1024):
+        """
+        Zwraca kolejne kawałki treści pliku lokalnego (rozpakowanej jeśli trzeba)
+        Pliki nieskompresowane są czytane przez mapowanie pamięci (mmap)
+        i zapisuje odcisk surowego pliku w self.source_fingerprints
+        """
+        digest = hashlib.sha256()
+        compressed = self._open_compressed(path)
+
+        if compressed is not None:
+            with open(path, 'rb') as raw:
+                for block in iter(lambda: raw.read(1024 * 1024), b''):
+                    digest.update(block)
+            with compressed:
+                for chunk in iter(lambda: compressed.read(chunk_size), b''):
+                    yield chunk
+        elif os.path.getsize(path) > 0:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+                for offset in range(0, len(mapped), chunk_size):
+                    yield mapped[offset:offset + chunk_size]
+
+        self.source_fingerprints[path] = digest.hexdigest()
+
+    def _read_local_source(self, path: str) -> bytes:
+        """
+        Wczytuje całą treść pliku lokalnego (rozpakowaną jeśli trzeba)
+        Pliki nieskompresowane są czytane przez mapowanie pamięci (mmap)
+        """
+        compressed = self._open_compressed(path)
+        if compressed is not None:
+            with compressed:
+                body = compressed.read()
+            with open(path, 'rb') as raw, mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                self.source_fingerprints[path] = hashlib.sha256(mapped).hexdigest()
+            return body
+
+        if os.path.getsize(path) == 0:
+            self.source_fingerprints[path] = hashlib.sha256(b'').hexdigest()
+            return b''
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            self.source_fingerprints[path] = hashlib.sha256(mapped).hexdigest()
+            return mapped[:]
+
+    def download_v2_templates(self, url: str, source_name: str = None,
+                              abort_event: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
         """
         Pobiera szablon v2 z podanego URL
+
+        Limit self.download_timeout obejmuje całe pobieranie źródła (połączenie
+        i odczyt treści), a nie tylko pojedyncze operacje sieciowe.
+        abort_event pozwala przerwać odczyt po przekroczeniu limitu globalnego.
         """
         source_label = f" ({source_name})" if source_name else ""
+        local_path = self.local_source_path(url)
+        if local_path:
+            return self._load_local_v2_templates(url, local_path, source_label)
+
         print(f"📥 Pobieranie szablonu v2 z: {url}{source_label}")
 
+        deadline = time.monotonic() + self.download_timeout
+        cached = self._load_http_cache(url) if self.use_cache else None
+
+        # Zapytanie warunkowe - serwer odpowie 304 jeśli źródło się nie zmieniło
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
+            response, body = self._fetch_with_retry(url, headers, deadline, abort_event)
+            if response.status_code == 304 and cached:
+                body = cached['body']
+                with self._stats_lock:
+                    self.cache_stats['hits'] += 1
+                print(f"♻️  Źródło bez zmian (304), używam cache{source_label}")
+            else:
+                response.raise_for_status()
+                with self._stats_lock:
+                    self.cache_stats['misses'] += 1
+                if self.use_cache:
+                    self._store_http_cache(url, response, body)
 
-            data = response.json()
+            data = self._parse_v2_body(body)
+            self.source_fingerprints[url] = hashlib.sha256(body).hexdigest()
 
             if str(data.get('version')) != '2':
                 print(f"⚠️  Ostrzeżenie: Oczekiwano wersji '2', znaleziono '{data.get('version')}'")
@@ -129,35 +740,763 @@ class PortainerTemplateConverter:
         except requests.RequestException as e:
             print(f"⚠️  Błąd pobierania pliku{source_label}: {e}")
             return None
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            print(f"⚠️  Błąd parsowania JSON{source_label}: {e}")
+            return None
+
+    def _load_local_v2_templates(self, url: str, path: str, source_label: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Wczytuje szablon v2 z pliku lokalnego (bez sieci i cache HTTP)
+        """
+        print(f"📂 Wczytywanie szablonu v2 z pliku: {path}{source_label}")
+        try:
+            data = self._parse_v2_body(self._read_local_source(path))
+            self.source_fingerprints[url] = self.source_fingerprints[path]
+        except self.SOURCE_READ_ERRORS as e:
+            print(f"⚠️  Błąd odczytu pliku{source_label}: {e}")
+            return None
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
             print(f"⚠️  Błąd parsowania JSON{source_label}: {e}")
             return None
 
-    def download_multiple_sources(self, urls: list) -> list:
+        if str(data.get('version')) != '2':
+            print(f"⚠️  Ostrzeżenie: Oczekiwano wersji '2', znaleziono '{data.get('version')}'")
+
+        print(f"✅ Wczytano {len(data.get('templates', []))} szablonów{source_label}")
+        return data
+
+    def _parse_v2_body(self, body: bytes) -> Dict[str, Any]:
+        """
+        Parsuje treść źródła v2; przy --intern-strings internuje powtarzalne
+        wartości szablonów we wspólnej tablicy self.interner (mniej pamięci
+        na listach szablonów kosztem dłuższego parsowania)
+
+        W trybie --compact szablony są zwijane do CompactTemplateList w trakcie
+        parsowania (iter_json_array_items), bez drzewa JSON całego źródła -
+        kompaktor sam współdzieli powtarzalne wartości, więc internowanie
+        nie jest tu potrzebne.
+        """
+        if not self.compact:
+            data = json.loads(body)
+            if self.intern_strings:
+                self.interner.intern_templates(data.get('templates') or [])
+            return data
+        data = {}
+        chunks = (body[start:start + 64 * 1024] for start in range(0, len(body), 64 * 1024))
+        templates = iter_json_array_items(chunks, 'templates', data)
+        if self.intern_strings:
+            templates = self.interner.iter_interned(templates)
+        data['templates'] = CompactTemplateList(templates, self._compactor)
+        return data
+
+    def _http_cache_paths(self, url: str) -> tuple:
+        """Zwraca ścieżki (metadane, treść) wpisu cache dla URL"""
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        base = os.path.join(self.cache_dir, 'http', key)
+        return base + '.json', base + '.body'
+
+    def _load_http_cache(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Wczytuje wpis cache dla URL
+        Zwraca None jeśli wpisu brak lub treść nie zgadza się z zapisanym skrótem
+        """
+        meta_path, body_path = self._http_cache_paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        if entry.get('url') != url or hashlib.sha256(body).hexdigest() != entry.get('sha256'):
+            return None
+
+        entry['body'] = body
+        return entry
+
+    def _store_http_cache(self, url: str, response: requests.Response, body: bytes) -> None:
+        """Zapisuje treść źródła wraz z ETag / Last-Modified i skrótem treści"""
+        meta_path, body_path = self._http_cache_paths(url)
+        entry = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'sha256': hashlib.sha256(body).hexdigest(),
+            'size': len(body),
+        }
+        try:
+            self._write_file_atomic(body_path, body)
+            self._write_file_atomic(meta_path, json.dumps(entry, indent=2).encode('utf-8'))
+        except OSError as e:
+            print(f"⚠️  Nie udało się zapisać cache dla {url}: {e}")
+
+    def _write_file_atomic(self, path: str, data: bytes) -> None:
+        """Zapisuje plik przez plik tymczasowy i atomową zamianę nazwy"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def build_fingerprint(self, urls: list, output_file: str) -> Dict[str, Any]:
+        """
+        Zwraca odcisk wejść budowania: treści źródeł, patch-y i kod konwertera
+        Dwa identyczne odciski oznaczają identyczny plik wynikowy
+        """
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        code_hash = hashlib.sha256()
+        for name in ('portainer_converter.py', 'schema_validator.py', 'schema_v3.json', 'image_reference.py',
+                     'near_duplicates.py', 'template_model.py', os.path.join('patches', '_patch_loader.py')):
+            try:
+                with open(os.path.join(base_dir, name), 'rb') as f:
+                    code_hash.update(f.read())
+            except OSError:
+                code_hash.update(b'missing:' + name.encode('utf-8'))
+
+        self._configure_patch_cache()
+        return {
+            'sources': [[url, self.source_fingerprints.get(url)] for url in urls],
+            'patches': self.patch_loader.fingerprint() if self.patch_loader else None,
+            'code': code_hash.hexdigest(),
+            'output': os.path.abspath(output_file),
+            'options': self.build_options(),
+        }
+
+    def _configure_patch_cache(self) -> None:
+        """Ustawia katalog bundle patchy-ów zgodnie z ustawieniami cache"""
+        if self.patch_loader:
+            self.patch_loader.cache_dir = self.cache_dir if self.use_cache else None
+
+    def build_options(self) -> Dict[str, Any]:
+        """Zwraca opcje wpływające na zawartość pliku wynikowego"""
+        return {
+            'logo_assets_dir': os.path.abspath(self.logo_assets_dir) if self.logo_assets_dir else None,
+            'logo_base_url': self.logo_base_url,
+            'precompress': self.precompress,
+            'normalize_images': self.normalize_images,
+            'near_duplicates': self.near_duplicate_threshold,
+        }
+
+    def _build_manifest_path(self) -> str:
+        return os.path.join(self.cache_dir, 'last_build.json')
+
+    def is_build_unchanged(self, fingerprint: Dict[str, Any], ignore_sources: bool = False) -> bool:
+        """
+        Sprawdza czy wejścia są identyczne z ostatnim udanym budowaniem
+        i czy plik wynikowy nadal ma zapisaną zawartość
+
+        Przy ignore_sources=True bajty źródeł nie są porównywane - w trybie
+        przyrostowym odcisk zawiera skrót kanonicznych szablonów ('templates').
+        """
+        try:
+            with open(self._build_manifest_path(), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            with open(fingerprint['output'], 'rb') as f:
+                output_hash = hashlib.sha256(f.read()).hexdigest()
+        except (OSError, json.JSONDecodeError):
+            return False
+
+        previous = manifest.get('fingerprint')
+        if ignore_sources and isinstance(previous, dict):
+            previous = dict(previous, sources=fingerprint.get('sources'))
+        return previous == fingerprint and manifest.get('output_sha256') == output_hash
+
+    def save_build_manifest(self, fingerprint: Dict[str, Any]) -> None:
+        """Zapisuje manifest udanego budowania (odcisk wejść + skrót wyniku)"""
+        try:
+            if self.output_stats and os.path.abspath(self.output_stats['file']) == fingerprint['output']:
+                output_hash = self.output_stats['sha256']
+            else:
+                with open(fingerprint['output'], 'rb') as f:
+                    output_hash = hashlib.sha256(f.read()).hexdigest()
+            manifest = {
+                'fingerprint': fingerprint,
+                'output_sha256': output_hash,
+                'date': datetime.now().isoformat(timespec='seconds'),
+            }
+            self._write_file_atomic(self._build_manifest_path(),
+                                    json.dumps(manifest, indent=2).encode('utf-8'))
+        except OSError as e:
+            print(f"⚠️  Nie udało się zapisać manifestu budowania: {e}")
+
+    def _conversion_state_path(self) -> str:
+        return os.path.join(self.cache_dir, 'conversion_state.json')
+
+    def _template_changes_path(self) -> str:
+        return os.path.join(self.cache_dir, 'template_changes.json')
+
+    def detect_template_changes(self, templates: Optional[list] = None) -> Dict[str, list]:
+        """
+        Porównuje kanoniczne odciski szablonów v2 z ostatnim udanym budowaniem
+
+        Bez templates porównywane są odciski odtworzone z checkpointu (--resume).
+
+        Returns:
+            Słownik 'added' / 'changed' / 'removed' z posortowanymi kluczami
+            szablonów (template_change_key); bez zapisanego stanu wszystkie
+            szablony są nowe
+        """
+        previous, known = {}, {}
+        try:
+            with open(self._conversion_state_path(), 'rb') as f:
+                previous, known = self._decode_conversion_state(json.loads(f.read()))
+        except (OSError, ValueError, TypeError, AttributeError, KeyError):
+            # Brak lub uszkodzony stan - wszystkie szablony są nowe
+            previous, known = {}, {}
+
+        # Postać kanoniczna (json z sort_keys) jest ok. 6× droższa od skrótu
+        # template_cache_key, więc liczona jest tylko dla szablonów, których
+        # surowego skrótu nie było w poprzednim budowaniu
+        if templates is not None:
+            current, raw = {}, {}
+            sequence = hashlib.blake2b(digest_size=16)
+            for template in templates:
+                raw_key = template_cache_key(template)
+                digest = known.get(raw_key) or canonical_template_hash(template)
+                raw[raw_key] = digest
+                current.setdefault(template_change_key(template), []).append(digest)
+                sequence.update(digest)
+            self._conversion_state = {'templates': current, 'raw': raw, 'sequence': sequence.hexdigest()}
+
+        current = self._conversion_state['templates']
+        self.template_changes = {
+            'added': sorted(key for key in current if key not in previous),
+            'changed': sorted(key for key, digests in current.items()
+                              if key in previous and previous[key] != digests),
+            'removed': sorted(key for key in previous if key not in current),
+        }
+        return self.template_changes
+
+    @staticmethod
+    def _unpack_digests(packed: str) -> List[bytes]:
+        """Rozkłada sklejone skróty (po 16 bajtów, hex) na listę"""
+        data = bytes.fromhex(packed)
+        if len(data) % 16:
+            raise ValueError("niepoprawne skróty w stanie budowania")
+        return [data[start:start + 16] for start in range(0, len(data), 16)]
+
+    def _decode_conversion_state(self, state: Dict[str, Any]) -> tuple:
+        """
+        Odtwarza (klucz szablonu -> skróty, surowy skrót -> skrót kanoniczny)
+        z JSON; ValueError / TypeError, gdy struktura się nie zgadza
+        """
+        previous = {}
+        for key, packed in state['templates'].items():
+            previous[key] = self._unpack_digests(packed)
+        raw_keys, digests = state['raw']
+        raw_keys, digests = self._unpack_digests(raw_keys), self._unpack_digests(digests)
+        if len(raw_keys) != len(digests):
+            raise ValueError("niepoprawny stan budowania")
+        return previous, dict(zip(raw_keys, digests))
+
+    @staticmethod
+    def _encode_conversion_state(state: Dict[str, Any]) -> Dict[str, Any]:
+        """Zapisuje stan budowania w postaci JSON (skróty sklejone w ciągi hex)"""
+        return {
+            'templates': {key: b''.join(digests).hex() for key, digests in state['templates'].items()},
+            'raw': [b''.join(state['raw']).hex(), b''.join(state['raw'].values()).hex()],
+            'sequence': state['sequence'],
+        }
+
+    def save_conversion_state(self) -> None:
+        """
+        Zapisuje odciski szablonów i zbiory zmian udanego budowania
+
+        template_changes.json jest przeznaczony dla kolejnych etapów
+        (np. powiadomień), conversion_state.json - dla następnego porównania
+        (skróty sklejone w ciągi hex, bez wpisu JSON na każdy skrót).
+        """
+        if self._conversion_state is None:
+            return
+        data = self._encode_conversion_state(self._conversion_state)
+        try:
+            self._write_file_atomic(self._conversion_state_path(),
+                                    json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            self._write_file_atomic(self._template_changes_path(),
+                                    json.dumps(self.template_changes, indent=2, ensure_ascii=False).encode('utf-8'))
+        except OSError as e:
+            print(f"⚠️  Nie udało się zapisać stanu budowania przyrostowego: {e}")
+
+    # Etapy run() z checkpointami w kolejności wykonywania; 'convert' obejmuje
+    # deduplikację, 'validate' to znacznik bez danych, a rolę checkpointu
+    # zapisu pełni manifest budowania (--skip-unchanged)
+    CHECKPOINT_STAGES = ('fetch', 'merge', 'convert', 'patch', 'validate')
+
+    # Atrybuty konwertera zapisywane i odtwarzane razem z checkpointem
+    CHECKPOINT_STATE = ('source_templates_count', 'patch_stats', '_conversion_state')
+
+    def _checkpoint_path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, 'checkpoints', name)
+
+    @staticmethod
+    def checkpoint_key(*parts) -> str:
+        """Klucz checkpointu - skrót odcisków wejść etapu"""
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def fetch_checkpoint_key(self, urls: list) -> str:
+        """
+        Klucz checkpointu pobierania: URL-e źródeł, a dla plików lokalnych także
+        ich rozmiar, czas modyfikacji i skrót treści - zmieniony plik unieważnia
+        checkpoint. Źródeł zdalnych nie da się sprawdzić bez pobrania, więc przy
+        wznowieniu zostają w stanie z checkpointu.
+        """
+        stamps = []
+        for url in urls:
+            local_path = self.local_source_path(url)
+            stamp = None
+            if local_path:
+                try:
+                    stat = os.stat(local_path)
+                    stamp = [stat.st_size, stat.st_mtime_ns, self._file_sha256(local_path)]
+                except OSError:
+                    stamp = 'missing'
+            stamps.append([url, stamp])
+        return self.checkpoint_key('fetch', stamps)
+
+    def checkpoint_keys(self, fingerprint: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Klucze checkpointów etapów po pobraniu, wyprowadzane z odcisku budowania:
+        każdy obejmuje klucz etapu poprzedniego i wejścia dochodzące w danym etapie
+        """
+        # Normalizacja obrazów zmienia wynik scalania, a więc wejście konwersji
+        sources = self.checkpoint_key('sources', fingerprint['sources'], fingerprint['code'],
+                                      fingerprint['options'].get('normalize_images'))
+        # Etap prawie-duplikatów jest częścią konwersji
+        convert = self.checkpoint_key('convert', sources, fingerprint['options'].get('near_duplicates'))
+        patch = self.checkpoint_key('patch', convert, fingerprint['patches'])
+        return {
+            'merge': self.checkpoint_key('merge', sources),
+            'convert': convert,
+            'patch': patch,
+            'validate': self.checkpoint_key('validate', patch, fingerprint['options']),
+        }
+
+    def load_checkpoint_index(self) -> Dict[str, Any]:
+        """Zwraca wpisy checkpointów (etap -> klucz, data) z index.json"""
+        try:
+            with open(self._checkpoint_path('index.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def save_checkpoint(self, stage: str, key: str, data: Any = None, **meta) -> None:
+        """
+        Zapisuje checkpoint etapu (przy --checkpoint / --resume)
+
+        Dane i stan konwertera trafiają do checkpoints/<etap>.json, a klucz,
+        data i meta do index.json - wybór etapu wznowienia nie wczytuje danych.
+        Checkpointy mogą pochodzić spoza uruchomienia (np. cache CI), więc tak
+        jak pozostałe pliki w cache są zapisywane jako JSON i sprawdzane przy odczycie.
+        """
+        if not self.checkpoints or key is None:
+            return
+        try:
+            if data is not None:
+                state = {name: getattr(self, name) for name in self.CHECKPOINT_STATE}
+                if state['_conversion_state'] is not None:
+                    state['_conversion_state'] = self._encode_conversion_state(state['_conversion_state'])
+                checkpoint = {'key': key, 'data': data, 'state': state}
+                self._write_file_atomic(self._checkpoint_path(f"{stage}.json"),
+                                        json.dumps(checkpoint, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            index = self.load_checkpoint_index()
+            index[stage] = dict(meta, key=key, date=datetime.now().isoformat(timespec='seconds'))
+            self._write_file_atomic(self._checkpoint_path('index.json'),
+                                    json.dumps(index, indent=2).encode('utf-8'))
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️  Nie udało się zapisać checkpointu '{stage}': {e}")
+
+    # Klucze danych etapów odczytywane przez run() po wznowieniu
+    CHECKPOINT_DATA_KEYS = {
+        'merge': ('v2', 'merge_stats'),
+        'convert': ('v3', 'merge_stats', 'version'),
+        'patch': ('v3', 'merge_stats', 'version'),
+    }
+
+    def load_checkpoint(self, stage: str, key: str) -> Any:
+        """
+        Wczytuje dane checkpointu etapu i odtwarza zapisany z nim stan konwertera
+
+        Odtwarzane są tylko atrybuty z CHECKPOINT_STATE o oczekiwanych typach;
+        uszkodzony lub niepoprawny checkpoint jest traktowany jak jego brak.
+
+        Returns:
+            Dane etapu albo None, gdy checkpointu brak, ma inny klucz lub jest niepoprawny
+        """
+        try:
+            with open(self._checkpoint_path(f"{stage}.json"), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        # Setki tysięcy nowych kontenerów uruchamiałyby cykliczny GC wielokrotnie
+        # w trakcie wczytywania, a JSON i tak nie tworzy cykli
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            checkpoint = json.loads(data)
+            if not isinstance(checkpoint, dict) or checkpoint.get('key') != key:
+                return None
+            state = self._decode_checkpoint_state(checkpoint['state'])
+            data = checkpoint['data']
+            if stage == 'fetch':
+                # Wiele źródeł: lista par [url, dane]; jedno źródło: dane v2
+                if isinstance(data, list):
+                    if not all(isinstance(item, list) and len(item) == 2 and isinstance(item[0], str)
+                               and isinstance(item[1], dict) for item in data):
+                        raise ValueError("niepoprawne źródła w checkpoincie")
+                elif not isinstance(data, dict):
+                    raise ValueError("niepoprawne źródła w checkpoincie")
+            elif not (isinstance(data, dict) and all(name in data for name in self.CHECKPOINT_DATA_KEYS[stage])):
+                raise ValueError("niepoprawne dane w checkpoincie")
+        except (ValueError, TypeError, AttributeError, KeyError):
+            # Uszkodzony lub niepoprawny checkpoint - etap jest wykonywany od nowa
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+        for name, value in state.items():
+            setattr(self, name, value)
+        return data
+
+    def _decode_checkpoint_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Odtwarza stan konwertera z checkpointu (tylko nazwy z CHECKPOINT_STATE);
+        ValueError / TypeError, gdy brakuje atrybutu lub jego typ się nie zgadza
+        """
+        if not isinstance(state, dict) or set(state) != set(self.CHECKPOINT_STATE):
+            raise ValueError("niepoprawny stan w checkpoincie")
+        count, patch_stats, conversion = (state[name] for name in self.CHECKPOINT_STATE)
+        if type(count) is not int or not isinstance(patch_stats, (dict, type(None))):
+            raise ValueError("niepoprawny stan w checkpoincie")
+        if conversion is not None:
+            previous, raw = self._decode_conversion_state(conversion)
+            if not isinstance(conversion['sequence'], str):
+                raise ValueError("niepoprawny stan budowania")
+            conversion = {'templates': previous, 'raw': raw, 'sequence': conversion['sequence']}
+        return {'source_templates_count': count, 'patch_stats': patch_stats, '_conversion_state': conversion}
+
+    def _fetch_sources(self, urls: list, multi: bool) -> Any:
+        """Pobiera źródła: listę (url, dane) dla wielu źródeł albo dane jednego"""
+        if multi:
+            fetched = self._download_sources(urls)
+            if not fetched:
+                print("❌ Nie udało się pobrać żadnego źródła")
+                sys.exit(1)
+        else:
+            fetched = self.download_v2_templates(urls[0])
+            if not fetched:
+                print("❌ Nie udało się pobrać szablonów")
+                sys.exit(1)
+        return fetched
+
+    # Statusy HTTP uznawane za błędy przejściowe (warte ponowienia)
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def get_session(self) -> requests.Session:
+        """
+        Zwraca współdzieloną sesję HTTP z pulą połączeń (keep-alive)
+        Ponowienia realizuje _fetch_with_retry, więc adapter ich nie wykonuje
+
+        Pierwsze wywołania mogą przyjść jednocześnie z kilku wątków pobierania -
+        sesja jest tworzona pod blokadą, więc wszystkie dostają tę samą pulę.
+        """
+        with self._session_lock:
+            if self.session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=max(1, self.max_concurrency),
+                    pool_maxsize=max(1, self.max_connections_per_host),
+                    pool_block=True,
+                    max_retries=0
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.session = session
+            return self.session
+
+    def close(self) -> None:
+        """Zamyka współdzieloną sesję HTTP"""
+        with self._session_lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Opóźnienie przed ponowieniem: wykładnicze z pełnym jitterem"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _fetch_with_retry(self, url: str, headers: Dict[str, str], deadline: float,
+                          abort_event: Optional[threading.Event] = None,
+                          read_body: bool = True) -> tuple:
+        """
+        Pobiera URL przez współdzieloną sesję, ponawiając błędy przejściowe
+        (błędy połączenia, timeouty, statusy z RETRY_STATUSES)
+
+        Każda próba jest zapisywana w self.fetch_attempts.
+
+        Args:
+            read_body: False zwraca otwartą odpowiedź bez odczytu treści
+                       (tryb strumieniowy - wywołujący zamyka odpowiedź)
+
+        Returns:
+            Tuple (response, body) - przy read_body=True response jest już
+            zamknięty, przy read_body=False body jest None
+        """
+        session = self.get_session()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            started = time.monotonic()
+            record = {'url': url, 'attempt': attempt, 'status': None, 'seconds': 0.0, 'error': None}
+            retryable = False
+            response = None
+            try:
+                response = session.get(url, headers=headers, timeout=self.download_timeout, stream=True)
+                record['status'] = response.status_code
+                if response.status_code in self.RETRY_STATUSES:
+                    retryable = True
+                    error = requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+                elif not read_body:
+                    return response, None
+                else:
+                    body = b'' if response.status_code == 304 else self._read_body(response, deadline, abort_event)
+                    return response, body
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                record['error'] = str(e)
+                retryable = not (abort_event is not None and abort_event.is_set())
+                error = e
+            finally:
+                record['seconds'] = round(time.monotonic() - started, 4)
+                self.fetch_attempts.append(record)
+                if response is not None and (read_body or retryable):
+                    response.close()
+
+            delay = self._backoff_delay(attempt - 1)
+            if not retryable or attempt > self.max_retries or time.monotonic() + delay > deadline:
+                raise error
+
+            print(f"🔁 Ponawianie {url} za {delay:.2f}s (próba {attempt + 1}/{self.max_retries + 1}): {error}")
+            time.sleep(delay)
+
+    def stream_v2_templates(self, url: str, source_name: str = None,
+                            meta: Optional[Dict[str, Any]] = None):
+        """
+        Pobiera szablon v2 strumieniowo i zwraca kolejne szablony w miarę
+        odczytu odpowiedzi, bez trzymania całej treści i drzewa JSON w pamięci
+
+        Odpowiedź 304 jest czytana z pliku cache, odpowiedź 200 jest zapisywana
+        do cache w trakcie odczytu. Limit czasu źródła nie obejmuje tu czasu
+        przetwarzania szablonów przez kolejne etapy.
+
+        Args:
+            meta: opcjonalny słownik na klucze najwyższego poziomu (np. 'version')
+        """
+        source_label = f" ({source_name})" if source_name else ""
+        print(f"📥 Strumieniowe pobieranie szablonu v2 z: {url}{source_label}")
+
+        meta = meta if meta is not None else {}
+        count = 0
+        for template in iter_json_array_items(self._iter_source_chunks(url), 'templates', meta):
+            count += 1
+            yield template
+
+        if str(meta.get('version')) != '2':
+            print(f"⚠️  Ostrzeżenie: Oczekiwano wersji '2', znaleziono '{meta.get('version')}'")
+        print(f"✅ Pobrano strumieniowo {count} szablonów{source_label}")
+
+    def _iter_source_chunks(self, url: str, chunk_size: int = 64 * 1024):
         """
-        Pobiera szablony z wielu źródeł
-        Zwraca listę tupli (url, data)
+        Zwraca kolejne kawałki treści źródła (z sieci lub z cache przy 304)
+        i zapisuje odcisk treści w self.source_fingerprints
         """
-        print(f"📥 Pobieranie szablonów z {len(urls)} źródeł...")
+        local_path = self.local_source_path(url)
+        if local_path:
+            yield from self._iter_local_chunks(local_path, chunk_size)
+            self.source_fingerprints[url] = self.source_fingerprints[local_path]
+            return
+
+        cached_meta = None
+        meta_path, body_path = self._http_cache_paths(url)
+        if self.use_cache:
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    cached_meta = json.load(f)
+                # Jak w _load_http_cache: treść musi zgadzać się z zapisanym skrótem,
+                # inaczej zapytanie nie jest warunkowe i źródło jest pobierane od nowa
+                if cached_meta.get('url') != url or self._file_sha256(body_path) != cached_meta.get('sha256'):
+                    cached_meta = None
+            except (OSError, json.JSONDecodeError, AttributeError):
+                cached_meta = None
+
+        headers = {}
+        if cached_meta:
+            if cached_meta.get('etag'):
+                headers['If-None-Match'] = cached_meta['etag']
+            if cached_meta.get('last_modified'):
+                headers['If-Modified-Since'] = cached_meta['last_modified']
+
+        deadline = time.monotonic() + self.download_timeout
+        response, _ = self._fetch_with_retry(url, headers, deadline, read_body=False)
+        digest = hashlib.sha256()
+        try:
+            if response.status_code == 304 and cached_meta:
+                with self._stats_lock:
+                    self.cache_stats['hits'] += 1
+                with open(body_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(chunk_size), b''):
+                        digest.update(chunk)
+                        yield chunk
+            else:
+                response.raise_for_status()
+                with self._stats_lock:
+                    self.cache_stats['misses'] += 1
+                tmp_path = f"{body_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                cache_file = None
+                if self.use_cache:
+                    os.makedirs(os.path.dirname(body_path), exist_ok=True)
+                    cache_file = open(tmp_path, 'wb')
+                size = 0
+                try:
+                    for chunk in self._iter_before_deadline(response.iter_content(chunk_size=chunk_size), deadline):
+                        digest.update(chunk)
+                        size += len(chunk)
+                        if cache_file:
+                            cache_file.write(chunk)
+                        yield chunk
+                    if cache_file:
+                        cache_file.close()
+                        os.replace(tmp_path, body_path)
+                        entry = {
+                            'url': url,
+                            'etag': response.headers.get('ETag'),
+                            'last_modified': response.headers.get('Last-Modified'),
+                            'sha256': digest.hexdigest(),
+                            'size': size,
+                        }
+                        self._write_file_atomic(meta_path, json.dumps(entry, indent=2).encode('utf-8'))
+                finally:
+                    if cache_file:
+                        cache_file.close()
+                        if os.path.exists(tmp_path):
+                            os.unlink(tmp_path)
+        finally:
+            response.close()
+
+        self.source_fingerprints[url] = digest.hexdigest()
+
+    @staticmethod
+    def _file_sha256(path: str) -> str:
+        """Skrót SHA-256 pliku czytanego blokami"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _iter_before_deadline(self, chunks, deadline: float):
+        """
+        Zwraca kawałki odpowiedzi, pilnując limitu czasu źródła jak _read_body
+
+        Czas, w którym kolejne etapy potoku przetwarzają wydany kawałek, przesuwa
+        termin - limit obejmuje tylko odczyt źródła.
+        """
+        for chunk in chunks:
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"przekroczono limit czasu źródła ({self.download_timeout}s)")
+            paused = time.monotonic()
+            yield chunk
+            deadline += time.monotonic() - paused
+
+    def _read_body(self, response: requests.Response, deadline: float,
+                   abort_event: Optional[threading.Event] = None) -> bytes:
+        """
+        Odczytuje treść odpowiedzi kawałkami, pilnując limitu czasu źródła
+        """
+        chunks = []
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            if abort_event is not None and abort_event.is_set():
+                raise requests.Timeout("przekroczono globalny limit czasu pobierania")
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"przekroczono limit czasu źródła ({self.download_timeout}s)")
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def get_source_name(self, url: str) -> Optional[str]:
+        """Zwraca nazwę znanego źródła dla URL (lub None)"""
+        for source in self.known_sources.values():
+            if source['url'] == url:
+                return source['name']
+        return None
+
+    def download_multiple_sources(self, urls: list, max_concurrency: Optional[int] = None,
+                                  total_timeout: Optional[float] = None) -> list:
+        """
+        Pobiera szablony z wielu źródeł równolegle
+        Zwraca listę tupli (url, data) w kolejności podanych URL-i
+
+        Args:
+            urls: lista URL-i źródeł
+            max_concurrency: maksymalna liczba równoległych pobrań
+                             (domyślnie self.max_concurrency, 1 = sekwencyjnie)
+            total_timeout: limit czasu na wszystkie źródła w sekundach
+                           (domyślnie self.total_timeout, None = bez limitu)
+        """
+        max_concurrency = max_concurrency or self.max_concurrency
+        total_timeout = total_timeout if total_timeout is not None else self.total_timeout
+        workers = max(1, min(max_concurrency, len(urls) or 1))
+
+        print(f"📥 Pobieranie szablonów z {len(urls)} źródeł (równolegle: {workers})...")
         print()
 
+        abort_event = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download')
+        try:
+            futures = [
+                executor.submit(self.download_v2_templates, url, self.get_source_name(url), abort_event)
+                for url in urls
+            ]
+            done, not_done = wait(futures, timeout=total_timeout)
+
+            if not_done:
+                # Przekroczono globalny limit - przerywamy pozostałe pobrania
+                abort_event.set()
+                for future in not_done:
+                    future.cancel()
+                print(f"⚠️  Przekroczono globalny limit czasu ({total_timeout}s), "
+                      f"pominięto {len(not_done)} źródeł")
+        finally:
+            executor.shutdown(wait=False)
+
+        # Wyniki w kolejności wejściowej - scalanie pozostaje deterministyczne
         results = []
-        for i, url in enumerate(urls, 1):
-            # Sprawdzamy czy to znane źródło
-            source_name = None
-            for key, source in self.known_sources.items():
-                if source['url'] == url:
-                    source_name = source['name']
-                    break
-
-            data = self.download_v2_templates(url, source_name)
-            if data:
-                results.append((url, data))
-            print()
+        for url, future in zip(urls, futures):
+            if future in done and not future.cancelled():
+                data = future.result()
+                if data:
+                    results.append((url, data))
 
+        print()
         print(f"✅ Pobrano dane z {len(results)}/{len(urls)} źródeł")
         return results
 
+    def _download_sources(self, urls: list) -> list:
+        """
+        Przygotowuje dane wielu źródeł dla merge_templates
+        W trybie strumieniowym źródła są czytane leniwie, jedno po drugim,
+        w trakcie scalania - kosztem równoległości
+        """
+        if self.stream:
+            return [
+                (url, {'templates': self.stream_v2_templates(url, self.get_source_name(url))})
+                for url in urls
+            ]
+        return self.download_multiple_sources(urls)
+
     def merge_templates(self, sources_data: list) -> Dict[str, Any]:
         """
         Scala szablony z wielu źródeł i usuwa duplikaty
@@ -165,12 +1504,14 @@ class PortainerTemplateConverter:
 
         Duplikaty są wykrywane na podstawie kombinacji:
         - name (nazwa)
-        - image (obraz Docker)
+        - image (obraz Docker; przy normalize_images w postaci znormalizowanej,
+          np. nginx = docker.io/library/nginx:latest)
         """
         print("🔄 Scalanie szablonów z wielu źródeł...")
 
-        all_templates = []
-        seen_templates = {}  # Klucz: (name, image), wartość: template
+        images = ImageIndex() if self.normalize_images else None
+        all_templates = CompactTemplateList(compactor=self._compactor) if self.compact else []
+        seen_templates = {}  # Klucz: (name, image), wartość: pozycja w all_templates
         stats = {
             'total_before': 0,
             'total_after': 0,
@@ -181,51 +1522,37 @@ class PortainerTemplateConverter:
         # Zbieramy wszystkie szablony
         for url, data in sources_data:
             templates = data.get('templates', [])
-            stats['total_before'] += len(templates)
-            stats['sources'][url] = len(templates)
+            stats['sources'][url] = 0
 
+            # Szablony mogą być listą lub generatorem (tryb strumieniowy)
             for template in templates:
+                stats['total_before'] += 1
+                stats['sources'][url] += 1
                 # Tworzymy klucz unikalności
-                name = template.get('name', '').lower().strip()
-                image = template.get('image', '').lower().strip()
+                key = self._merge_key(template, images)
 
-                if not name or not image:
+                if key is None:
                     # Jeśli brak name lub image, dodajemy zawsze
                     all_templates.append(template)
                     continue
 
-                key = (name, image)
-
                 if key in seen_templates:
                     # Duplikat znaleziony
                     stats['duplicates_removed'] += 1
 
-                    # Możemy scalić informacje (np. kategorie)
-                    existing = seen_templates[key]
-
-                    # Scalamy kategorie
-                    existing_cats = set(existing.get('categories', []))
-                    new_cats = set(template.get('categories', []))
-                    merged_cats = list(existing_cats | new_cats)
-                    if merged_cats:
-                        existing['categories'] = merged_cats
-
-                    # Wybieramy dłuższy opis jeśli dostępny
-                    new_desc = template.get('description') or ''
-                    old_desc = existing.get('description') or ''
-                    if len(new_desc) > len(old_desc):
-                        existing['description'] = new_desc
+                    # Możemy scalić informacje (np. kategorie); lista zwarta
+                    # zwraca kopię, więc scalony szablon jest zapisywany z powrotem
+                    position = seen_templates[key]
+                    existing = all_templates[position]
+                    self._merge_duplicate(existing, template)
+                    all_templates[position] = existing
                 else:
                     # Nowy szablon
-                    seen_templates[key] = template
+                    seen_templates[key] = len(all_templates)
                     all_templates.append(template)
 
         stats['total_after'] = len(all_templates)
-
-        print(f"✅ Scalono szablony:")
-        print(f"   • Szablony przed scaleniem: {stats['total_before']}")
-        print(f"   • Szablony po scaleniu: {stats['total_after']}")
-        print(f"   • Usunięto duplikatów: {stats['duplicates_removed']}")
+        self._report_merge(stats, images)
 
         # Tworzymy połączony obiekt v2
         merged_data = {
@@ -235,6 +1562,115 @@ class PortainerTemplateConverter:
 
         return merged_data, stats
 
+    @staticmethod
+    def _merge_key(template: Dict[str, Any], images: Optional[ImageIndex] = None) -> Optional[tuple]:
+        """
+        Klucz unikalności przy scalaniu: (name, image), None gdy brak któregoś z pól
+
+        Z indeksem images obraz jest w postaci znormalizowanej (parsowany raz na różny zapis).
+        """
+        name = template.get('name', '').lower().strip()
+        image = template.get('image', '').lower().strip()
+        if image and images is not None:
+            image = images.normalize(template['image'])
+        return (name, image) if name and image else None
+
+    @staticmethod
+    def _merge_duplicate(existing: Dict[str, Any], template: Dict[str, Any]) -> None:
+        """Scala duplikat z pierwszym wystąpieniem szablonu"""
+        # Scalamy kategorie
+        existing_cats = set(existing.get('categories', []))
+        new_cats = set(template.get('categories', []))
+        merged_cats = list(existing_cats | new_cats)
+        if merged_cats:
+            existing['categories'] = merged_cats
+
+        # Wybieramy dłuższy opis jeśli dostępny
+        new_desc = template.get('description') or ''
+        old_desc = existing.get('description') or ''
+        if len(new_desc) > len(old_desc):
+            existing['description'] = new_desc
+
+    def _report_merge(self, stats: Dict[str, Any], images: Optional[ImageIndex] = None) -> None:
+        print(f"✅ Scalono szablony:")
+        print(f"   • Szablony przed scaleniem: {stats['total_before']}")
+        print(f"   • Szablony po scaleniu: {stats['total_after']}")
+        print(f"   • Usunięto duplikatów: {stats['duplicates_removed']}")
+        if images is not None:
+            # Obrazy zapisane w źródłach różnie, a uznane za ten sam (np. nginx i library/nginx)
+            stats['image_aliases'] = len(images.aliased())
+            print(f"   • Obrazy zapisane na kilka sposobów: {stats['image_aliases']} "
+                  f"({images.stats['parsed']} różnych zapisów znormalizowanych)")
+
+    def iter_merge_templates(self, sources_data: list) -> tuple:
+        """
+        Strumieniowy odpowiednik merge_templates (potok --stream)
+
+        Zwraca dane v2 z generatorem szablonów i statystyki, uzupełniane
+        w trakcie czytania generatora. Wynik jest taki sam jak merge_templates.
+        """
+        stats = {
+            'total_before': 0,
+            'total_after': 0,
+            'duplicates_removed': 0,
+            'sources': {}
+        }
+        return {'version': '2', 'templates': self._iter_merged(sources_data, stats)}, stats
+
+    def _iter_merged(self, sources_data: list, stats: Dict[str, Any]):
+        """
+        Pierwszy przebieg odkłada szablony do _TemplateSpool i buduje indeks
+        klucz -> pozycja pierwszego wystąpienia (duplikat może zmienić szablon
+        wydany wcześniej); drugi wydaje je w kolejności, scalając duplikaty
+        """
+        print("🔄 Scalanie szablonów z wielu źródeł...")
+
+        images = ImageIndex() if self.normalize_images else None
+        spool = _TemplateSpool()
+        try:
+            slots = []          # pozycje szablonów wyniku w spool, w kolejności
+            seen_templates = {} # klucz -> numer slotu
+            duplicates = {}     # numer slotu -> pozycje duplikatów w spool
+            for url, data in sources_data:
+                # Szablony źródła trafiają do indeksu dopiero po jego pełnym odczycie -
+                # źródło, którego odczyt się nie powiódł, jest pomijane w całości
+                pending = []    # (nazwa, obraz, pozycja w spool)
+                try:
+                    for template in data.get('templates', []):
+                        pending.append((template.get('name', ''), template.get('image', ''), spool.append(template)))
+                except self.SOURCE_READ_ERRORS + (ValueError,) as e:
+                    print(f"⚠️  Pominięto źródło {url} - błąd odczytu: {e}")
+                    continue
+
+                stats['sources'][url] = len(pending)
+                stats['total_before'] += len(pending)
+                for name, image, offset in pending:
+                    key = self._merge_key({'name': name, 'image': image}, images)
+                    slot = seen_templates.get(key) if key is not None else None
+                    if slot is None:
+                        if key is not None:
+                            seen_templates[key] = len(slots)
+                        slots.append(offset)
+                    else:
+                        stats['duplicates_removed'] += 1
+                        duplicates.setdefault(slot, []).append(offset)
+            del seen_templates
+
+            if not stats['sources']:
+                print("❌ Nie udało się pobrać żadnego źródła")
+                sys.exit(1)
+            stats['total_after'] = len(slots)
+            self._report_merge(stats, images)
+            del images
+
+            for slot, offset in enumerate(slots):
+                template = spool.load(offset)
+                for duplicate in duplicates.get(slot, ()):
+                    self._merge_duplicate(template, spool.load(duplicate))
+                yield template
+        finally:
+            spool.close()
+
     def convert_template(self, template: Dict[str, Any], template_id: int) -> Dict[str, Any]:
         """
         Konwertuje pojedynczy szablon z v2 na v3
@@ -245,42 +1681,25 @@ class PortainerTemplateConverter:
         - Migracja 'restart_policy' do labels jako com.docker.compose.restart-policy
         - Usunięcie pola 'platform'
         """
-        v3_template = {}
-
-        # Dodajemy unikalny ID - kluczowa różnica w v3
-        v3_template['id'] = template_id
+        # Dodajemy unikalny ID - kluczowa różnica w v3 - i pola kopiowane bez zmian
+        v3_template = {'id': template_id}
+        v3_template.update({field: template[field] for field in V3_COPY_FIELDS if field in template})
 
-        # Pola do skopiowania bez zmian
-        fields_to_copy = [
-            'categories', 'description', 'env', 'image', 'logo',
-            'maintainer', 'name', 'ports', 'title', 'type', 'volumes',
-            'note', 'repository', 'hostname', 'command', 'network_mode',
-            'privileged', 'interactive', 'administrator_only'
-        ]
-
-        for field in fields_to_copy:
-            if field in template:
-                value = template[field]
-                # Fix None values for required string fields
-                if field == 'description' and (value is None or value == ''):
-                    # Use title as fallback for description if available
-                    value = template.get('title', 'No description available')
-                v3_template[field] = value
+        # Brak opisu - tytuł jako opis zastępczy
+        if 'description' in v3_template:
+            description = v3_template['description']
+            if description is None or description == '':
+                v3_template['description'] = template.get('title', 'No description available')
 
         # Dodajemy pole labels - nowe w v3
         # Migrujemy restart_policy z v2 do labels w v3
-        v3_template['labels'] = []
-
-        if 'restart_policy' in template and template['restart_policy']:
-            v3_template['labels'].append({
-                'name': 'com.docker.compose.restart-policy',
-                'value': template['restart_policy']
-            })
+        restart_policy = template.get('restart_policy')
+        v3_template['labels'] = ([{'name': 'com.docker.compose.restart-policy', 'value': restart_policy}]
+                                 if restart_policy else [])
 
         # Pola usuwane w v3 (nie kopiujemy):
         # - 'restart_policy': polityka restartowania - w v3 migrowana do labels
         # - 'platform': informacja o platformie - nie jest używana w v3
-
         return v3_template
 
     def apply_patches(self, v3_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -295,33 +1714,13 @@ class PortainerTemplateConverter:
         print("\n🔧 Aplikowanie patch-ów do szablonów...")
 
         try:
-            # Ładujemy patchy
-            patches = self.patch_loader.load_patches()
-
-            if not patches:
-                print("   ℹ️  Brak patch-ów do aplikowania")
-                self.patch_stats = {
-                    'loaded': 0,
-                    'applied': 0,
-                    'operations': {'update': 0, 'add': 0, 'remove': 0}
-                }
+            if not self._load_patches():
                 return v3_data
 
-            print(f"   📦 Załadowano {len(patches)} patch file(ów)")
-
             # Aplikujemy patchy
             modified_data, stats = self.patch_loader.apply_patches(v3_data['templates'])
             v3_data['templates'] = modified_data
-
-            # Przechowujemy statystyki
-            self.patch_stats = stats
-
-            # Wyświetlamy podsumowanie
-            if stats:
-                print(f"   ✅ Patchy aplikowane:")
-                for op_type, count in stats.get('operations', {}).items():
-                    if count > 0:
-                        print(f"      • {op_type.upper()}: {count}")
+            self._report_patches(stats)
 
             return v3_data
 
@@ -331,6 +1730,159 @@ class PortainerTemplateConverter:
             traceback.print_exc()
             return v3_data
 
+    def iter_apply_patches(self, templates):
+        """
+        Strumieniowy odpowiednik apply_patches (potok --stream)
+
+        Szablony przechodzą przez patch-e pojedynczo (PatchLoader.iter_apply_patches),
+        a statystyki są gotowe po ostatnim szablonie. Błąd patch-a przerywa
+        potok zamiast zwracać szablony bez zmian - część z nich mogła już
+        trafić do pliku tymczasowego.
+        """
+        if not self.patch_loader:
+            print("⚠️  System patch-ów nie jest dostępny, pomijam")
+            yield from templates
+            return
+
+        print("\n🔧 Aplikowanie patch-ów do szablonów...")
+        if not self._load_patches():
+            yield from templates
+            return
+
+        yield from self.patch_loader.iter_apply_patches(templates)
+        self._report_patches(self.patch_loader.stats)
+
+    def _load_patches(self) -> bool:
+        """Ładuje patch-e (z bundle w cache, jeśli pliki się nie zmieniły); False, gdy ich brak"""
+        self._configure_patch_cache()
+        self.patch_loader.interner = self.interner if self.intern_strings else None
+        patches = self.patch_loader.load_patches()
+
+        if not patches:
+            print("   ℹ️  Brak patch-ów do aplikowania")
+            self.patch_stats = {
+                'loaded': 0,
+                'applied': 0,
+                'operations': {'update': 0, 'add': 0, 'remove': 0}
+            }
+            return False
+
+        print(f"   📦 Załadowano {len(patches)} patch file(ów)")
+        return True
+
+    def _report_patches(self, stats: Dict[str, Any]) -> None:
+        # Przechowujemy statystyki
+        self.patch_stats = stats
+
+        # Wyświetlamy podsumowanie
+        if stats:
+            print(f"   ✅ Patchy aplikowane:")
+            for op_type, count in stats.get('operations', {}).items():
+                if count > 0:
+                    print(f"      • {op_type.upper()}: {count}")
+
+    # data:[<typ>][;parametry];base64,<dane>
+    DATA_URI_PATTERN = re.compile(r'^data:([\w.+-]+/[\w.+-]+)?((?:;[^;,]*)*);base64,(.*)$', re.DOTALL | re.IGNORECASE)
+
+    # Dozwolone typy logo i ich rozszerzenia - inne typy (text/html, application/*)
+    # i SVG (może zawierać skrypty) zostają inline, bo katalog logo jest serwowany publicznie
+    LOGO_EXTENSIONS = {
+        'image/png': '.png',
+        'image/jpeg': '.jpg',
+        'image/gif': '.gif',
+        'image/webp': '.webp',
+        'image/x-icon': '.ico',
+        'image/vnd.microsoft.icon': '.ico',
+    }
+
+    def extract_inline_logos(self, v3_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Zamienia logo zapisane inline (data:...;base64) na pliki w katalogu
+        self.logo_assets_dir, nazwane skrótem treści (identyczne logo = jeden
+        plik), a pole 'logo' na URL self.logo_base_url/<plik>
+        """
+        for _ in self.iter_inline_logos(v3_data.get('templates', [])):
+            pass
+        return v3_data
+
+    def iter_inline_logos(self, templates):
+        """
+        Ekstrakcja logo inline szablon po szablonie (zob. extract_inline_logos);
+        statystyki (self.logo_stats) są gotowe po ostatnim szablonie
+        """
+        print(f"🖼️  Ekstrakcja logo inline do: {self.logo_assets_dir}")
+
+        base_url = self.logo_base_url.rstrip('/')
+        written = {}        # skrót treści -> URL pliku
+        stats = {'extracted': 0, 'files': 0, 'bytes_saved': 0, 'skipped': 0}
+
+        for template in templates:
+            logo = template.get('logo')
+            if not isinstance(logo, str) or not logo[:5].lower() == 'data:':
+                yield template
+                continue
+
+            match = self.DATA_URI_PATTERN.match(logo)
+            extension = self.LOGO_EXTENSIONS.get((match.group(1) or '').lower()) if match else None
+            try:
+                content = base64.b64decode(''.join(match.group(3).split()), validate=True) if extension else None
+            except (binascii.Error, ValueError):
+                content = None
+            if not content:
+                stats['skipped'] += 1
+                yield template
+                continue
+
+            digest = hashlib.sha256(content).hexdigest()
+            url = written.get(digest)
+            if url is None:
+                filename = digest[:32] + extension
+                path = os.path.join(self.logo_assets_dir, filename)
+                if not os.path.exists(path):
+                    if self._logo_staging is not None:
+                        path = os.path.join(self._logo_staging, filename)
+                    self._write_file_atomic(path, content)
+                stats['files'] += 1
+                url = f"{base_url}/{filename}"
+                written[digest] = url
+
+            template['logo'] = url
+            stats['extracted'] += 1
+            stats['bytes_saved'] += len(logo.encode('utf-8')) - len(url.encode('utf-8'))
+            yield template
+
+        self.logo_stats = stats
+        print(f"✅ Wyodrębniono {stats['extracted']} logo do {stats['files']} plików "
+              f"(oszczędność: {round(stats['bytes_saved'] / 1024, 2)} KB)")
+        if stats['skipped']:
+            print(f"   ⚠️  Pominięto {stats['skipped']} logo inline niedozwolonego typu "
+                  f"lub takich, których nie udało się zdekodować")
+
+    def _begin_logo_staging(self) -> None:
+        """
+        Nowe pliki logo budowania trafiają do katalogu tymczasowego w
+        self.logo_assets_dir - błąd walidacji czy zapisu (w potoku
+        strumieniowym wykrywany dopiero po ostatnim szablonie) nie zostawia
+        plików, do których nie odwołuje się żaden plik wynikowy
+        """
+        os.makedirs(self.logo_assets_dir, exist_ok=True)
+        self._logo_staging = tempfile.mkdtemp(prefix='.staging-', dir=self.logo_assets_dir)
+
+    def _commit_staged_logos(self) -> None:
+        """Przenosi pliki logo z katalogu tymczasowego na miejsce (po udanym zapisie wyniku)"""
+        staging, self._logo_staging = self._logo_staging, None
+        if staging is None:
+            return
+        for filename in os.listdir(staging):
+            os.replace(os.path.join(staging, filename), os.path.join(self.logo_assets_dir, filename))
+        os.rmdir(staging)
+
+    def _discard_staged_logos(self) -> None:
+        """Usuwa pliki logo budowania, które się nie powiodło"""
+        staging, self._logo_staging = self._logo_staging, None
+        if staging is not None:
+            shutil.rmtree(staging, ignore_errors=True)
+
     def normalize_name(self, title: str) -> str:
         """Konwertuje title na znormalizowaną nazwę (małe litery, spacje na myślniki)"""
         return title.lower().replace(' ', '-').replace('_', '-')
@@ -376,15 +1928,19 @@ class PortainerTemplateConverter:
         """
         print("🔍 Usuwanie duplikatów...")
 
-        # Pierwszy przebieg: napraw null names
-        for template in templates:
+        # Pierwszy przebieg: napraw null names (lista zwarta zwraca kopie,
+        # więc poprawiony szablon jest zapisywany z powrotem)
+        for index, template in enumerate(templates):
             if template.get('name') is None and template.get('title'):
                 # Generuj nazwę z tytułu
                 template['name'] = self.normalize_name(template['title'])
+                templates[index] = template
 
         # Drugi przebieg: usuń duplikaty
-        seen_names = {}  # name -> template
-        unique_templates = []
+        # Indeks: name -> (pozycja w unique_templates, wynik kompletności),
+        # dzięki czemu zamiana i porównanie nie wymagają przeszukiwania listy
+        seen_names = {}
+        unique_templates = templates[:0]    # pusta lista tego samego rodzaju
         duplicates_removed = 0
 
         for template in templates:
@@ -398,23 +1954,18 @@ class PortainerTemplateConverter:
 
             if name in seen_names:
                 # Znaleziono duplikat - porównaj i zachowaj lepszy
-                existing = seen_names[name]
-                existing_score = self.calculate_completeness_score(existing)
+                position, existing_score = seen_names[name]
                 new_score = self.calculate_completeness_score(template)
 
                 if new_score > existing_score:
-                    # Zastąp lepszym
-                    seen_names[name] = template
-                    # Znajdź i zastąp w unique_templates
-                    for i, t in enumerate(unique_templates):
-                        if t.get('name') == name:
-                            unique_templates[i] = template
-                            break
+                    # Zastąp lepszym w tym samym miejscu listy
+                    seen_names[name] = (position, new_score)
+                    unique_templates[position] = template
 
                 duplicates_removed += 1
             else:
                 # Nowy unikalny szablon
-                seen_names[name] = template
+                seen_names[name] = (len(unique_templates), self.calculate_completeness_score(template))
                 unique_templates.append(template)
 
         print(f"   • Usunięto duplikatów: {duplicates_removed}")
@@ -422,6 +1973,45 @@ class PortainerTemplateConverter:
 
         return unique_templates
 
+    def remove_near_duplicates(self, templates: list) -> list:
+        """
+        Usuwa prawie-duplikaty - ten sam szablon opisany w źródłach nieco
+        innym tytułem lub opisem (MinHash + LSH, near_duplicates); łączone są
+        tylko szablony tego samego typu z tym samym obrazem i wolumenami
+        albo tym samym plikiem stosu
+
+        Z każdego klastra zostaje najbardziej kompletny szablon (przy remisie
+        najwcześniejszy), na pozycji pierwszego szablonu klastra.
+        """
+        print(f"🧬 Wykrywanie prawie-duplikatów (próg podobieństwa {self.near_duplicate_threshold})...")
+
+        detector = NearDuplicateDetector(self.near_duplicate_threshold)
+        clusters = detector.find_clusters(templates)
+
+        # Pozycja pierwszego szablonu klastra -> zachowywany indeks; pozostałe są pomijane
+        keep_at = {}
+        for members in clusters:
+            best = max(members, key=lambda index: (self.calculate_completeness_score(templates[index]), -index))
+            keep_at[members[0]] = best
+        removed = sum(len(members) for members in clusters) - len(clusters)
+        dropped = {index for members in clusters for index in members[1:]}
+
+        unique_templates = templates[:0]    # pusta lista tego samego rodzaju
+        for index in range(len(templates)):
+            if index in dropped:
+                continue
+            unique_templates.append(templates[keep_at.get(index, index)])
+
+        self.near_duplicate_stats = dict(detector.stats, clusters=len(clusters), removed=removed)
+        print(f"   • Klastry prawie-duplikatów: {len(clusters)} (kandydaci LSH: {detector.stats['candidates']})")
+        print(f"   • Usunięto prawie-duplikatów: {removed}")
+        for members in clusters[:5]:
+            titles = ', '.join(repr(templates[index].get('title')) for index in members[:4])
+            more = f" (+{len(members) - 4})" if len(members) > 4 else ""
+            print(f"     - {titles}{more}")
+
+        return unique_templates
+
     def convert_v2_to_v3(self, v2_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Główna funkcja konwersji z v2 na v3
@@ -433,42 +2023,305 @@ class PortainerTemplateConverter:
             "templates": []
         }
 
-        # Konwertujemy każdy szablon
+        # Konwertujemy każdy szablon (lista lub generator w trybie strumieniowym)
         templates = v2_data.get('templates', [])
-        for idx, template in enumerate(templates, 1):
-            converted_template = self.convert_template(template, idx)
-            v3_data['templates'].append(converted_template)
-
-        print(f"✅ Konwersja zakończona! Przekonwertowano {len(templates)} szablonów")
+        if self.compact:
+            # Model zwarty: szablon v3 jest zwijany zaraz po konwersji
+            v3_data['templates'] = CompactTemplateList(self._iter_converted(templates), self._compactor)
+        elif self.conversion_jobs > 1:
+            v3_data['templates'] = self._convert_templates_parallel(templates)
+        else:
+            for idx, template in enumerate(templates, 1):
+                converted_template = self.convert_template(template, idx)
+                v3_data['templates'].append(converted_template)
+
+        self.source_templates_count = len(v3_data['templates'])
+        print(f"✅ Konwersja zakończona! Przekonwertowano {self.source_templates_count} szablonów")
 
         # Usuwamy duplikaty
         original_count = len(v3_data['templates'])
         v3_data['templates'] = self.deduplicate_templates(v3_data['templates'])
+        if self.near_duplicate_threshold:
+            v3_data['templates'] = self.remove_near_duplicates(v3_data['templates'])
 
         # Przypisz nowe sekwencyjne ID po deduplikacji
         print("🔢 Przypisywanie nowych ID...")
-        for idx, template in enumerate(v3_data['templates'], 1):
-            template['id'] = idx
+        templates = v3_data['templates']
+        for idx, template in enumerate(templates):
+            template['id'] = idx + 1
+            templates[idx] = template
 
         return v3_data
 
+    def iter_convert_v2_to_v3(self, v2_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Strumieniowy odpowiednik convert_v2_to_v3 (potok --stream)
+
+        Zwraca dane v3 z generatorem szablonów - przekonwertowanych,
+        bez duplikatów i z sekwencyjnymi ID, jak w convert_v2_to_v3.
+        """
+        return {"version": "3", "templates": self._iter_v3_templates(v2_data.get('templates', []))}
+
+    def _iter_v3_templates(self, templates):
+        """
+        Konwersja i deduplikacja szablon po szablonie
+
+        Lepszy duplikat zastępuje wcześniejszy szablon na jego pozycji, więc
+        szablony czekają na wydanie w _TemplateSpool, a w pamięci zostaje
+        tylko indeks nazwa -> (slot, wynik kompletności). ID są przypisywane
+        przy wydawaniu.
+        """
+        print("🔄 Rozpoczynanie konwersji v2 -> v3...")
+
+        spool = _TemplateSpool()
+        try:
+            slots = []          # pozycje szablonów wyniku w spool, w kolejności
+            seen_names = {}     # nazwa -> (numer slotu, wynik kompletności)
+            duplicates_removed = 0
+            count = 0
+            for template in self._iter_converted(templates):
+                count += 1
+                if template.get('name') is None and template.get('title'):
+                    # Generuj nazwę z tytułu
+                    template['name'] = self.normalize_name(template['title'])
+
+                name = template.get('name')
+                if not name:
+                    # Nadal brak nazwy po naprawie - zachowaj ale ostrzeż
+                    print(f"   ⚠️  Szablon bez nazwy lub tytułu (id: {template.get('id')})")
+                    slots.append(spool.append(template))
+                    continue
+
+                score = self.calculate_completeness_score(template)
+                existing = seen_names.get(name)
+                if existing is None:
+                    seen_names[name] = (len(slots), score)
+                    slots.append(spool.append(template))
+                else:
+                    # Duplikat - lepszy zastępuje wcześniejszy w tym samym slocie
+                    duplicates_removed += 1
+                    if score > existing[1]:
+                        seen_names[name] = (existing[0], score)
+                        slots[existing[0]] = spool.append(template)
+            del seen_names
+
+            self.source_templates_count = count
+            print(f"✅ Konwersja zakończona! Przekonwertowano {count} szablonów")
+            print("🔍 Usuwanie duplikatów...")
+            print(f"   • Usunięto duplikatów: {duplicates_removed}")
+            print(f"   • Unikalne szablony: {len(slots)}")
+
+            print("🔢 Przypisywanie nowych ID...")
+            for idx, offset in enumerate(slots, 1):
+                template = spool.load(offset)
+                template['id'] = idx
+                yield template
+        finally:
+            spool.close()
+
+    # Rozmiar fragmentu przy równoległej konwersji generatora (--stream)
+    CONVERT_SHARD_SIZE = 5000
+
+    def _convert_templates_parallel(self, templates) -> list:
+        """
+        Konwertuje szablony fragmentami w puli procesów (conversion_jobs > 1)
+
+        Fragmenty są składane w kolejności źródła, a ID liczone od pozycji
+        fragmentu, więc wynik jest identyczny z konwersją szeregową. Generator
+        (--stream) jest dzielony na fragmenty w trakcie czytania.
+        """
+        jobs = self.conversion_jobs
+        if not isinstance(templates, list):
+            return list(self._iter_converted(templates))
+        if len(templates) < jobs * 2:
+            return [self.convert_template(template, idx) for idx, template in enumerate(templates, 1)]
+        shard_size = -(-len(templates) // (jobs * 4))
+
+        converted = []
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_conversion_worker,
+                                 initargs=(type(self),)) as pool:
+            futures = [pool.submit(_convert_templates_shard, start, templates[start:start + shard_size])
+                       for start in range(0, len(templates), shard_size)]
+            for future in futures:
+                converted.extend(future.result())
+        return converted
+
+    def _iter_converted(self, templates):
+        """
+        Zwraca przekonwertowane szablony w kolejności źródła; przy
+        conversion_jobs > 1 fragmenty po CONVERT_SHARD_SIZE konwertuje pula
+        procesów, z co najwyżej 2 fragmentami w toku na proces
+        """
+        jobs = self.conversion_jobs
+        if jobs <= 1:
+            for idx, template in enumerate(templates, 1):
+                yield self.convert_template(template, idx)
+            return
+
+        iterator = iter(templates)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_conversion_worker,
+                                 initargs=(type(self),)) as pool:
+            pending = []
+            start = 0
+            while True:
+                while len(pending) < jobs * 2:
+                    shard = list(itertools.islice(iterator, self.CONVERT_SHARD_SIZE))
+                    if not shard:
+                        break
+                    pending.append(pool.submit(_convert_templates_shard, start, shard))
+                    start += len(shard)
+                if not pending:
+                    return
+                yield from pending.pop(0).result()
+
+    def iter_v3_json(self, v3_data: Dict[str, Any]):
+        """
+        Serializuje dane v3 kawałkami, szablon po szablonie
+
+        Wynik jest identyczny z json.dump(v3_data, indent=2, ensure_ascii=False),
+        a 'templates' może być listą lub generatorem.
+        """
+        for pretty, _ in self._iter_v3_json_variants(v3_data, minified=False):
+            yield pretty
+
+    def _iter_v3_json_variants(self, v3_data: Dict[str, Any], minified: bool = True):
+        """
+        Jednym przejściem po szablonach zwraca pary kawałków (sformatowany,
+        zminifikowany); przy minified=False drugi element jest pusty
+
+        Zminifikowany wynik jest identyczny z
+        json.dumps(v3_data, ensure_ascii=False, separators=(',', ':')).
+        """
+        compact = {'ensure_ascii': False, 'separators': (',', ':')}
+
+        yield '{', '{' if minified else ''
+        first_key = True
+        for key, value in v3_data.items():
+            encoded_key = json.dumps(key, ensure_ascii=False)
+            yield (('\n' if first_key else ',\n') + '  ' + encoded_key + ': ',
+                   (('' if first_key else ',') + encoded_key + ':') if minified else '')
+            first_key = False
+
+            if key == 'templates' and not isinstance(value, dict):
+                first_item = True
+                for template in value:
+                    # Ciągi znaków w JSON nie zawierają dosłownych znaków nowej
+                    # linii, więc wcięcie można bezpiecznie dodać przez replace
+                    encoded = json.dumps(template, indent=2, ensure_ascii=False).replace('\n', '\n    ')
+                    yield (('[\n    ' if first_item else ',\n    ') + encoded,
+                           (('[' if first_item else ',') + json.dumps(template, **compact)) if minified else '')
+                    first_item = False
+                yield '[]' if first_item else '\n  ]', ('[]' if first_item else ']') if minified else ''
+            else:
+                yield (json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n  '),
+                       json.dumps(value, **compact) if minified else '')
+        yield '}' if first_key else '\n}', '}' if minified else ''
+
+    def output_variant_paths(self, filename: str) -> Dict[str, Any]:
+        """
+        Zwraca ścieżki wariantów wyjściowych dla --precompress:
+        wersja zminifikowana oraz rodzeństwo .gz/.br obu wersji
+        """
+        base, ext = os.path.splitext(filename)
+        minified = f"{base}.min{ext or '.json'}"
+        compressions = ['gzip'] + (['br'] if BROTLI_AVAILABLE else [])
+        suffix = {'gzip': '.gz', 'br': '.br'}
+        return {
+            'minified': minified,
+            'compressed': [(path + suffix[c], path, c) for path in (filename, minified) for c in compressions],
+            'manifest': filename + '.sha256',
+        }
+
     def save_v3_templates(self, v3_data: Dict[str, Any], filename: str) -> str:
         """
         Zapisuje szablon v3 do pliku JSON z ładnym formatowaniem
+
+        Dane są serializowane raz, strumieniowo do pliku tymczasowego obok
+        docelowego, a następnie (po fsync) atomowo podmieniane - Portainer
+        nigdy nie zobaczy częściowo zapisanego pliku.
+
+        Przy self.precompress zapisywane są też: wersja zminifikowana,
+        rodzeństwo .gz (i .br, jeśli dostępny brotli) obu wersji oraz
+        manifest sum kontrolnych <plik>.sha256. Kompresja działa w osobnych
+        wątkach równolegle z zapisem głównego pliku.
         """
         print(f"💾 Zapisywanie do pliku: {filename}")
 
+        sinks = []
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(v3_data, f, indent=2, ensure_ascii=False)
-
-            file_size = round(len(json.dumps(v3_data)) / 1024, 2)
-            print(f"✅ Plik zapisany pomyślnie: {filename} ({file_size} KB)")
+            main_sink = _OutputSink(filename)
+            sinks.append(main_sink)
+            targets = {filename: [main_sink]}
+
+            variants = self.output_variant_paths(filename) if self.precompress else None
+            if variants:
+                minified_sink = _OutputSink(variants['minified'], threaded=True)
+                sinks.append(minified_sink)
+                targets[variants['minified']] = [minified_sink]
+                for path, source, compression in variants['compressed']:
+                    sink = _OutputSink(path, compression, threaded=True)
+                    sinks.append(sink)
+                    targets[source].append(sink)
+
+            pretty_targets = targets[filename]
+            minified_targets = targets[variants['minified']] if variants else []
+            for pretty, minified in self._iter_v3_json_variants(v3_data, minified=bool(variants)):
+                data = pretty.encode('utf-8')
+                for sink in pretty_targets:
+                    sink.write(data)
+                if minified:
+                    data = minified.encode('utf-8')
+                    for sink in minified_targets:
+                        sink.write(data)
+
+            for sink in sinks:
+                sink.close()
+            # Warianty podmieniamy przed głównym plikiem, manifest na końcu
+            for sink in reversed(sinks):
+                sink.commit()
+            directory = os.path.dirname(os.path.abspath(filename))
+
+            if variants:
+                manifest = ''.join(f"{sink.sha256}  {os.path.basename(sink.path)}\n" for sink in sinks)
+                self._write_file_atomic(variants['manifest'], manifest.encode('utf-8'))
+            self._fsync_directory(directory)
+
+            self.output_stats = {
+                'file': filename,
+                'bytes': main_sink.size,
+                'sha256': main_sink.sha256,
+                'variants': {sink.path: {'bytes': sink.size, 'sha256': sink.sha256} for sink in sinks[1:]},
+            }
+            file_size = round(main_sink.size / 1024, 2)
+            print(f"✅ Plik zapisany pomyślnie: {filename} ({file_size} KB, sha256: {main_sink.sha256[:16]}…)")
+            for sink in sinks[1:]:
+                print(f"   • {sink.path} ({round(sink.size / 1024, 2)} KB)")
+            if variants:
+                print(f"   • Sumy kontrolne: {variants['manifest']}")
             return filename
 
         except IOError as e:
+            for sink in sinks:
+                sink.discard()
             print(f"❌ Błąd zapisywania pliku: {e}")
             sys.exit(1)
+        except BaseException:
+            for sink in sinks:
+                sink.discard()
+            raise
+
+    def _fsync_directory(self, directory: str) -> None:
+        """Utrwala wpis katalogu po zmianie nazwy pliku (tam gdzie to możliwe)"""
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
 
     def validate_with_json_schema(self, v3_data: Dict[str, Any]) -> bool:
         """
@@ -482,30 +2335,265 @@ class PortainerTemplateConverter:
             return True
 
         try:
-            # Tworzymy validator
-            validator = Draft7Validator(schema)
+            # Walidator skompilowany raz na proces (w pamięci), szablony sprawdzane pojedynczo
+            validator = self._get_schema_validator(schema)
+
+            # Zbieramy błędy do limitu - po jego osiągnięciu walidacja się kończy
+            limit = self.schema_error_limit or None
+            errors = [(list(error.path), error.message) for error in validator.iter_errors(v3_data, limit)]
+            return self._report_schema_errors(errors, limit)
+
+        except Exception as e:
+            print(f"❌ Błąd podczas walidacji JSON Schema: {e}")
+            return False
 
-            # Zbieramy wszystkie błędy
-            errors = list(validator.iter_errors(v3_data))
+    def _get_schema_validator(self, schema: Dict[str, Any]):
+        if self.use_cache:
+            self._remove_stale_validator_sources()
+        return get_validator(schema)
 
-            if errors:
-                print(f"❌ Znaleziono {len(errors)} błędów walidacji JSON Schema:")
-                # Pokazujemy do 10 najważniejszych błędów
-                for i, error in enumerate(errors[:10], 1):
-                    # Tworzymy ścieżkę do błędu
-                    path = " -> ".join(str(p) for p in error.path) if error.path else "root"
-                    print(f"   {i}. {path}: {error.message}")
+    def _remove_stale_validator_sources(self) -> None:
+        """
+        Usuwa kod walidatorów zapisany w katalogu cache przez starsze wersje
+        (schema_validator_*.py i ich __pycache__) - walidator jest teraz
+        generowany w pamięci, więc nic już tych plików nie czyta ani nie nadpisuje
+        """
+        pycache = os.path.join(self.cache_dir, '__pycache__')
+        for directory in (self.cache_dir, pycache):
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                if name.startswith('schema_validator_') and name.endswith(('.py', '.pyc')):
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except OSError:
+                        pass
+        try:
+            os.rmdir(pycache)     # tylko gdy pusty
+        except OSError:
+            pass
 
-                if len(errors) > 10:
-                    print(f"   ... i {len(errors) - 10} więcej błędów")
-                return False
+    def _report_schema_errors(self, errors: list, limit: Optional[int]) -> bool:
+        """
+        Wypisuje błędy JSON Schema (ścieżka, komunikat)
 
+        Returns:
+            True jeśli nie było błędów
+        """
+        if not errors:
             print("✅ Walidacja JSON Schema zakończona pomyślnie")
             return True
 
-        except Exception as e:
-            print(f"❌ Błąd podczas walidacji JSON Schema: {e}")
-            return False
+        if limit is not None and len(errors) >= limit:
+            print(f"❌ Znaleziono co najmniej {len(errors)} błędów walidacji JSON Schema "
+                  f"(walidacja przerwana po limicie):")
+        else:
+            print(f"❌ Znaleziono {len(errors)} błędów walidacji JSON Schema:")
+        # Pokazujemy do 10 najważniejszych błędów
+        for i, (path, message) in enumerate(errors[:10], 1):
+            # Tworzymy ścieżkę do błędu
+            path = " -> ".join(str(p) for p in path) if path else "root"
+            print(f"   {i}. {path}: {message}")
+
+        if len(errors) > 10:
+            print(f"   ... i {len(errors) - 10} więcej błędów")
+        return False
+
+    def _validate_templates(self, v3_data: Dict[str, Any]) -> tuple:
+        """
+        Walidacja JSON Schema i sprawdzenia biznesowe jednym przebiegiem po szablonach
+
+        Przy validation_jobs > 1 szablony są dzielone na fragmenty sprawdzane
+        w puli procesów (schema kompilowana raz na proces), a wyniki scalane
+        w kolejności szablonów.
+
+        Returns:
+            (wynik JSON Schema, ostrzeżenia, błędy biznesowe)
+        """
+        print("🔍 Walidacja z JSON Schema...")
+        templates = v3_data['templates']
+        limit = self.schema_error_limit or None
+
+        schema = self.load_schema()
+        validator = None
+        root = None
+        schema_valid = True
+        if schema is None:
+            print("⚠️  Pomijam walidację JSON Schema (brak pliku schema)")
+        else:
+            try:
+                validator = self._get_schema_validator(schema)
+                root = validator.root_errors(v3_data)
+            except Exception as e:
+                print(f"❌ Błąd podczas walidacji JSON Schema: {e}")
+                validator = None
+                schema_valid = False
+
+        # Szablony sprawdzane w przebiegu tylko, gdy schema ma skompilowaną funkcję szablonu
+        template_errors, warnings, errors = self._run_template_checks(
+            validator if root is not None else None, schema, templates, limit)
+
+        if validator is not None:
+            try:
+                if root is None:
+                    schema_errors = [(list(e.path), e.message) for e in validator.iter_errors(v3_data, limit)]
+                else:
+                    before, after = root
+                    schema_errors = ([(list(e.path), e.message) for e in before] + template_errors +
+                                     [(list(e.path), e.message) for e in after])[:limit]
+                schema_valid = self._report_schema_errors(schema_errors, limit)
+            except Exception as e:
+                print(f"❌ Błąd podczas walidacji JSON Schema: {e}")
+                schema_valid = False
+        return schema_valid, warnings, errors
+
+    def _run_template_checks(self, validator, schema: Optional[Dict[str, Any]], templates: list,
+                             limit: Optional[int]) -> tuple:
+        """
+        Sprawdza szablony (check_template) i zbiera wyniki w kolejności katalogu
+
+        Wyniki szablonów niezmienionych od poprzedniego uruchomienia są brane
+        z cache walidacji (klucz: skrót schema i kanoniczny skrót szablonu),
+        a pozostałe sprawdzane w bieżącym procesie albo w puli procesów.
+
+        Returns:
+            (błędy schema jako (ścieżka, komunikat), ostrzeżenia, błędy biznesowe)
+        """
+        cache = self._load_validation_cache(validator) if validator is not None else None
+        verdicts = [None] * len(templates)
+        keys = None
+        if cache is not None:
+            keys = [template_cache_key(template) for template in templates]
+            for index, key in enumerate(keys):
+                verdicts[index] = cache.get(key)
+
+        missing = [index for index, verdict in enumerate(verdicts) if verdict is None]
+        checked = self._check_templates_parallel(validator, schema, [templates[i] for i in missing], limit)
+        for index, verdict in zip(missing, checked):
+            verdicts[index] = verdict
+
+        self.validation_stats = {'validated': len(missing), 'cached': len(templates) - len(missing)}
+        if cache is not None:
+            print(f"   ♻️  Cache walidacji: {self.validation_stats['cached']} szablon(ów) bez zmian, "
+                  f"{self.validation_stats['validated']} sprawdzonych")
+            # Wyniki bez sprawdzenia schema (po osiągnięciu limitu błędów) nie trafiają do cache
+            entries = {key: verdict for key, verdict in zip(keys, verdicts) if verdict[0] is not None}
+            if entries.keys() != cache.keys():
+                self._save_validation_cache(validator, entries)
+
+        schema_errors, warnings, errors = [], [], []
+        for index, (template, verdict) in enumerate(zip(templates, verdicts)):
+            self._collect_verdict(index, template, verdict, limit, schema_errors, warnings, errors)
+        return schema_errors, warnings, errors
+
+    @staticmethod
+    def _collect_verdict(index: int, template: Dict[str, Any], verdict: tuple, limit: Optional[int],
+                         schema_errors: list, warnings: list, errors: list) -> None:
+        """Dopisuje wynik check_template szablonu na pozycji index do list błędów i ostrzeżeń"""
+        template_schema_errors, old_fields, labels_invalid = verdict
+        if template_schema_errors and (limit is None or len(schema_errors) < limit):
+            schema_errors.extend((['templates', index, *path], message)
+                                 for path, message in template_schema_errors)
+        for field in old_fields:
+            warnings.append(f"Szablon {index + 1} ('{template.get('title', 'unknown')}'): "
+                            f"zawiera stare pole '{field}' z v2")
+        if labels_invalid:
+            errors.append(f"Szablon {index + 1} ('{template.get('title', 'unknown')}'): "
+                          f"pole 'labels' powinno być listą")
+
+    def _check_templates_parallel(self, validator, schema: Optional[Dict[str, Any]], templates: list,
+                                  limit: Optional[int]) -> list:
+        """
+        Uruchamia check_templates w bieżącym procesie albo na fragmentach w puli procesów
+        """
+        jobs = self.validation_jobs
+        if jobs <= 1 or len(templates) < jobs * 2:
+            return check_templates(validator, templates, limit)
+
+        shard_size = -(-len(templates) // (jobs * 4))
+        verdicts = []
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_validation_worker,
+                                 initargs=(schema if validator is not None else None,)) as pool:
+            futures = [pool.submit(_validate_templates_shard, templates[start:start + shard_size], limit)
+                       for start in range(0, len(templates), shard_size)]
+            for future in futures:
+                verdicts.extend(future.result())
+        return verdicts
+
+    def _validation_cache_path(self) -> str:
+        return os.path.join(self.cache_dir, 'validation_cache.json')
+
+    def _validation_code_hash(self) -> str:
+        """Skrót kodu walidacji - zmiana sprawdzeń unieważnia cache walidacji"""
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256()
+        for name in ('portainer_converter.py', 'schema_validator.py'):
+            try:
+                with open(os.path.join(base_dir, name), 'rb') as f:
+                    digest.update(f.read())
+            except OSError:
+                digest.update(b'missing:' + name.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _load_validation_cache(self, validator) -> Optional[Dict[bytes, tuple]]:
+        """
+        Wczytuje wyniki walidacji z poprzedniego uruchomienia
+
+        Returns:
+            Słownik skrót szablonu -> wynik check_template (pusty, gdy brak
+            lub nieaktualny) albo None, gdy cache walidacji jest wyłączony
+        """
+        if not (self.use_cache and self.use_validation_cache):
+            return None
+        try:
+            with open(self._validation_cache_path(), 'rb') as f:
+                data = json.loads(f.read())
+            if data.get('schema') == validator.hash and data.get('code') == self._validation_code_hash():
+                templates = {}
+                for verdict, keys in data['verdicts']:
+                    verdict = self._decode_verdict(verdict)
+                    packed = bytes.fromhex(keys)
+                    if len(packed) % 16:
+                        raise ValueError("niepoprawne klucze w cache walidacji")
+                    for start in range(0, len(packed), 16):
+                        templates[packed[start:start + 16]] = verdict
+                return templates
+        except (OSError, ValueError, TypeError, AttributeError, KeyError):
+            # Brak, uszkodzony lub niepoprawny cache - pełna walidacja
+            pass
+        return {}
+
+    @staticmethod
+    def _decode_verdict(verdict: list) -> tuple:
+        """Odtwarza wynik check_template z JSON (ValueError, gdy typy się nie zgadzają)"""
+        if verdict == [[], [], False]:
+            return _VALID_VERDICT     # zdecydowana większość szablonów
+        schema_errors, old_fields, labels_invalid = verdict
+        if schema_errors is not None:
+            schema_errors = tuple((tuple(path), message) for path, message in schema_errors)
+            if not all(isinstance(message, str) and all(isinstance(part, (str, int)) for part in path)
+                       for path, message in schema_errors):
+                raise ValueError("niepoprawny błąd schema w cache walidacji")
+        old_fields = tuple(old_fields)
+        if not all(isinstance(field, str) for field in old_fields) or not isinstance(labels_invalid, bool):
+            raise ValueError("niepoprawny wynik w cache walidacji")
+        return schema_errors, old_fields, labels_invalid
+
+    def _save_validation_cache(self, validator, templates: Dict[bytes, tuple]) -> None:
+        # Każdy różny wynik zapisany raz, z kluczami szablonów (po 16 bajtów) sklejonymi w jeden ciąg hex -
+        # wczytanie to kilka długich ciągów zamiast słownika z wpisem na szablon
+        grouped = {}
+        for key, verdict in templates.items():
+            grouped.setdefault(verdict, []).append(key)
+        data = {'schema': validator.hash, 'code': self._validation_code_hash(),
+                'verdicts': [[verdict, b''.join(keys).hex()] for verdict, keys in grouped.items()]}
+        try:
+            self._write_file_atomic(self._validation_cache_path(),
+                                    json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        except OSError as e:
+            print(f"   ⚠️  Nie udało się zapisać cache walidacji: {e}")
 
     def validate_v3_format(self, v3_data: Dict[str, Any]) -> bool:
         """
@@ -514,34 +2602,28 @@ class PortainerTemplateConverter:
         """
         print("🔍 Walidacja formatu v3...")
 
-        # 1. Walidacja z JSON Schema (jeśli dostępna)
-        schema_valid = self.validate_with_json_schema(v3_data)
-
+        # 1. Walidacja z JSON Schema (jeśli dostępna) i sprawdzenia biznesowe
+        # jednym przebiegiem po szablonach
+        templates = v3_data.get('templates', [])
+        if not isinstance(templates, list):
+            templates = v3_data['templates'] = list(templates)
+        schema_valid, warnings, errors = self._validate_templates(v3_data)
+        return self._report_validation(v3_data.get('version'), len(templates), schema_valid, warnings, errors)
+
+    def _report_validation(self, version: Any, count: int, schema_valid: bool,
+                           warnings: list, errors: list) -> bool:
+        """Sprawdza wersję i liczbę szablonów, wypisuje ostrzeżenia i błędy biznesowe"""
         # 2. Podstawowa walidacja struktury
-        if str(v3_data.get('version')) != '3':
+        if str(version) != '3':
             print("❌ Nieprawidłowa wersja (oczekiwano '3')")
             return False
 
-        templates = v3_data.get('templates', [])
-        if not templates:
+        if not count:
             print("❌ Brak szablonów")
             return False
 
         # 3. Dodatkowe sprawdzenia biznesowe
         print("🔍 Dodatkowe sprawdzenia biznesowe...")
-        warnings = []
-        errors = []
-
-        for i, template in enumerate(templates, 1):
-            # Sprawdzenie starych pól z v2
-            old_fields = ['restart_policy', 'platform']
-            for field in old_fields:
-                if field in template:
-                    warnings.append(f"Szablon {i} ('{template.get('title', 'unknown')}'): zawiera stare pole '{field}' z v2")
-
-            # Sprawdzenie czy labels jest listą (jeśli istnieje)
-            if 'labels' in template and not isinstance(template['labels'], list):
-                errors.append(f"Szablon {i} ('{template.get('title', 'unknown')}'): pole 'labels' powinno być listą")
 
         # Pokazujemy ostrzeżenia
         if warnings:
@@ -566,6 +2648,88 @@ class PortainerTemplateConverter:
         print("✅ Walidacja zakończona pomyślnie")
         return True
 
+    def iter_validated_templates(self, templates, meta: Dict[str, Any]):
+        """
+        Strumieniowy odpowiednik validate_v3_format (potok --stream)
+
+        Szablony są sprawdzane (check_template, cache walidacji) w drodze do
+        zapisu, a korzeń dokumentu (meta - klucze poza 'templates') - bez
+        nich (detached_root_errors). Po
+        ostatnim szablonie wypisywany jest raport jak w validate_v3_format;
+        niepowodzenie kończy generator wyjątkiem TemplateValidationFailed,
+        więc save_v3_templates porzuca plik tymczasowy. Gdy schema ogranicza
+        całą tablicę szablonów (np. minItems), są one zbierane do listy.
+
+        Raises:
+            TemplateValidationFailed: gdy walidacja się nie powiodła
+        """
+        schema = self.load_schema()
+        validator = None
+        root = None
+        schema_error = None
+        if schema is not None:
+            try:
+                validator = self._get_schema_validator(schema)
+                root = validator.detached_root_errors(meta)
+            except Exception as e:
+                validator, schema_error = None, e
+
+            if validator is not None and root is None:
+                templates = list(templates)
+                if not self.validate_v3_format(dict(meta, templates=templates)):
+                    raise TemplateValidationFailed()
+                yield from templates
+                return
+
+        print("🔍 Walidacja formatu v3...")
+        print("🔍 Walidacja z JSON Schema...")
+        schema_valid = schema_error is None
+        if schema is None:
+            print("⚠️  Pomijam walidację JSON Schema (brak pliku schema)")
+        elif schema_error is not None:
+            print(f"❌ Błąd podczas walidacji JSON Schema: {schema_error}")
+
+        limit = self.schema_error_limit or None
+        cache = self._load_validation_cache(validator) if validator is not None else None
+        entries = {}
+        schema_errors, warnings, errors = [], [], []
+        found = 0
+        checked = 0
+        count = 0
+        for index, template in enumerate(templates):
+            key = None
+            verdict = None
+            if cache is not None:
+                key = template_cache_key(template)
+                verdict = cache.get(key)
+            if verdict is None:
+                # Jak check_templates: po limicie błędów bez sprawdzenia schema
+                verdict = check_template(validator if limit is None or found < limit else None, template)
+                checked += 1
+                if verdict[0]:
+                    found += len(verdict[0])
+            if key is not None and verdict[0] is not None:
+                entries[key] = verdict
+            self._collect_verdict(index, template, verdict, limit, schema_errors, warnings, errors)
+            count += 1
+            yield template
+
+        self.validation_stats = {'validated': checked, 'cached': count - checked}
+        if cache is not None:
+            print(f"   ♻️  Cache walidacji: {self.validation_stats['cached']} szablon(ów) bez zmian, "
+                  f"{self.validation_stats['validated']} sprawdzonych")
+            if entries.keys() != cache.keys():
+                self._save_validation_cache(validator, entries)
+
+        if validator is not None:
+            before, after = root
+            schema_errors = ([(list(e.path), e.message) for e in before] + schema_errors +
+                             [(list(e.path), e.message) for e in after])[:limit]
+            schema_valid = self._report_schema_errors(schema_errors, limit)
+
+        if not self._report_validation(meta.get('version'), count, schema_valid, warnings, errors):
+            raise TemplateValidationFailed()
+
     def show_statistics(self, v2_data: Dict[str, Any], v3_data: Dict[str, Any]):
         """
         Pokazuje statystyki konwersji
@@ -574,9 +2738,17 @@ class PortainerTemplateConverter:
 
         v2_templates = v2_data.get('templates', [])
         v3_templates = v3_data.get('templates', [])
-
-        print(f"   • Szablony źródłowe (v2): {len(v2_templates)}")
-        print(f"   • Szablony docelowe (v3): {len(v3_templates)}")
+        v2_count = len(v2_templates) if isinstance(v2_templates, list) else self.source_templates_count
+        if isinstance(v3_templates, list):
+            summary = self._new_summary()
+            for _ in self.iter_summarized(v3_templates, summary):
+                pass
+        else:
+            # Potok strumieniowy - szablony policzone w trakcie zapisu
+            summary = self.output_summary
+
+        print(f"   • Szablony źródłowe (v2): {v2_count}")
+        print(f"   • Szablony docelowe (v3): {summary['count']}")
 
         # Statystyki patch-ów
         if self.patch_stats and self.patch_stats.get('loaded', 0) > 0:
@@ -586,30 +2758,95 @@ class PortainerTemplateConverter:
             for op, count in ops.items():
                 if count > 0:
                     print(f"     - {op.upper()}: {count}")
+            memo = self.patch_stats.get('memo')
+            if memo:
+                print(f"     - Pamięć wyników: {memo['hits']} szablon(ów) odtworzonych, "
+                      f"{memo['misses']} wykonanych od nowa")
+
+        # Internowanie powtarzalnych wartości (źródła i patch-e)
+        interned = self.interner.stats
+        if interned['lookups']:
+            print(f"   • Internowanie wartości: {interned['lookups']} wyszukań, "
+                  f"trafienia {self.interner.hit_rate:.1%}, unikalne {len(self.interner.table)}")
+            print(f"     - Zaoszczędzona pamięć: ~{interned['saved_bytes'] / (1024 * 1024):.2f} MB")
+
+        # Etap prawie-duplikatów (--near-duplicates)
+        near = self.near_duplicate_stats
+        if near:
+            print(f"   • Prawie-duplikaty: {near['removed']} usuniętych w {near['clusters']} klastrach "
+                  f"({near['candidates']} kandydatów LSH, {near['verified']} zweryfikowanych Jaccardem)")
 
         # Statystyki typów
-        type_stats = {}
-        for template in v3_templates:
-            template_type = template.get('type', 'unknown')
-            type_stats[template_type] = type_stats.get(template_type, 0) + 1
-
         print("   • Typy szablonów:")
         type_names = {1: 'Kontenery', 2: 'Stosy Swarm', 3: 'Stosy Compose'}
-        for t_type, count in sorted(type_stats.items()):
+        for t_type, count in sorted(summary['types'].items()):
             type_name = type_names.get(t_type, f'Typ {t_type}')
             print(f"     - {type_name}: {count}")
 
         # Statystyki kategorii
-        categories = {}
-        for template in v3_templates:
-            for category in template.get('categories', []):
-                categories[category] = categories.get(category, 0) + 1
-
+        categories = summary['categories']
         if categories:
             print(f"   • Top 5 kategorii:")
             for category, count in sorted(categories.items(), key=lambda x: x[1], reverse=True)[:5]:
                 print(f"     - {category}: {count}")
 
+    @staticmethod
+    def _new_summary() -> Dict[str, Any]:
+        return {'count': 0, 'types': {}, 'categories': {}}
+
+    @staticmethod
+    def iter_summarized(templates, summary: Dict[str, Any]):
+        """Przepuszcza szablony, zliczając w summary ich liczbę, typy i kategorie"""
+        type_stats = summary['types']
+        categories = summary['categories']
+        for template in templates:
+            summary['count'] += 1
+            template_type = template.get('type', 'unknown')
+            type_stats[template_type] = type_stats.get(template_type, 0) + 1
+            for category in template.get('categories', []):
+                categories[category] = categories.get(category, 0) + 1
+            yield template
+
+    def build_stream_pipeline(self, v2_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Składa etapy potoku strumieniowego (--stream): konwersja z deduplikacją
+        i etapy build_pipeline_tail
+
+        Zwraca dane v3 z generatorem szablonów, czytanym przez save_v3_templates.
+        Poza indeksami deduplikacji i ID patch-y żaden etap nie trzyma
+        szablonów w pamięci.
+        """
+        return self.build_pipeline_tail(self.iter_convert_v2_to_v3(v2_data))
+
+    def build_pipeline_tail(self, v3_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Etapy po konwersji jako generatory (potok strumieniowy, --compact):
+        patch-e, ekstrakcja logo, walidacja i statystyki zapisu
+        """
+        v3_data['templates'] = self.iter_apply_patches(v3_data['templates'])
+        if self.logo_assets_dir:
+            v3_data['templates'] = self.iter_inline_logos(v3_data['templates'])
+        meta = {key: value for key, value in v3_data.items() if key != 'templates'}
+        v3_data['templates'] = self.iter_validated_templates(v3_data['templates'], meta)
+        self.output_summary = self._new_summary()
+        v3_data['templates'] = self.iter_summarized(v3_data['templates'], self.output_summary)
+        return v3_data
+
+    def show_fetch_statistics(self):
+        """
+        Pokazuje statystyki prób pobrania (liczba prób i czasy na źródło)
+        """
+        per_url = {}
+        for record in self.fetch_attempts:
+            per_url.setdefault(record['url'], []).append(record)
+
+        retries = len(self.fetch_attempts) - len(per_url)
+        print(f"   • Próby pobrania: {len(self.fetch_attempts)} (ponowienia: {retries})")
+        for url, records in per_url.items():
+            times = ", ".join(f"{r['seconds']:.2f}s" for r in records)
+            label = self.get_source_name(url) or url
+            print(f"     - {label}: {len(records)} prób [{times}]")
+
     def list_sources(self):
         """
         Wyświetla listę dostępnych źródeł szablonów
@@ -643,62 +2880,171 @@ class PortainerTemplateConverter:
 
         try:
             merge_stats = None
+            v2_data = None
+            fetched = None
+            self.template_changes = None
+            self._conversion_state = None
+            self.interner.clear()
+
+            # Katalog podany jako --url scalamy jak wiele źródeł
+            local_path = self.local_source_path(source_url) if source_url else None
+            if local_path and os.path.isdir(local_path):
+                multiple_sources = [source_url]
+                source_url = None
 
             # Określamy źródła do pobrania
             if all_sources:
-                # Pobieramy wszystkie znane źródła
+                # Wszystkie znane źródła
                 urls = [source['url'] for source in self.known_sources.values()]
-                sources_data = self.download_multiple_sources(urls)
-
-                if not sources_data:
-                    print("❌ Nie udało się pobrać żadnego źródła")
-                    sys.exit(1)
-
-                v2_data, merge_stats = self.merge_templates(sources_data)
-
             elif multiple_sources:
-                # Pobieramy z wielu źródeł
                 urls = []
                 for source in multiple_sources:
                     # Sprawdzamy czy to klucz znanego źródła
                     if source in self.known_sources:
                         urls.append(self.known_sources[source]['url'])
                     else:
-                        # Traktujemy jako URL
+                        # Traktujemy jako URL, plik lub katalog
                         urls.append(source)
-
-                sources_data = self.download_multiple_sources(urls)
-
-                if not sources_data:
-                    print("❌ Nie udało się pobrać żadnego źródła")
-                    sys.exit(1)
-
-                v2_data, merge_stats = self.merge_templates(sources_data)
-
+                urls = self.expand_sources(urls)
             else:
                 # Pojedyncze źródło
                 source_url = source_url or self.default_v2_url
-                v2_data = self.download_v2_templates(source_url)
-
-                if not v2_data:
-                    print("❌ Nie udało się pobrać szablonów")
-                    sys.exit(1)
+                urls = [source_url]
+            multi = bool(all_sources or multiple_sources)
+
+            # 1. Pobieranie - przy --resume z checkpointu (bez sieci); jego dane
+            # są wczytywane dopiero, gdy późniejszy etap nie ma checkpointu
+            fetch_key = self.fetch_checkpoint_key(urls)
+            index = self.load_checkpoint_index() if self.resume else {}
+            if index.get('fetch', {}).get('key') == fetch_key:
+                self.source_fingerprints.update(index['fetch']['sources'])
+                print(f"♻️  Checkpoint 'fetch' z {index['fetch']['date']} - źródła nie są pobierane")
+                remote = [url for url in urls if not self.local_source_path(url)]
+                if remote:
+                    print(f"   ⚠️  Źródła zdalne ({len(remote)}) są zamrożone w stanie z checkpointu - "
+                          f"zmiany na serwerach nie będą widoczne; uruchom bez --resume, aby je pobrać")
+            elif self.stream and not multi:
+                # Pojedyncze źródło strumieniowo - klucze najwyższego poziomu
+                # (np. 'version') trafiają do v2_data w trakcie parsowania
+                v2_data = {}
+                v2_data['templates'] = self.stream_v2_templates(source_url, meta=v2_data)
+            else:
+                fetched = self._fetch_sources(urls, multi)
+                self.save_checkpoint('fetch', fetch_key, fetched,
+                                     sources={url: self.source_fingerprints.get(url) for url in urls})
 
             print()
 
-            # 2. Konwersja v2 -> v3
-            v3_data = self.convert_v2_to_v3(v2_data)
-
-            # [NOWY KROK] 2.5 Aplikuj patchy
-            v3_data = self.apply_patches(v3_data)
-
-            # 3. Walidacja
-            if not self.validate_v3_format(v3_data):
-                print("❌ Walidacja nie powiodła się")
-                sys.exit(1)
+            # Wczesne zakończenie - nic się nie zmieniło od ostatniego budowania
+            # (w trybie strumieniowym odciski źródeł znane są dopiero po odczycie)
+            fingerprint = None
+            keys = {}
+            if not self.stream:
+                fingerprint = self.build_fingerprint(urls, output_file)
+                if self.skip_unchanged and self.use_cache and self.is_build_unchanged(fingerprint):
+                    print(f"✅ Brak zmian w źródłach i patch-ach - plik {output_file} jest aktualny")
+                    return
+                keys = self.checkpoint_keys(fingerprint)
+
+            # Przy --resume start od najpóźniejszego etapu z aktualnym checkpointem
+            # ('validate' nie ma danych - wznawia od danych etapu 'patch')
+            stage, restored = None, None
+            for name in reversed(self.CHECKPOINT_STAGES[1:]):
+                data_stage = 'patch' if name == 'validate' else name
+                if name in keys and index.get(name, {}).get('key') == keys[name]:
+                    restored = self.load_checkpoint(data_stage, keys[data_stage])
+                    if restored is not None:
+                        stage = name
+                        print(f"♻️  Wznawianie od checkpointu '{name}' z {index[name]['date']}")
+                        break
+
+            if stage in (None, 'merge'):
+                if stage == 'merge':
+                    v2_data, merge_stats = restored['v2'], restored['merge_stats']
+                else:
+                    if v2_data is None and fetched is None:
+                        fetched = self.load_checkpoint('fetch', fetch_key)
+                        if fetched is None:
+                            fetched = self._fetch_sources(urls, multi)
+                    if multi and self.stream:
+                        v2_data, merge_stats = self.iter_merge_templates(fetched)
+                    elif multi:
+                        v2_data, merge_stats = self.merge_templates(fetched)
+                        self.save_checkpoint('merge', keys.get('merge'), {'v2': v2_data, 'merge_stats': merge_stats})
+                        if self.compact:
+                            fetched = None      # źródła po scaleniu nie są już potrzebne
+                    elif v2_data is None:
+                        v2_data = fetched
+
+                # Tryb przyrostowy: zmiany liczone na szablonach, nie na bajtach
+                # źródeł - inne formatowanie czy kolejność pól nie wymusza budowania
+                if self.incremental and self.use_cache and fingerprint:
+                    self.detect_template_changes(v2_data['templates'])
+            else:
+                v2_data = {'version': restored['version'], 'templates': None}
+                merge_stats = restored['merge_stats']
+                if self.incremental and self.use_cache and self._conversion_state:
+                    self.detect_template_changes()
+
+            if self.template_changes is not None:
+                changes = self.template_changes
+                fingerprint['templates'] = self._conversion_state['sequence']
+                print(f"🧮 Zmiany szablonów: +{len(changes['added'])} "
+                      f"~{len(changes['changed'])} -{len(changes['removed'])}")
+                if self.is_build_unchanged(fingerprint, ignore_sources=True):
+                    print(f"✅ Brak zmian w szablonach i patch-ach - plik {output_file} jest aktualny")
+                    self.save_conversion_state()
+                    return
+
+            if self.logo_assets_dir:
+                self._begin_logo_staging()
+
+            if self.stream:
+                # Potok strumieniowy: etapy 2-3 to generatory, przez które
+                # szablony przechodzą pojedynczo w trakcie zapisu pliku (krok 4)
+                v3_data = self.build_stream_pipeline(v2_data)
+            else:
+                # 2. Konwersja v2 -> v3 (z deduplikacją)
+                if stage in (None, 'merge'):
+                    v3_data = self.convert_v2_to_v3(v2_data)
+                    self.save_checkpoint('convert', keys.get('convert'), {
+                        'v3': v3_data, 'merge_stats': merge_stats, 'version': v2_data.get('version')})
+                else:
+                    v3_data = restored['v3']
+
+                # Model zwarty: szablony v3 są już TemplateRecord, dane źródłowe
+                # i tablica wartości są zwalniane; dalsze etapy czytają szablony pojedynczo
+                if self.compact:
+                    fetched = restored = None
+                    v2_data['templates'] = None
+                    self._compactor.clear()
+                    v3_data = self.build_pipeline_tail(v3_data)
+                else:
+                    # [NOWY KROK] 2.5 Aplikuj patchy
+                    if stage not in ('patch', 'validate'):
+                        v3_data = self.apply_patches(v3_data)
+                        self.save_checkpoint('patch', keys.get('patch'), {
+                            'v3': v3_data, 'merge_stats': merge_stats, 'version': v2_data.get('version')})
+
+                    # 2.6 Ekstrakcja logo inline do plików (opcjonalnie)
+                    if self.logo_assets_dir:
+                        v3_data = self.extract_inline_logos(v3_data)
+
+                    # 3. Walidacja
+                    if stage == 'validate':
+                        print("♻️  Walidacja pominięta - ten sam wynik etapu 'patch' przeszedł ją wcześniej")
+                    elif not self.validate_v3_format(v3_data):
+                        print("❌ Walidacja nie powiodła się")
+                        sys.exit(1)
+                    else:
+                        self.save_checkpoint('validate', keys.get('validate'))
 
             # 4. Zapisywanie do pliku
             output_filename = self.save_v3_templates(v3_data, output_file)
+            self._commit_staged_logos()
+            if self.use_cache:
+                self.save_build_manifest(fingerprint or self.build_fingerprint(urls, output_file))
+                self.save_conversion_state()
 
             # 5. Statystyki
             print()
@@ -711,11 +3057,7 @@ class PortainerTemplateConverter:
                 print(f"   • Źródła: {len(merge_stats['sources'])} różnych źródeł")
                 for url, count in merge_stats['sources'].items():
                     # Znajdź nazwę źródła jeśli znane
-                    source_name = None
-                    for source in self.known_sources.values():
-                        if source['url'] == url:
-                            source_name = source['name']
-                            break
+                    source_name = self.get_source_name(url)
                     label = f" ({source_name})" if source_name else ""
                     print(f"     - {count} szablonów{label}")
                 print(f"   • Duplikaty usunięte: {merge_stats['duplicates_removed']}")
@@ -724,8 +3066,26 @@ class PortainerTemplateConverter:
 
             print(f"   • Wersja źródłowa: v{v2_data.get('version')}")
             print(f"   • Wersja docelowa: v{v3_data.get('version')}")
-            print(f"   • Liczba szablonów: {len(v3_data['templates'])}")
+            templates = v3_data['templates']
+            print(f"   • Liczba szablonów: "
+                  f"{len(templates) if isinstance(templates, list) else self.output_summary['count']}")
             print(f"   • Plik wyjściowy: {output_filename}")
+            if self.use_cache and (self.cache_stats['hits'] or self.cache_stats['misses']):
+                print(f"   • Cache źródeł: {self.cache_stats['hits']} bez zmian (304), "
+                      f"{self.cache_stats['misses']} pobranych")
+            if self.template_changes is not None:
+                print(f"   • Zmiany szablonów: {len(self.template_changes['added'])} nowych, "
+                      f"{len(self.template_changes['changed'])} zmienionych, "
+                      f"{len(self.template_changes['removed'])} usuniętych")
+            if self.validation_stats and self.validation_stats['cached']:
+                print(f"   • Walidacja: {self.validation_stats['validated']} szablon(ów) sprawdzonych, "
+                      f"{self.validation_stats['cached']} z cache walidacji")
+            if self.fetch_attempts:
+                self.show_fetch_statistics()
+            if self.logo_stats:
+                print(f"   • Logo wyodrębnione do plików: {self.logo_stats['extracted']} "
+                      f"({self.logo_stats['files']} plików, oszczędność "
+                      f"{round(self.logo_stats['bytes_saved'] / 1024, 2)} KB)")
             print()
             print("🎉 Konwersja zakończona pomyślnie!")
             print()
@@ -735,6 +3095,9 @@ class PortainerTemplateConverter:
             print("   3. Wklej URL do pliku lub użyj lokalnego pliku")
             print("   4. Zapisz ustawienia i ciesz się szablonami v3!")
 
+        except TemplateValidationFailed:
+            print("❌ Walidacja nie powiodła się")
+            sys.exit(1)
         except KeyboardInterrupt:
             print("\n❌ Operacja anulowana przez użytkownika")
             sys.exit(1)
@@ -743,6 +3106,8 @@ class PortainerTemplateConverter:
             import traceback
             traceback.print_exc()
             sys.exit(1)
+        finally:
+            self._discard_staged_logos()
 
 def main():
     """
@@ -771,6 +3136,12 @@ Przyk łady użycia:
   %(prog)s --all-sources
     Scala szablony ze wszystkich znanych źródeł
 
+  %(prog)s --url mirror/templates.json.gz
+    Konwersja z lokalnego pliku (także file://, .xz, .zst)
+
+  %(prog)s --sources mirror/ lissy93
+    Scala wszystkie pliki v2 z katalogu ze znanym źródłem
+
   %(prog)s --list-sources
     Wyświetl listę dostępnych źródeł
 
@@ -796,8 +3167,8 @@ Patch-y v3:
 
     parser.add_argument(
         '--url', '-u',
-        help='URL do pliku templates.json w formacie v2 '
-             '(domyślnie: szablony Lissy93)',
+        help='URL, file://, ścieżka do pliku lub katalogu z szablonami v2 '
+             '(.json/.json.gz/.json.xz/.json.zst, domyślnie: szablony Lissy93)',
         metavar='URL'
     )
 
@@ -810,7 +3181,7 @@ Patch-y v3:
     parser.add_argument(
         '--sources', '-s',
         nargs='+',
-        help='Lista źródeł do scalenia (klucze lub URL-e)',
+        help='Lista źródeł do scalenia (klucze, URL-e, pliki lub katalogi)',
         metavar='ŹRÓDŁO'
     )
 
@@ -826,6 +3197,181 @@ Patch-y v3:
         help='Wyświetl listę dostępnych źródeł'
     )
 
+    parser.add_argument(
+        '--normalize-images',
+        action='store_true',
+        help='Przy scalaniu źródeł porównuj obrazy w postaci znormalizowanej '
+             '(nginx = library/nginx = docker.io/library/nginx:latest)'
+    )
+
+    parser.add_argument(
+        '--near-duplicates',
+        nargs='?',
+        type=float,
+        const=0.8,
+        default=None,
+        help='Usuń prawie-duplikaty (ten sam typ i obraz lub plik stosu, podobny tytuł i opis) '
+             'o podobieństwie Jaccarda >= PRÓG (MinHash + LSH; domyślnie: 0.8)',
+        metavar='PRÓG'
+    )
+
+    parser.add_argument(
+        '--max-concurrency',
+        type=int,
+        default=4,
+        help='Maksymalna liczba równoległych pobrań źródeł (domyślnie: 4, 1 = sekwencyjnie)',
+        metavar='N'
+    )
+
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=30,
+        help='Limit czasu pobierania jednego źródła w sekundach (domyślnie: 30)',
+        metavar='SEK'
+    )
+
+    parser.add_argument(
+        '--total-timeout',
+        type=float,
+        help='Limit czasu pobierania wszystkich źródeł w sekundach (domyślnie: brak)',
+        metavar='SEK'
+    )
+
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=3,
+        help='Liczba ponowień pobrania po błędzie przejściowym (domyślnie: 3)',
+        metavar='N'
+    )
+
+    parser.add_argument(
+        '--backoff',
+        type=float,
+        default=0.5,
+        help='Bazowe opóźnienie ponowienia w sekundach, rośnie wykładniczo (domyślnie: 0.5)',
+        metavar='SEK'
+    )
+
+    parser.add_argument(
+        '--max-connections-per-host',
+        type=int,
+        default=4,
+        help='Maksymalna liczba połączeń do jednego hosta w puli (domyślnie: 4)',
+        metavar='N'
+    )
+
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Potok strumieniowy: szablony są parsowane, konwertowane, walidowane i zapisywane '
+             'pojedynczo (mniejsze zużycie pamięci, wiele źródeł pobieranych po kolei)'
+    )
+
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Trzymaj szablony od wczytania źródeł do zapisu w modelu zwartym (krotki, współdzielone '
+             'wartości) zamiast słowników - mniejsze zużycie pamięci bez rezygnacji z równoległego pobierania'
+    )
+
+    parser.add_argument(
+        '--intern-strings',
+        action='store_true',
+        help='Internuj powtarzalne wartości szablonów źródeł i patch-y (kategorie, env, wolumeny...) - '
+             'mniej pamięci na listach szablonów kosztem dłuższego parsowania źródeł'
+    )
+
+    parser.add_argument(
+        '--extract-logos',
+        help='Zapisz logo inline (data:...;base64) jako pliki w podanym katalogu '
+             '(wymaga --logo-base-url)',
+        metavar='KATALOG'
+    )
+
+    parser.add_argument(
+        '--logo-base-url',
+        help='Bazowy URL, pod którym serwowany jest katalog z --extract-logos',
+        metavar='URL'
+    )
+
+    parser.add_argument(
+        '--precompress',
+        action='store_true',
+        help='Zapisz też wersję .min.json oraz pliki .gz/.br (brotli jeśli zainstalowany) '
+             'z manifestem sum kontrolnych - gotowe do serwowania przez gzip_static'
+    )
+
+    parser.add_argument(
+        '--max-schema-errors',
+        type=int,
+        default=10,
+        help='Zakończ walidację JSON Schema po tylu błędach (domyślnie: 10, 0 = wszystkie)',
+        metavar='N'
+    )
+
+    parser.add_argument(
+        '--convert-jobs',
+        type=int,
+        default=1,
+        help='Liczba procesów konwersji v2 -> v3 dla bardzo dużych katalogów '
+             '(domyślnie: 1 = w bieżącym procesie)',
+        metavar='N'
+    )
+
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help='Liczba procesów walidacji szablonów (domyślnie: 1 = w bieżącym procesie)',
+        metavar='N'
+    )
+
+    parser.add_argument(
+        '--no-validation-cache',
+        action='store_true',
+        help='Waliduj wszystkie szablony, bez wyników z cache walidacji'
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        help='Katalog cache źródeł i manifestu budowania (domyślnie: .cache obok skryptu)',
+        metavar='KATALOG'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Wyłącz cache źródeł (zawsze pobieraj pełną treść)'
+    )
+
+    parser.add_argument(
+        '--skip-unchanged',
+        action='store_true',
+        help='Zakończ bez konwersji, jeśli źródła i patch-e są takie same jak przy ostatnim budowaniu'
+    )
+
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Budowanie przyrostowe: wyznacz nowe/zmienione/usunięte szablony i pomiń '
+             'budowanie, gdy szablony i patch-e się nie zmieniły'
+    )
+
+    parser.add_argument(
+        '--checkpoint',
+        action='store_true',
+        help='Zapisuj checkpointy etapów (pobranie, scalenie, konwersja, patch-e, walidacja) w katalogu cache'
+    )
+
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Wznów od ostatniego aktualnego checkpointu (źródła z checkpointu, bez pobierania); '
+             'włącza --checkpoint'
+    )
+
     parser.add_argument(
         '--version', '-v',
         action='version',
@@ -836,6 +3382,29 @@ Patch-y v3:
 
     # Inicjalizujemy konwerter
     converter = PortainerTemplateConverter()
+    converter.max_concurrency = args.max_concurrency
+    converter.download_timeout = args.timeout
+    converter.total_timeout = args.total_timeout
+    converter.max_retries = args.retries
+    converter.backoff_base = args.backoff
+    converter.max_connections_per_host = args.max_connections_per_host
+    if args.cache_dir:
+        converter.cache_dir = args.cache_dir
+    converter.use_cache = not args.no_cache
+    converter.stream = args.stream
+    converter.compact = args.compact
+    converter.intern_strings = args.intern_strings
+    converter.normalize_images = args.normalize_images
+    converter.near_duplicate_threshold = args.near_duplicates
+    converter.precompress = args.precompress
+    converter.skip_unchanged = args.skip_unchanged
+    converter.incremental = args.incremental
+    converter.checkpoints = args.checkpoint or args.resume
+    converter.resume = args.resume
+    converter.schema_error_limit = args.max_schema_errors
+    converter.validation_jobs = args.jobs
+    converter.conversion_jobs = args.convert_jobs
+    converter.use_validation_cache = not args.no_validation_cache
 
     # Jeśli --list-sources, tylko wyświetlamy źródła
     if args.list_sources:
@@ -847,13 +3416,38 @@ Patch-y v3:
         print("❌ Błąd: Nie można użyć --url razem z --sources lub --all-sources")
         sys.exit(1)
 
+    if args.incremental and (args.stream or args.no_cache):
+        print("❌ Błąd: --incremental wymaga cache i nie działa z --stream")
+        sys.exit(1)
+
+    if (args.checkpoint or args.resume) and args.stream:
+        print("❌ Błąd: --checkpoint i --resume nie działają z --stream")
+        sys.exit(1)
+
+    if args.compact and (args.stream or args.checkpoint or args.resume):
+        print("❌ Błąd: --compact nie działa z --stream, --checkpoint ani --resume")
+        sys.exit(1)
+
+    if args.near_duplicates is not None and (args.stream or not 0 < args.near_duplicates <= 1):
+        print("❌ Błąd: --near-duplicates wymaga progu z przedziału (0, 1] i nie działa z --stream")
+        sys.exit(1)
+
+    if bool(args.extract_logos) != bool(args.logo_base_url):
+        print("❌ Błąd: --extract-logos i --logo-base-url muszą być użyte razem")
+        sys.exit(1)
+    converter.logo_assets_dir = args.extract_logos
+    converter.logo_base_url = args.logo_base_url
+
     # Uruchamiamy konwersję
-    converter.run(
-        source_url=args.url,
-        output_file=args.output,
-        multiple_sources=args.sources,
-        all_sources=args.all_sources
-    )
+    try:
+        converter.run(
+            source_url=args.url,
+            output_file=args.output,
+            multiple_sources=args.sources,
+            all_sources=args.all_sources
+        )
+    finally:
+        converter.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Skompilowana walidacja JSON Schema szablonów Portainer v3
+
+Schema (schema_v3.json) jest kompilowana raz na proces do wyspecjalizowanej
+funkcji Pythona sprawdzającej pojedynczy szablon. Kod jest generowany w
+procesie przy każdym uruchomieniu (trwa to milisekundy) - nigdy nie jest
+czytany z dysku, więc przywrócony lub podmieniony cache nie jest wykonywany.
+
+Szybka funkcja odpowiada tylko "poprawny / niepoprawny". Dla szablonów
+niepoprawnych błędy (komunikaty, ścieżki, kolejność) zwraca jsonschema
+(Draft7Validator), więc wynik jest równoważny walidacji całego dokumentu.
+Słowa kluczowe, których generator nie obsługuje, przełączają walidację
+na Draft7Validator dla całego dokumentu.
+
+Użycie:
+    validator = get_validator(schema)
+    for error in validator.iter_errors(v3_data, limit=10):
+        print(error.message)
+"""
+
+import hashlib
+import json
+import re
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from jsonschema import Draft7Validator, ValidationError
+
+# Słowa kluczowe bez wpływu na wynik walidacji (Draft7Validator bez format_checker ignoruje 'format')
+_ANNOTATIONS = {'$schema', '$comment', 'title', 'description', 'default', 'examples', 'format'}
+
+_TYPE_CHECKS = {
+    'string': "isinstance({v}, str)",
+    'object': "isinstance({v}, dict)",
+    'array': "isinstance({v}, list)",
+    'boolean': "isinstance({v}, bool)",
+    'null': "{v} is None",
+    'number': "(isinstance({v}, (int, float)) and not isinstance({v}, bool))",
+    'integer': "((isinstance({v}, int) and not isinstance({v}, bool)) "
+               "or (isinstance({v}, float) and {v}.is_integer()))",
+}
+
+# Skompilowane walidatory tego procesu: skrót schematu -> SchemaValidator
+_VALIDATORS: Dict[str, 'SchemaValidator'] = {}
+
+
+class UnsupportedSchema(Exception):
+    """Schema zawiera konstrukcje, których generator nie kompiluje"""
+
+
+def schema_hash(schema: Dict[str, Any]) -> str:
+    """Zwraca skrót kanonicznej postaci schema"""
+    canonical = json.dumps(schema, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class _CodeGenerator:
+    """Generuje kod funkcji `check(instance) -> bool` dla (pod)schema"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.constants: List[str] = []
+        self.counter = 0
+
+    def name(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def constant(self, expression: str) -> str:
+        """Dodaje stałą modułu (np. skompilowany regex) i zwraca jej nazwę"""
+        name = self.name('_c')
+        self.constants.append(f"{name} = {expression}")
+        return name
+
+    def emit(self, indent: int, line: str) -> None:
+        self.lines.append('    ' * indent + line)
+
+    def generate(self, schema: Dict[str, Any]) -> str:
+        self.emit(0, "def check(instance):")
+        self.schema(schema, 'instance', 1)
+        self.emit(1, "return True")
+        header = ["# Wygenerowane przez schema_validator.py - nie edytować", "import re", ""]
+        return '\n'.join(header + self.constants + ['', ''] + self.lines) + '\n'
+
+    def schema(self, schema: Any, var: str, indent: int) -> None:
+        """Emituje instrukcje zwracające False, gdy `var` nie spełnia schema"""
+        if schema is True or schema == {}:
+            return
+        if schema is False:
+            self.emit(indent, "return False")
+            return
+        if not isinstance(schema, dict):
+            raise UnsupportedSchema(f"schema {schema!r}")
+
+        for keyword, value in schema.items():
+            if keyword in _ANNOTATIONS:
+                continue
+            handler = getattr(self, f"kw_{keyword}", None)
+            if handler is None:
+                raise UnsupportedSchema(keyword)
+            handler(value, var, indent, schema)
+
+    def kw_type(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        types = [value] if isinstance(value, str) else value
+        if not isinstance(types, list) or any(t not in _TYPE_CHECKS for t in types):
+            raise UnsupportedSchema(f"type {value!r}")
+        checks = ' or '.join(_TYPE_CHECKS[t].format(v=var) for t in types)
+        self.emit(indent, f"if not ({checks}):")
+        self.emit(indent + 1, "return False")
+
+    def kw_const(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        # jsonschema odróżnia bool od liczb, więc porównujemy też typ
+        if not isinstance(value, (str, bool)) and value is not None:
+            raise UnsupportedSchema(f"const {value!r}")
+        self.emit(indent, f"if type({var}) is not {type(value).__name__ if value is not None else 'type(None)'} "
+                          f"or {var} != {value!r}:")
+        self.emit(indent + 1, "return False")
+
+    def _number(self, var: str, indent: int, condition: str) -> None:
+        self.emit(indent, f"if isinstance({var}, (int, float)) and not isinstance({var}, bool) and {condition}:")
+        self.emit(indent + 1, "return False")
+
+    def kw_minimum(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        self._number(var, indent, f"{var} < {value!r}")
+
+    def kw_maximum(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        self._number(var, indent, f"{var} > {value!r}")
+
+    def kw_exclusiveMinimum(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        self._number(var, indent, f"{var} <= {value!r}")
+
+    def kw_exclusiveMaximum(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        self._number(var, indent, f"{var} >= {value!r}")
+
+    def kw_minLength(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        self.emit(indent, f"if isinstance({var}, str) and len({var}) < {value!r}:")
+        self.emit(indent + 1, "return False")
+
+    def kw_maxLength(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        self.emit(indent, f"if isinstance({var}, str) and len({var}) > {value!r}:")
+        self.emit(indent + 1, "return False")
+
+    def kw_pattern(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        re.compile(value)
+        regex = self.constant(f"re.compile({value!r})")
+        self.emit(indent, f"if isinstance({var}, str) and {regex}.search({var}) is None:")
+        self.emit(indent + 1, "return False")
+
+    def kw_minItems(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        self.emit(indent, f"if isinstance({var}, list) and len({var}) < {value!r}:")
+        self.emit(indent + 1, "return False")
+
+    def kw_maxItems(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        self.emit(indent, f"if isinstance({var}, list) and len({var}) > {value!r}:")
+        self.emit(indent + 1, "return False")
+
+    def kw_items(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        if not isinstance(value, (dict, bool)):
+            raise UnsupportedSchema("items (tuple)")
+        item = self.name('_i')
+        self.emit(indent, f"if isinstance({var}, list):")
+        self.emit(indent + 1, f"for {item} in {var}:")
+        before = len(self.lines)
+        self.schema(value, item, indent + 2)
+        if len(self.lines) == before:
+            self.lines.pop()
+            self.lines.pop()
+
+    def kw_required(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        if not value:
+            return
+        keys = self.constant(repr(tuple(value)))
+        self.emit(indent, f"if isinstance({var}, dict):")
+        self.emit(indent + 1, f"for _key in {keys}:")
+        self.emit(indent + 2, f"if _key not in {var}:")
+        self.emit(indent + 3, "return False")
+
+    def kw_properties(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        self.emit(indent, f"if isinstance({var}, dict):")
+        before = len(self.lines)
+        for key, subschema in value.items():
+            prop = self.name('_p')
+            self.emit(indent + 1, f"if {key!r} in {var}:")
+            self.emit(indent + 2, f"{prop} = {var}[{key!r}]")
+            inner = len(self.lines)
+            self.schema(subschema, prop, indent + 2)
+            if len(self.lines) == inner:
+                del self.lines[-2:]
+        if len(self.lines) == before:
+            self.lines.pop()
+
+    def kw_additionalProperties(self, value: Any, var: str, indent: int, schema: Dict[str, Any]) -> None:
+        if value is True or value == {}:
+            return
+        if 'patternProperties' in schema:
+            raise UnsupportedSchema("additionalProperties + patternProperties")
+        known = self.constant(f"frozenset({sorted(schema.get('properties', {}))!r})")
+        extra = self.name('_k')
+        self.emit(indent, f"if isinstance({var}, dict):")
+        self.emit(indent + 1, f"for {extra} in {var}:")
+        self.emit(indent + 2, f"if {extra} not in {known}:")
+        self.schema(value, f"{var}[{extra}]", indent + 3)
+
+
+class SchemaValidator:
+    """
+    Walidator dokumentu v3: schema korzenia przez jsonschema, szablony
+    pojedynczo przez skompilowaną funkcję
+    """
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.schema = schema
+        self.hash = schema_hash(schema)
+        self.validator = Draft7Validator(schema)
+        self.check: Optional[Callable[[Any], bool]] = None
+
+        items = self._templates_items(schema)
+        if items is None:
+            return
+        try:
+            self.check = self._compile(items)
+        except UnsupportedSchema:
+            return
+
+        templates_schema = {k: v for k, v in schema['properties']['templates'].items() if k != 'items'}
+        root_schema = dict(schema, properties=dict(schema['properties'], templates=templates_schema))
+        self.root_validator = Draft7Validator(root_schema)
+        self.item_validator = Draft7Validator(items)
+        # Miejsce błędów szablonów wśród błędów korzenia (kolejność słów kluczowych jsonschema)
+        self.items_position = self._schema_position(['properties', 'templates', 'items'])
+
+    @staticmethod
+    def _templates_items(schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Zwraca schema pojedynczego szablonu albo None, gdy dokument trzeba walidować w całości"""
+        if '$ref' in json.dumps(schema) or set(schema) & {'$id', 'definitions', 'allOf', 'anyOf', 'oneOf', 'not',
+                                                            'if', 'dependencies', 'patternProperties'}:
+            return None
+        templates = schema.get('properties', {}).get('templates')
+        if not isinstance(templates, dict) or not isinstance(templates.get('items'), dict):
+            return None
+        return templates['items']
+
+    def _compile(self, items: Dict[str, Any]) -> Callable[[Any], bool]:
+        """Generuje w procesie i kompiluje funkcję sprawdzającą szablon"""
+        source = _CodeGenerator().generate(items)
+        namespace = {}
+        exec(compile(source, f"<schema {self.hash[:12]}>", 'exec'), namespace)
+        return namespace['check']
+
+    def _schema_position(self, schema_path: List[Any]) -> tuple:
+        """Pozycja ścieżki schema w kolejności, w jakiej jsonschema przegląda słowa kluczowe"""
+        position = []
+        schema = self.schema
+        for part in schema_path:
+            if not isinstance(schema, dict) or part not in schema:
+                break
+            position.append(list(schema).index(part))
+            schema = schema[part]
+        return tuple(position)
+
+    def iter_errors(self, document: Any, limit: Optional[int] = None) -> Iterator[ValidationError]:
+        """
+        Zwraca błędy walidacji dokumentu (jak Draft7Validator.iter_errors)
+
+        Args:
+            document: dokument v3
+            limit: maksymalna liczba błędów (None = wszystkie); walidacja kończy się po jej osiągnięciu
+        """
+        return islice(self._iter_errors(document), limit)
+
+    def _iter_errors(self, document: Any) -> Iterator[ValidationError]:
+        root = self.root_errors(document)
+        if root is None:
+            yield from self.validator.iter_errors(document)
+            return
+
+        before, after = root
+        yield from before
+        for index, template in enumerate(document['templates']):
+            yield from self.template_errors(index, template)
+        yield from after
+
+    def root_errors(self, document: Any) -> Optional[Tuple[List[ValidationError], List[ValidationError]]]:
+        """
+        Zwraca błędy korzenia dokumentu (bez szablonów) podzielone na te,
+        które jsonschema zgłasza przed błędami szablonów, i te po nich
+
+        Returns:
+            (przed, po) albo None, gdy dokument trzeba walidować w całości (iter_errors)
+        """
+        templates = document.get('templates') if isinstance(document, dict) else None
+        if self.check is None or not isinstance(templates, list):
+            return None
+
+        errors = list(self.root_validator.iter_errors(document))
+        before = [e for e in errors if self._schema_position(list(e.schema_path)) < self.items_position]
+        return before, errors[len(before):]
+
+    # Słowa kluczowe tablicy templates, których wynik zależy od wszystkich szablonów naraz
+    ARRAY_KEYWORDS = frozenset({'minItems', 'maxItems', 'uniqueItems', 'contains', 'additionalItems'})
+
+    def detached_root_errors(self, document: Dict[str, Any]) -> Optional[Tuple[List[ValidationError], List[ValidationError]]]:
+        """
+        Jak root_errors, dla dokumentu, którego szablony są sprawdzane osobno,
+        w trakcie zapisu (potok strumieniowy) - 'templates' zastępuje pusta lista
+
+        Returns:
+            (przed, po) albo None, gdy wynik zależy od zawartości tablicy
+            templates (np. minItems) i dokument trzeba walidować w całości
+        """
+        if self.check is None or set(self.schema['properties']['templates']) & self.ARRAY_KEYWORDS:
+            return None
+        return self.root_errors(dict(document, templates=[]))
+
+    def template_errors(self, index: Optional[int], template: Any) -> Iterator[ValidationError]:
+        """
+        Zwraca błędy pojedynczego szablonu ze ścieżkami względem dokumentu
+
+        Args:
+            index: pozycja szablonu w tablicy templates (od 0);
+                   None = ścieżki względem szablonu
+            template: szablon
+        """
+        if self.check(template):
+            return
+        for error in self.item_validator.iter_errors(template):
+            if index is not None:
+                error.relative_path.extendleft([index, 'templates'])
+                error.relative_schema_path.extendleft(['items', 'templates', 'properties'])
+            yield error
+
+
+def get_validator(schema: Dict[str, Any]) -> SchemaValidator:
+    """
+    Zwraca walidator schema skompilowany raz na proces
+
+    Args:
+        schema: JSON Schema dokumentu v3
+    """
+    key = schema_hash(schema)
+    validator = _VALIDATORS.get(key)
+    if validator is None:
+        validator = SchemaValidator(schema)
+        _VALIDATORS[key] = validator
+    return validator
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Zwarty model szablonów Portainer dla potoku w pamięci (--compact)
+
+Szablon jako dict ma duży narzut na obiekt, a zagnieżdżone listy env / ports /
+volumes powtarzają się w wielu szablonach prawie bez zmian. TemplateRecord
+trzyma układ pól (krotka kluczy współdzielona przez szablony o tych samych
+polach) i wartości w krotce: listy i słowniki są krotkami (słownik - płaska
+krotka par ze znacznikiem na początku). Krótkie ciągi znaków i identyczne
+wartości zagnieżdżone są współdzielone przez tablicę TemplateCompactor.
+
+Konwersja ze słownika (v2 po wczytaniu źródła, v3 po konwersji) i z powrotem
+jest bezstratna - z kolejnością pól, typami wartości (True / 1 / 1.0) i polami
+spoza schema (np. dodanymi przez patch-e). Wartości muszą być typami z JSON-a.
+
+StringInterner działa na zwykłych słownikach: powtarzalne wartości (kategorie,
+adresy repozytoriów, nazwy zmiennych env i etykiet) z wielu źródeł i patch-y
+wskazują po wczytaniu na jeden obiekt ciągu znaków.
+
+Użycie:
+    templates = CompactTemplateList(v3_data['templates'])
+    for template in templates:      # nowe słowniki v3
+        ...
+"""
+
+import sys
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Rozmiar pustego ciągu znaków ASCII - ciąg ASCII zajmuje tyle plus długość
+_STR_SIZE = sys.getsizeof('')
+
+# Pierwszy element zamrożonego słownika; lista z JSON-a nie może go zawierać,
+# więc zamrożony słownik nigdy nie jest równy zamrożonej liście
+_DICT = object()
+
+
+def thaw(value: Any) -> Any:
+    """Odtwarza wartość JSON z postaci zamrożonej (krotki -> listy i słowniki)"""
+    if type(value) is not tuple:
+        return value
+    if value and value[0] is _DICT:
+        return {key: thaw(item) for key, item in zip(value[1::2], value[2::2])}
+    return [thaw(item) for item in value]
+
+
+class TemplateRecord:
+    """Szablon w postaci zwartej: układ pól i krotka zamrożonych wartości"""
+
+    __slots__ = ('fields', 'values')
+
+    def __init__(self, fields: Tuple[str, ...], values: Tuple[Any, ...]):
+        self.fields = fields
+        self.values = values
+
+    def get(self, field: str, default: Any = None) -> Any:
+        try:
+            return thaw(self.values[self.fields.index(field)])
+        except ValueError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: thaw(value) for field, value in zip(self.fields, self.values)}
+
+    def __repr__(self) -> str:
+        return f"TemplateRecord({self.to_dict()!r})"
+
+
+class TemplateCompactor:
+    """
+    Zamienia słowniki szablonów na TemplateRecord, współdzieląc powtarzalne wartości
+
+    Tablica trzyma krótkie ciągi znaków, układy pól i zamrożone wartości
+    zagnieżdżone złożone tylko z ciągów znaków i None - dla nich równość
+    oznacza identyczny JSON. Wartości z liczbami nie są współdzielone
+    (1 == True == 1.0), a długie ciągi (opisy, logo inline) są zwykle
+    unikalne i nie trafiają do tablicy. Jeden kompaktor może obsługiwać
+    źródła pobierane równolegle (wątki).
+    """
+
+    # Dłuższe ciągi znaków nie są współdzielone
+    MAX_SHARED_LENGTH = 128
+
+    def __init__(self):
+        self.table: Dict[Any, Any] = {}
+        self._plain = True      # czy zamrażana wartość zawiera tylko ciągi znaków i None
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        """Zwalnia tablicę - kolejne szablony nie współdzielą już wartości z wcześniejszymi"""
+        self.table = {}
+
+    def compact(self, template: Dict[str, Any]) -> TemplateRecord:
+        with self._lock:
+            fields = self._freeze(list(template))
+            return TemplateRecord(fields, tuple([self._freeze(value) for value in template.values()]))
+
+    def _freeze(self, value: Any) -> Any:
+        kind = type(value)
+        if kind is str:
+            if len(value) > self.MAX_SHARED_LENGTH:
+                return value
+            return self.table.setdefault(value, value)
+        if value is None:
+            return value
+        if kind is list:
+            outer, self._plain = self._plain, True
+            frozen = tuple([self._freeze(item) for item in value])
+        elif kind is dict:
+            outer, self._plain = self._plain, True
+            items = [_DICT]
+            for key, item in value.items():
+                items.append(self._freeze(key))
+                items.append(self._freeze(item))
+            frozen = tuple(items)
+        elif kind is tuple:
+            raise TypeError("szablon zawiera krotkę - model zwarty obsługuje tylko typy z JSON-a")
+        else:
+            self._plain = False
+            return value
+
+        if self._plain:
+            frozen = self.table.setdefault(frozen, frozen)
+        self._plain = outer and self._plain
+        return frozen
+
+
+class CompactTemplateList:
+    """
+    Lista szablonów przechowywanych jako TemplateRecord
+
+    Odczyt (iteracja, indeks) zwraca nowe słowniki - zmiana zwróconego
+    słownika nie zmienia listy, trzeba go zapisać z powrotem (lista[i] = szablon).
+    Wycinek jest listą zwartą z tym samym kompaktorem.
+    """
+
+    def __init__(self, templates: Iterable[Dict[str, Any]] = (), compactor: Optional[TemplateCompactor] = None):
+        self.compactor = compactor or TemplateCompactor()
+        self.records: List[TemplateRecord] = [self.compactor.compact(template) for template in templates]
+
+    @classmethod
+    def from_list(cls, templates: List[Dict[str, Any]],
+                  compactor: Optional[TemplateCompactor] = None) -> 'CompactTemplateList':
+        """Przenosi szablony z listy - lista jest opróżniana, a słowniki zwalniane na bieżąco"""
+        compact = cls(compactor=compactor)
+        templates.reverse()
+        while templates:
+            compact.append(templates.pop())
+        return compact
+
+    def append(self, template: Dict[str, Any]) -> None:
+        self.records.append(self.compactor.compact(template))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for record in self.records:
+            yield record.to_dict()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            part = CompactTemplateList(compactor=self.compactor)
+            part.records = self.records[index]
+            return part
+        return self.records[index].to_dict()
+
+    def __setitem__(self, index: int, template: Dict[str, Any]) -> None:
+        self.records[index] = self.compactor.compact(template)
+
+
+class StringInterner:
+    """
+    Wspólna tablica internowania powtarzalnych wartości szablonów
+
+    Każda sparsowana kopia ciągu znaków jest osobnym obiektem - po
+    internowaniu szablony wskazują na obiekt z tablicy, a kopie są
+    zwalniane. Internowane są tylko pola z listy poniżej (tytuły, opisy
+    i obrazy są zwykle unikalne). Słowniki są zmieniane w miejscu.
+    """
+
+    # Pola z ciągiem znaków lub listą ciągów znaków
+    FIELDS = ('categories', 'maintainer', 'platform', 'restart_policy')
+    # Pola ze słownikiem albo listą słowników -> internowane klucze tych słowników
+    NESTED_FIELDS = {
+        'repository': ('url', 'stackfile'),
+        'env': ('name', 'label', 'default'),
+        'labels': ('name',),
+        'volumes': ('container',),
+    }
+
+    def __init__(self):
+        self.table: Dict[str, str] = {}
+        self.stats = {'lookups': 0, 'hits': 0, 'saved_bytes': 0}
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        """Zwalnia tablicę i zeruje statystyki"""
+        self.table = {}
+        self.stats = {'lookups': 0, 'hits': 0, 'saved_bytes': 0}
+
+    def intern_templates(self, templates: Iterable[Dict[str, Any]]) -> None:
+        """Internuje wartości szablonów (lub zmian patch-a o kształcie szablonu)"""
+        for _ in self.iter_interned(templates):
+            pass
+
+    def iter_interned(self, templates: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Jak intern_templates, ale zwraca szablony w trakcie (parsowanie przyrostowe)"""
+        table, fields, nested = self.table, self.FIELDS, self.NESTED_FIELDS
+        strings = []            # (kontener, klucz lub indeks) ciągów znaków bieżącego szablonu
+        lookups = hits = saved = 0
+        try:
+            for template in templates:
+                if type(template) is dict:
+                    for field in fields:
+                        value = template.get(field)
+                        if type(value) is list:
+                            strings.extend([(value, index) for index in range(len(value))])
+                        elif value is not None:
+                            strings.append((template, field))
+                    for field, keys in nested.items():
+                        value = template.get(field)
+                        for item in (value if type(value) is list else (value,)):
+                            if type(item) is dict:
+                                strings.extend([(item, key) for key in keys if key in item])
+
+                    # Podmiana na obiekty z tablicy - tylko ciągi znaków
+                    for container, key in strings:
+                        value = container[key]
+                        if type(value) is str:
+                            lookups += 1
+                            interned = table.setdefault(value, value)
+                            if interned is not value:
+                                container[key] = interned
+                                hits += 1
+                                saved += _STR_SIZE + len(value) if value.isascii() else sys.getsizeof(value)
+                    strings.clear()
+                yield template
+        finally:
+            # Źródła są wczytywane w wątkach - liczniki dodawane pod blokadą
+            with self._lock:
+                self.stats['lookups'] += lookups
+                self.stats['hits'] += hits
+                self.stats['saved_bytes'] += saved
+
+    @property
+    def hit_rate(self) -> float:
+        """Udział wyszukań, które trafiły na wartość już obecną w tablicy"""
+        return self.stats['hits'] / self.stats['lookups'] if self.stats['lookups'] else 0.0
@@ -3,19 +3,65 @@
 Test jednostkowy dla Portainer Templates Converter
 """
 
+import base64
+import contextlib
+import copy
+import gzip
+import hashlib
+import io
 import json
+import lzma
 import os
 import tempfile
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
 
 # Importujemy naszą klasę z aplikacji
 exec(open('portainer_converter.py').read())
+from jsonschema import Draft7Validator
+from patches._patch_loader import CompiledFilter
+from schema_validator import SchemaValidator
+from image_reference import parse_image_reference
+from template_model import TemplateCompactor
+from near_duplicates import NearDuplicateDetector
+
+
+def make_v3_document(count):
+    """Stały dokument v3 do testów walidacji - co dziesiąty szablon to stos z repozytorium"""
+    templates = []
+    for i in range(count):
+        template = {"id": i + 1, "type": 1, "title": f"App {i}", "name": f"app{i}",
+                    "description": f"Application number {i}", "categories": ["Tools"],
+                    "logo": f"https://example.com/logos/app{i}.png", "image": f"example/app{i}:latest",
+                    "ports": [f"{8000 + i}:80/tcp"], "volumes": [{"container": "/config", "bind": f"/opt/app{i}"}],
+                    "env": [{"name": "TZ", "label": "Timezone", "default": "UTC"}], "labels": []}
+        if i % 10 == 9:
+            for key in ("image", "ports", "volumes"):
+                del template[key]
+            template.update(type=3, repository={"url": "https://github.com/example/stacks",
+                                                "stackfile": f"app{i}/docker-compose.yml"})
+        templates.append(template)
+    return {"version": "3", "templates": templates}
+
+class NotingConverter(PortainerTemplateConverter):
+    """Konwerter z nadpisanym convert_template (test konwersji w puli procesów)"""
+
+    def convert_template(self, template, template_id):
+        v3_template = super().convert_template(template, template_id)
+        v3_template['note'] = 'converted'
+        return v3_template
+
 
 class TestPortainerConverter(unittest.TestCase):
 
     def setUp(self):
         self.converter = PortainerTemplateConverter()
+        # Cache (walidacji, bundle patch-y) w katalogu tymczasowym, nie w .cache repozytorium
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.converter.cache_dir = self.cache_dir.name
         self.sample_v2_template = {
             "type": 1,
             "title": "Test App",
@@ -34,6 +80,9 @@ class TestPortainerConverter(unittest.TestCase):
             "templates": [self.sample_v2_template]
         }
 
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
     def test_convert_template(self):
         """Test konwersji pojedynczego szablonu"""
         result = self.converter.convert_template(self.sample_v2_template, 1)
@@ -87,6 +136,162 @@ class TestPortainerConverter(unittest.TestCase):
         self.assertEqual(len(template['labels']), 1)
         self.assertEqual(template['labels'][0]['name'], 'com.docker.compose.restart-policy')
 
+    def test_parallel_conversion_matches_serial(self):
+        """Test konwersji w puli procesów - wynik identyczny bajt w bajt z konwersją szeregową"""
+        templates = []
+        for i in range(60):
+            template = dict(self.sample_v2_template, title=f"App {i % 45}", name=f"app-{i % 45}")
+            if i % 3 == 0:
+                template['description'] = None
+            if i % 4 == 0:
+                del template['restart_policy']
+            if i % 5 == 0:
+                template['repository'] = {'url': 'https://example.com/repo', 'stackfile': 'compose.yml'}
+            templates.append(template)
+
+        def convert(jobs, templates):
+            self.converter.conversion_jobs = jobs
+            with contextlib.redirect_stdout(io.StringIO()):
+                v3_data = self.converter.convert_v2_to_v3({'version': '2', 'templates': templates})
+            return ''.join(self.converter.iter_v3_json(v3_data))
+
+        serial = convert(1, copy.deepcopy(templates))
+        self.assertEqual(convert(2, copy.deepcopy(templates)), serial)
+        # Generator (--stream) dzielony na fragmenty w trakcie czytania
+        self.converter.CONVERT_SHARD_SIZE = 7
+        self.assertEqual(convert(3, iter(copy.deepcopy(templates))), serial)
+
+        # Procesy robocze konwertują metodą convert_template klasy konwertera
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.converter = NotingConverter()
+        self.assertEqual({t['note'] for t in json.loads(convert(2, copy.deepcopy(templates)))['templates']},
+                         {'converted'})
+
+    def test_deduplicate_templates_keeps_position(self):
+        """Test deduplikacji - lepszy duplikat zastępuje poprzedni w tym samym miejscu"""
+        templates = [
+            {"id": 1, "name": "a", "title": "A"},
+            {"id": 2, "name": "b", "title": "B"},
+            {"id": 3, "name": None, "title": None},
+            {"id": 4, "name": "a", "title": "A", "description": "better"},
+            {"id": 5, "name": "b", "title": "B"},
+            {"id": 6, "name": "a", "title": "A", "description": "tie"},
+        ]
+        result = self.converter.deduplicate_templates(templates)
+        self.assertEqual([t['id'] for t in result], [4, 2, 3])
+
+    def test_parse_image_reference(self):
+        """Test parsera referencji obrazów - rejestr, przestrzeń nazw, repozytorium, tag, digest"""
+        digest = 'sha256:' + 'a' * 64
+        for image, expected in [
+            ('nginx', 'docker.io/library/nginx:latest'),
+            ('library/nginx', 'docker.io/library/nginx:latest'),
+            (' Docker.io/library/NGINX:latest ', 'docker.io/library/nginx:latest'),
+            ('index.docker.io/library/nginx', 'docker.io/library/nginx:latest'),
+            ('linuxserver/plex:1.2', 'docker.io/linuxserver/plex:1.2'),
+            ('lscr.io/linuxserver/plex', 'lscr.io/linuxserver/plex:latest'),
+            ('localhost:5000/a/b/c', 'localhost:5000/a/b/c:latest'),
+            (f'nginx@{digest}', f'docker.io/library/nginx@{digest}'),
+            (f'ghcr.io/org/app:2@{digest}', f'ghcr.io/org/app:2@{digest}'),
+        ]:
+            self.assertEqual(str(parse_image_reference(image)), expected, image)
+
+        reference = parse_image_reference('localhost:5000/a/b/c:2')
+        self.assertEqual((reference.registry, reference.namespace, reference.repository, reference.tag,
+                          reference.digest), ('localhost:5000', 'a/b', 'c', '2', None))
+        for image in ('${IMAGE}', 'my image', 'nginx:', 'nginx@sha256:xyz'):
+            self.assertIsNone(parse_image_reference(image), image)
+
+    def test_merge_normalized_images(self):
+        """Test scalania po znormalizowanych obrazach - lista i potok strumieniowy"""
+        def sources():
+            return [
+                ('a', {'templates': [{'name': 'web', 'image': 'nginx', 'categories': ['A']},
+                                     {'name': 'cfg', 'image': '${IMAGE}'}]}),
+                ('b', {'templates': [{'name': 'web', 'image': 'docker.io/library/nginx:latest', 'categories': ['B']},
+                                     {'name': 'web', 'image': 'library/nginx', 'categories': ['C']},
+                                     {'name': 'web', 'image': 'nginx:1.25'},
+                                     {'name': 'cfg', 'image': '${image}'}]}),
+            ]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            literal, _ = self.converter.merge_templates(sources())
+            self.converter.normalize_images = True
+            merged, stats = self.converter.merge_templates(sources())
+            streamed, stream_stats = self.converter.iter_merge_templates(sources())
+            streamed = list(streamed['templates'])
+
+        self.assertEqual(len(literal['templates']), 5)
+        self.assertEqual([t['image'] for t in merged['templates']], ['nginx', '${IMAGE}', 'nginx:1.25'])
+        self.assertEqual(sorted(merged['templates'][0]['categories']), ['A', 'B', 'C'])
+        self.assertEqual(stats['duplicates_removed'], 3)
+        self.assertEqual(stats['image_aliases'], 1)
+        self.assertEqual(streamed, merged['templates'])
+        self.assertEqual(stream_stats, stats)
+
+    def test_remove_near_duplicates(self):
+        """Test etapu prawie-duplikatów - klaster zastępuje najbardziej kompletny szablon"""
+        description = 'Self-hosted file sync and share platform with calendar and contacts'
+        templates = [
+            {'type': 1, 'title': 'Nextcloud', 'description': description, 'image': 'nextcloud:latest'},
+            {'type': 1, 'title': 'Jellyfin', 'description': 'Free software media system', 'image': 'jellyfin/jellyfin'},
+            {'type': 1, 'title': 'Nextcloud Server', 'description': description, 'image': 'docker.io/library/nextcloud',
+             'logo': 'https://example.com/nextcloud.png', 'ports': ['443/tcp']},
+            # Inny tag obrazu i inny typ wdrożenia to osobne szablony
+            {'type': 1, 'title': 'Nextcloud', 'description': description, 'image': 'nextcloud:27'},
+            {'type': 3, 'title': 'Nextcloud', 'description': description,
+             'repository': {'url': 'https://github.com/example/templates', 'stackfile': 'nextcloud.yml'}},
+        ]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.converter.near_duplicate_threshold = 0.95
+            self.assertEqual(self.converter.remove_near_duplicates(templates), templates)
+            self.converter.near_duplicate_threshold = 0.8
+            unique = self.converter.remove_near_duplicates(templates)
+
+        self.assertEqual(unique, [templates[2], templates[1], templates[3], templates[4]])
+        self.assertEqual(self.converter.near_duplicate_stats['clusters'], 1)
+        self.assertEqual(self.converter.near_duplicate_stats['removed'], 1)
+
+    def test_near_duplicates_are_not_transitive(self):
+        """Test klastra wokół reprezentanta - podobieństwo nie przenosi się przez pośrednika"""
+        words = 'alpha bravo charlie delta echo foxtrot golf hotel india'
+        descriptions = [words, words.replace('india', 'juliet'), words.replace('india', 'juliet').replace('hotel', 'kilo')]
+        templates = [{'type': 1, 'title': 'Tool', 'description': text, 'image': 'example/tool'} for text in descriptions]
+
+        # A~B i B~C (0.82), ale A i C są podobne tylko w 0.67
+        self.assertEqual(NearDuplicateDetector(0.8).find_clusters(templates), [[0, 1]])
+
+    def test_near_duplicates_keep_distinct_catalog_templates(self):
+        """Test regresji na prawdziwym katalogu - różne aplikacje, tagi i typy wdrożenia nie są łączone"""
+        with open('templates_v3_converted.json', encoding='utf-8') as f:
+            templates = json.load(f)['templates']
+        cluster_of = {}
+        for number, members in enumerate(NearDuplicateDetector(0.8).find_clusters(templates)):
+            for index in members:
+                cluster_of[index] = number
+        positions = {}
+        for index, template in enumerate(templates):
+            positions.setdefault(template.get('title'), []).append(index)
+
+        distinct = [
+            ('Medusa', 'SickChill'), ('Medusa', 'SickRage'), ('SickChill', 'SickRage'),
+            ('Ffmpeg', 'Modmanager'),
+            ('Deluge openvpn', 'Transmission OpenVPN Latest'), ('Deluge openvpn', 'Transmission OpenVPN v3'),
+            ('Transmission OpenVPN Latest', 'Transmission OpenVPN v3'),
+            ('Airsonic (container)', 'Airsonic-advanced'),
+            ('Homebridge (container)', 'Homebridge - Debian'),
+            ('Homarr (container)', 'Homarr-Secured'),
+            ('Adguard', 'Adguard Home (stack)'),
+            ('Bookstack (stack)', 'Bookstack (swarm)'), ('Bookstack', 'Bookstack (swarm)'),
+            ('WordPress', 'WordPress (swarm)'), ('LiveSwitch', 'LiveSwitch (swarm)'),
+        ]
+        for first, second in distinct:
+            for index in positions.get(first, []):
+                for other in positions.get(second, []):
+                    with self.subTest(first=first, second=second):
+                        self.assertFalse(index in cluster_of and cluster_of[index] == cluster_of.get(other))
+
     def test_validate_v3_format(self):
         """Test walidacji formatu v3"""
         # Poprawny format v3
@@ -116,6 +321,121 @@ class TestPortainerConverter(unittest.TestCase):
 
         self.assertFalse(self.converter.validate_v3_format(invalid_v3))
 
+    def test_compiled_schema_validator_matches_jsonschema(self):
+        """Test skompilowanego walidatora - te same błędy co Draft7Validator i limit"""
+        schema = self.converter.load_schema()
+        document = make_v3_document(120)
+        document['extra'] = 1
+        document['version'] = 3
+        mutations = [('id', 0), ('id', 'x'), ('id', True), ('id', 2.0), ('type', 5), ('title', ''),
+                     ('ports', ['abc']), ('labels', {}), ('env', [{'label': 'x'}]),
+                     ('repository', {'url': 'x'}), ('volumes', [{'readonly': 'no'}])]
+        for i, (key, value) in enumerate(mutations):
+            document['templates'][i * 7][key] = value
+        del document['templates'][100]['description']
+
+        def signature(errors):
+            return [(list(e.path), list(e.schema_path), e.message) for e in errors]
+
+        expected = signature(Draft7Validator(schema).iter_errors(document))
+        validator = SchemaValidator(schema)
+        self.assertIsNotNone(validator.check)
+
+        self.assertEqual(len(expected), 15)
+        self.assertEqual(signature(validator.iter_errors(document)), expected)
+        self.assertEqual(signature(validator.iter_errors(document, 3)), expected[:3])
+
+    def test_stale_validator_sources_removed_from_cache(self):
+        """Test sprzątania cache - kod walidatora ze starszych wersji jest usuwany, reszta zostaje"""
+        cache_dir = self.cache_dir.name
+        pycache = os.path.join(cache_dir, '__pycache__')
+        os.makedirs(pycache)
+        stale = [os.path.join(cache_dir, 'schema_validator_0123_v1.py'),
+                 os.path.join(pycache, 'schema_validator_0123_v1.cpython-311.pyc')]
+        kept = os.path.join(cache_dir, 'patch_bundle.json')
+        for path in stale + [kept]:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('raise SystemExit\n')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(self.converter.validate_v3_format(make_v3_document(5)))
+        self.assertFalse(any(os.path.exists(path) for path in stale))
+        self.assertFalse(os.path.exists(pycache))
+        self.assertTrue(os.path.exists(kept))
+
+    def test_parallel_validation_matches_serial(self):
+        """Test walidacji w puli procesów - te same błędy i ostrzeżenia w kolejności szablonów"""
+        document = make_v3_document(240)
+        for i in range(0, len(document['templates']), 50):
+            document['templates'][i]['platform'] = 'linux'
+        for i in range(5, len(document['templates']), 20):
+            document['templates'][i]['id'] = 0
+        document['templates'][-1]['labels'] = 'x'
+        self.converter.schema_error_limit = 0
+        self.converter.use_validation_cache = False
+
+        def run(jobs):
+            self.converter.validation_jobs = jobs
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                result = self.converter.validate_v3_format(document)
+            return result, output.getvalue()
+
+        serial = run(1)
+        self.assertFalse(serial[0])
+        self.assertIn("... i 3 więcej błędów", serial[1])
+        self.assertEqual(run(3), serial)
+
+        schema = self.converter.load_schema()
+        validator = self.converter._get_schema_validator(schema)
+        checks = self.converter._run_template_checks(validator, schema, document['templates'], None)
+        self.assertEqual(checks[0][-2], (['templates', 225, 'id'], '0 is less than the minimum of 1'))
+        self.assertEqual(len(checks[1]), 5)
+        self.assertEqual(checks[2], ["Szablon 240 ('App 239'): pole 'labels' powinno być listą"])
+
+    def test_validation_cache_checks_only_changed_templates(self):
+        """Test cache walidacji - sprawdzane tylko nowe i zmienione szablony, wynik jak bez cache"""
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates_v3_converted.json'),
+                  encoding='utf-8') as f:
+            document = json.load(f)
+        document['templates'][3]['id'] = 0
+        document['templates'][4]['platform'] = 'linux'
+
+        def run(document):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                result = self.converter.validate_v3_format(document)
+            lines = [line for line in output.getvalue().splitlines() if 'Cache walidacji' not in line]
+            return result, lines, dict(self.converter.validation_stats)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.converter.cache_dir = cache_dir
+            count = len(document['templates'])
+            cold = run(document)
+            self.assertEqual(cold[2], {'validated': count, 'cached': 0})
+            warm = run(document)
+            self.assertEqual(warm[2], {'validated': 0, 'cached': count})
+            self.assertEqual(warm[:2], cold[:2])
+
+            # Cache to JSON; wynik złego typu unieważnia go w całości
+            cache_path = os.path.join(cache_dir, 'validation_cache.json')
+            with open(cache_path, encoding='utf-8') as f:
+                data = json.load(f)
+            data['verdicts'][0][0] = [None, [], 'yes']
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            tampered = run(document)
+            self.assertEqual(tampered[2], {'validated': count, 'cached': 0})
+            self.assertEqual(tampered[:2], cold[:2])
+
+            # Przesunięcie szablonów nie unieważnia wyników - ścieżki i numery wg nowej pozycji
+            document['templates'].insert(0, dict(document['templates'][0], id=0, title='New'))
+            shifted = run(document)
+            self.assertEqual(shifted[2], {'validated': 1, 'cached': count})
+            self.converter.use_validation_cache = False
+            self.assertEqual(run(document)[:2], shifted[:2])
+            self.assertIn("   2. templates -> 4 -> id: 0 is less than the minimum of 1", shifted[1])
+
     def test_save_and_load_v3_templates(self):
         """Test zapisywania i wczytywania plików"""
         test_data = {
@@ -150,6 +470,1026 @@ class TestPortainerConverter(unittest.TestCase):
             if os.path.exists(temp_file):
                 os.unlink(temp_file)
 
+    def test_save_v3_templates_streaming_atomic(self):
+        """Test zapisu - wynik jak json.dump(indent=2), atomowa podmiana, rozmiar i skrót"""
+        test_data = {
+            "version": "3",
+            "templates": [
+                {"id": 1, "title": "Zażółć", "description": "Test\nline", "type": 1, "labels": []},
+                {"id": 2, "title": "Second", "description": "x", "type": 3, "env": [{"name": "TZ"}]}
+            ]
+        }
+        expected = json.dumps(test_data, indent=2, ensure_ascii=False).encode('utf-8')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'out.json')
+            with open(output, 'w') as f:
+                f.write('old content')
+
+            self.converter.save_v3_templates(test_data, output)
+            with open(output, 'rb') as f:
+                self.assertEqual(f.read(), expected)
+            self.assertEqual(os.listdir(tmp), ['out.json'])
+            self.assertEqual(self.converter.output_stats['bytes'], len(expected))
+            self.assertEqual(self.converter.output_stats['sha256'], hashlib.sha256(expected).hexdigest())
+
+            # Szablony jako generator dają ten sam wynik
+            generated = dict(test_data, templates=(t for t in test_data['templates']))
+            self.converter.save_v3_templates(generated, output)
+            with open(output, 'rb') as f:
+                self.assertEqual(f.read(), expected)
+
+    def test_save_v3_templates_precompressed_variants(self):
+        """Test wariantów wyjściowych - .min.json, .gz/.br i manifest sum kontrolnych"""
+        test_data = {"version": "3", "templates": [
+            {"id": i, "title": f"App {i}", "description": "Zażółć gęślą jaźń", "type": 1, "labels": []}
+            for i in range(1, 50)
+        ]}
+        pretty = json.dumps(test_data, indent=2, ensure_ascii=False).encode('utf-8')
+        minified = json.dumps(test_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'out.json')
+            self.converter.precompress = True
+            self.converter.save_v3_templates(test_data, output)
+
+            with open(output, 'rb') as f:
+                self.assertEqual(f.read(), pretty)
+            with open(os.path.join(tmp, 'out.min.json'), 'rb') as f:
+                self.assertEqual(f.read(), minified)
+            with gzip.open(output + '.gz', 'rb') as f:
+                self.assertEqual(f.read(), pretty)
+            with gzip.open(os.path.join(tmp, 'out.min.json.gz'), 'rb') as f:
+                self.assertEqual(f.read(), minified)
+            if BROTLI_AVAILABLE:
+                with open(output + '.br', 'rb') as f:
+                    self.assertEqual(brotli.decompress(f.read()), pretty)
+
+            with open(output + '.sha256') as f:
+                lines = [line.split() for line in f.read().splitlines()]
+            self.assertEqual(len(lines), 6 if BROTLI_AVAILABLE else 4)
+            for digest, name in lines:
+                with open(os.path.join(tmp, name), 'rb') as f:
+                    self.assertEqual(hashlib.sha256(f.read()).hexdigest(), digest)
+            self.assertFalse([name for name in os.listdir(tmp) if name.endswith('.tmp')])
+
+    def test_extract_inline_logos(self):
+        """Test ekstrakcji logo inline - deduplikacja po treści i URL do pliku"""
+        png = b'\x89PNG\r\n\x1a\n' + b'fake-image' * 20
+        inline = 'data:image/png;base64,' + base64.b64encode(png).decode('ascii')
+        v3_data = {"version": "3", "templates": [
+            {"id": 1, "title": "A", "logo": inline},
+            {"id": 2, "title": "B", "logo": inline},
+            {"id": 3, "title": "C", "logo": "https://example.com/c.png"},
+            {"id": 4, "title": "D", "logo": "data:image/png;base64,%%%"},
+            # Typy spoza listy dozwolonych zostają inline
+            {"id": 5, "title": "E", "logo": "data:text/html;base64," + base64.b64encode(b'<script>x</script>').decode()},
+            {"id": 6, "title": "F", "logo": "data:image/svg+xml;base64," + base64.b64encode(b'<svg/>').decode()},
+            {"id": 7, "title": "G", "logo": "data:;base64," + base64.b64encode(png).decode()},
+        ]}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            self.converter.logo_assets_dir = tmp
+            self.converter.logo_base_url = 'https://cdn.example.com/logos/'
+            self.converter.extract_inline_logos(v3_data)
+
+            files = os.listdir(tmp)
+            self.assertEqual(len(files), 1)
+            self.assertTrue(files[0].endswith('.png'))
+            with open(os.path.join(tmp, files[0]), 'rb') as f:
+                self.assertEqual(f.read(), png)
+
+        logos = [t['logo'] for t in v3_data['templates']]
+        self.assertEqual(logos[0], f"https://cdn.example.com/logos/{files[0]}")
+        self.assertEqual(logos[0], logos[1])
+        self.assertEqual(logos[2], "https://example.com/c.png")
+        self.assertEqual(logos[3], "data:image/png;base64,%%%")
+        self.assertTrue(all(logo.startswith('data:') for logo in logos[4:]))
+        self.assertEqual(self.converter.logo_stats['extracted'], 2)
+        self.assertEqual(self.converter.logo_stats['skipped'], 4)
+        self.assertGreater(self.converter.logo_stats['bytes_saved'], 0)
+
+
+class TestPatchLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = PatchLoader(patches_dir=tempfile.gettempdir())
+        self.templates = [
+            {"id": 1, "type": 1, "title": "Trilium", "name": "trilium", "image": "zadam/trilium:latest"},
+            {"id": 2, "type": 1, "title": "Nginx", "name": "nginx", "image": "nginx:latest"},
+            {"id": 3, "type": 1, "title": "Other Trilium", "name": "TRILIUM", "image": "ZADAM/trilium:0.50"},
+            {"id": 4, "type": 3, "title": "Stack", "name": "stack"},
+        ]
+
+    def apply(self, *operations):
+        self.loader.patches = [{
+            "metadata": {"version": "1", "id": "test", "title": "Test", "description": "Test"},
+            "operations": list(operations)
+        }]
+        return self.loader.apply_patches(self.templates)[0]
+
+    def test_compiled_filter_matches_semantics(self):
+        """Test filtrów - case-insensitive, wildcardy image, dokładne dopasowanie"""
+        cases = [
+            ({"name": "Trilium"}, [1, 3]),
+            ({"image": "zadam/*"}, [1, 3]),
+            ({"image": "*:latest"}, [1, 2]),
+            ({"id": 2}, [2]),
+            ({"id": "2"}, []),
+            ({"type": 3, "name": "stack"}, [4]),
+            ({"image": "*"}, [1, 2, 3]),
+        ]
+        for criteria, expected in cases:
+            compiled = CompiledFilter(criteria)
+            self.assertEqual([t['id'] for t in self.templates if compiled.matches(t)], expected, criteria)
+            self.assertEqual([t['id'] for t in self.templates if self.loader._matches_filter(t, criteria)],
+                             expected, criteria)
+
+    def test_image_literal_prefix(self):
+        """Test prefiksu wildcardów - tylko części obowiązkowe dla każdego dopasowania"""
+        self.assertEqual(CompiledFilter._literal_prefix('Zadam/*'), 'zadam/')
+        self.assertEqual(CompiledFilter._literal_prefix('ghcr.io/*'), 'ghcr')
+        self.assertEqual(CompiledFilter._literal_prefix('abc?d*'), 'ab')
+        self.assertIsNone(CompiledFilter._literal_prefix('*nginx'))
+        self.assertIsNone(CompiledFilter._literal_prefix('a|b*'))
+
+    def test_index_follows_updates_and_removes(self):
+        """Test indeksu - kolejne operacje widzą zmiany wprowadzone przez poprzednie"""
+        result = self.apply(
+            {"operation": "update", "filter": {"image": "zadam/*"}, "changes": {"image": "triliumnext/trilium:latest"}},
+            {"operation": "update", "filter": {"name": "nginx"}, "changes": {"name": "web"}},
+            {"operation": "remove", "filter": {"image": "triliumnext/*", "id": 3}},
+            {"operation": "update", "filter": {"name": "WEB"}, "changes": {"note": "renamed"}},
+            {"operation": "remove", "filter": {"name": "nginx"}},
+        )
+        self.assertEqual([t['id'] for t in result], [1, 2, 4])
+        self.assertEqual(result[0]['image'], "triliumnext/trilium:latest")
+        self.assertEqual(result[1]['note'], "renamed")
+        self.assertEqual(self.loader.stats['applied'], 5)
+
+    def test_add_checks_live_ids(self):
+        """Test ADD - indeks ID nadąża za REMOVE/UPDATE, porównanie jak operatorem =="""
+        new = {"type": 1, "title": "New", "name": "new", "image": "new:latest"}
+        result = self.apply(
+            {"operation": "add", "template": dict(new, id=2.0)},
+            {"operation": "remove", "filter": {"id": 2}},
+            {"operation": "add", "template": dict(new, id=2)},
+            {"operation": "update", "filter": {"id": 4}, "changes": {"id": 40}},
+            {"operation": "add", "template": dict(new, id=4, type=3)},
+            {"operation": "add", "template": dict(new, id=40)},
+            {"operation": "add", "template": dict(new, id="1")},
+        )
+        self.assertEqual([t['id'] for t in result], [1, 3, 40, 2, 4, "1"])
+        self.assertEqual(self.loader.stats['skipped'], 2)
+
+    def test_merge_list_field_keeps_order_and_duplicates(self):
+        """Test scalania list - kolejność pierwszego wystąpienia, duplikaty jak w `not in`"""
+        template = {"env": [{"name": "A", "default": "1"}, {"name": "A", "default": "1"}, "x"]}
+        self.loader._merge_list_field(template, "env", [
+            {"default": "1", "name": "A"},
+            {"name": "B", "select": [{"text": "a"}, {"text": "b"}]},
+            {"name": "B", "select": [{"text": "b"}, {"text": "a"}]},
+            {"select": [{"text": "a"}, {"text": "b"}], "name": "B"},
+            "x", "y", "y", True, 1,
+        ])
+        self.assertEqual(template["env"], [
+            {"name": "A", "default": "1"}, {"name": "A", "default": "1"}, "x",
+            {"name": "B", "select": [{"text": "a"}, {"text": "b"}]},
+            {"name": "B", "select": [{"text": "b"}, {"text": "a"}]},
+            "y", True,
+        ])
+
+        template = {"ports": "80:80"}
+        self.loader._merge_list_field(template, "ports", ["80:80", "443:443"])
+        self.assertEqual(template["ports"], ["80:80", "443:443"])
+
+    def test_patch_bundle_cache(self):
+        """Test bundle patchy-ów - ponowne użycie, przebudowa tylko zmienionego pliku"""
+        def write_patch(directory, name, title, image):
+            with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "metadata": {"version": "1", "id": name[:4], "title": title, "description": "x"},
+                    "operations": [{"operation": "update", "filter": {"image": image}, "changes": {"note": title}}]
+                }, f)
+
+        def load(patches_dir, cache_dir):
+            loader = PatchLoader(patches_dir=patches_dir, cache_dir=cache_dir)
+            with contextlib.redirect_stdout(io.StringIO()):
+                patches = loader.load_patches()
+                result = loader.apply_patches(copy.deepcopy(self.templates))[0]
+            return loader, patches, [t.get('note') for t in result]
+
+        with tempfile.TemporaryDirectory() as patches_dir, tempfile.TemporaryDirectory() as cache_dir:
+            write_patch(patches_dir, '0001-a.json', 'A', 'zadam/*')
+            write_patch(patches_dir, '0002-b.json', 'B', 'nginx*')
+            with open(os.path.join(patches_dir, '0003-broken.json'), 'w') as f:
+                f.write('{broken')
+
+            cold, cold_patches, cold_notes = load(patches_dir, cache_dir)
+            self.assertEqual(cold.bundle_stats, {'reused': 0, 'parsed': 3})
+            self.assertEqual(cold_notes, ['A', 'B', 'A', None])
+
+            warm, warm_patches, warm_notes = load(patches_dir, cache_dir)
+            self.assertEqual(warm.bundle_stats, {'reused': 3, 'parsed': 0})
+            self.assertEqual(warm_patches, cold_patches)
+            self.assertEqual(warm_notes, cold_notes)
+            self.assertEqual(len(warm.stats['errors']), 1)
+            fingerprint = cold.fingerprint()
+            self.assertEqual(warm.fingerprint(), fingerprint)
+
+            write_patch(patches_dir, '0002-b.json', 'B2', 'nginx*')
+            changed, _, changed_notes = load(patches_dir, cache_dir)
+            self.assertEqual(changed.bundle_stats, {'reused': 2, 'parsed': 1})
+            self.assertEqual(changed_notes, ['A', 'B2', 'A', None])
+            self.assertNotEqual(changed.fingerprint(), fingerprint)
+
+            # Bundle to wiersze JSON; uszkodzony lub niepoprawny jest budowany od nowa
+            bundle_path = os.path.join(cache_dir, 'patch_bundle.json')
+            with open(bundle_path, encoding='utf-8') as f:
+                self.assertEqual(json.loads(f.readline())['files']['0001-a.json']['size'],
+                                 os.path.getsize(os.path.join(patches_dir, '0001-a.json')))
+            for content in ('{broken', '{"format": 2}\n'):
+                with open(bundle_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                rebuilt, _, rebuilt_notes = load(patches_dir, cache_dir)
+                self.assertEqual(rebuilt.bundle_stats, {'reused': 0, 'parsed': 3})
+                self.assertEqual(rebuilt_notes, changed_notes)
+
+    def test_invalid_image_pattern_fails_only_its_operation(self):
+        """Test niepoprawnego wzorca image - błąd tylko tej operacji, reszta patch-a działa"""
+        with tempfile.TemporaryDirectory() as patches_dir, tempfile.TemporaryDirectory() as cache_dir:
+            with open(os.path.join(patches_dir, '0001-mixed.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "metadata": {"version": "1", "id": "mixed", "title": "Mixed", "description": "x"},
+                    "operations": [
+                        {"operation": "update", "filter": {"image": "zadam/*["}, "changes": {"note": "bad"}},
+                        {"operation": "update", "filter": {"image": "nginx*"}, "changes": {"note": "ok"}},
+                    ]
+                }, f)
+
+            for fused in (True, False):
+                with self.subTest(fused=fused):
+                    # Drugie ładowanie bierze patch z bundle w cache
+                    loader = PatchLoader(patches_dir=patches_dir, cache_dir=cache_dir)
+                    loader.fused = fused
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        loader.load_patches()
+                        result, stats = loader.apply_patches(copy.deepcopy(self.templates))
+                    self.assertEqual(stats['loaded'], 1)
+                    self.assertEqual([t.get('note') for t in result], [None, 'ok', None, None])
+                    self.assertEqual(stats['applied'], 1)
+                    self.assertEqual(len(stats['errors']), 1)
+                    self.assertIn("mixed operation 1", stats['errors'][0])
+
+    def run_loader(self, patches, templates, fused, cache_dir=None):
+        """Aplikuje patch-e nowym loaderem i zwraca (JSON wyniku, statystyki, wyjście)"""
+        loader = PatchLoader(patches_dir=tempfile.gettempdir(), cache_dir=cache_dir)
+        loader.fused = fused
+        loader.patches = copy.deepcopy(patches)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            result, stats = loader.apply_patches(copy.deepcopy(templates))
+        return json.dumps(result, ensure_ascii=False), stats, output.getvalue()
+
+    def test_fused_plan_matches_sequential_on_real_patches(self):
+        """Test planu - wynik identyczny z aplikowaniem patch po patchu (prawdziwe patches/)"""
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        loader = PatchLoader(patches_dir=os.path.join(base_dir, 'patches'))
+        with contextlib.redirect_stdout(io.StringIO()):
+            real_patches = loader.load_patches()
+        self.assertTrue(real_patches)
+        with open(os.path.join(base_dir, 'templates_v3_converted.json'), encoding='utf-8') as f:
+            catalog = json.load(f)['templates']
+
+        # Katalog bez szablonów dodanych przez patch-e - ADD musi je dodać ponownie
+        added_ids = {op['template']['id'] for p in real_patches for op in p['operations'] if op['operation'] == 'add'}
+        cases = [catalog, [t for t in catalog if t.get('id') not in added_ids], self.templates]
+        for templates in cases:
+            self.assertEqual(self.run_loader(real_patches, templates, True),
+                             self.run_loader(real_patches, templates, False))
+
+    def test_fused_plan_handles_dependent_operations(self):
+        """Test planu - operacje na szablonach dodanych przez ADD i zmiany pól indeksowanych"""
+        new = {"type": 1, "title": "New", "name": "new", "image": "new/app:latest"}
+        patches = [{
+            "metadata": {"version": "1", "id": "0001-a", "title": "A", "description": "A"},
+            "operations": [
+                {"operation": "add", "template": dict(new, id=10)},
+                {"operation": "update", "filter": {"name": "NEW"}, "changes": {"id": 2, "name": "renamed"}},
+                {"operation": "add", "template": dict(new, id=2, name="second")},
+                {"operation": "update", "filter": {"id": 2}, "changes": {"env": [{"name": "A"}]}},
+                {"operation": "remove", "filter": {"id": 2}},
+                {"operation": "add", "template": dict(new, id=2, name="third")},
+                {"operation": "update", "filter": {"image": "zadam/*"}, "changes": {"image": "new/trilium"}},
+                {"operation": "update", "filter": {"image": "NEW/*"}, "changes": {"note": "new"}},
+                {"operation": "update", "filter": {"name": "renamed"}},
+            ],
+        }, {
+            "metadata": {"version": "1", "id": "0002-b", "title": "B", "description": "B"},
+            "operations": [
+                {"operation": "remove", "filter": {"note": "new", "id": 1}},
+                {"operation": "add", "template": dict(new, id=1, name="fourth")},
+            ],
+        }]
+        fused = self.run_loader(patches, self.templates, True)
+        self.assertEqual(fused, self.run_loader(patches, self.templates, False))
+
+        result = json.loads(fused[0])
+        self.assertEqual([(t['id'], t['name']) for t in result], [(3, "TRILIUM"), (4, "stack"), (2, "third"), (1, "fourth")])
+        self.assertEqual(result[2]['note'], "new")
+        self.assertEqual(fused[1]['skipped'], 2)
+        self.assertEqual(len(fused[1]['errors']), 1)
+
+    def test_patch_memo_replays_unchanged_templates(self):
+        """Test pamięci wyników - odtworzenie bez zmian, nowe i zmienione operacje wykonywane od nowa"""
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(base_dir, 'templates_v3_converted.json'), encoding='utf-8') as f:
+            templates = json.load(f)['templates'] + self.templates
+        patches = [{
+            "metadata": {"version": "1", "id": "0001-a", "title": "A", "description": "A"},
+            "operations": [
+                {"operation": "update", "filter": {"image": "zadam/*"}, "changes": {"image": "nginx:stable"}},
+                {"operation": "update", "filter": {"image": "nginx*"}, "changes": {"env": [{"name": "TZ"}]}},
+                {"operation": "update", "filter": {"type": 3}, "changes": {"note": "stack"}},
+                {"operation": "remove", "filter": {"id": 2}},
+                {"operation": "add", "template": {"id": 2, "type": 1, "title": "N", "name": "n", "image": "n"}},
+            ],
+        }]
+
+        def check(patches):
+            expected = self.run_loader(patches, templates, True)
+            memoized = self.run_loader(patches, templates, True, cache_dir)
+            self.assertEqual(memoized[0], expected[0])
+            self.assertEqual(memoized[2], expected[2])
+            return memoized[1]['memo']
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.assertEqual(check(patches)['hits'], 0)
+            warm = check(patches)
+            self.assertEqual((warm['hits'], warm['misses']), (len(templates), 0))
+            self.assertEqual(warm['operations']['0001-a #1'], {'hits': 2, 'misses': 0})
+
+            # Nowa operacja przed istniejącymi i zmieniona operacja
+            changed = copy.deepcopy(patches)
+            operations = changed[0]['operations']
+            operations.insert(0, {"operation": "update", "filter": {"name": "trilium"}, "changes": {"name": "x"}})
+            operations[3]['changes'] = {"note": "changed"}
+            memo = check(changed)
+            self.assertEqual(memo['operations']['0001-a #1'], {'hits': 0, 'misses': 3})
+            self.assertEqual(memo['operations']['0001-a #2'], {'hits': 0, 'misses': 2})
+            self.assertEqual(memo['operations']['0001-a #3'], {'hits': 1, 'misses': 2})
+            self.assertEqual(memo['operations']['0001-a #4']['hits'], 0)
+
+            # Zmiana kolejności operacji unieważnia całą pamięć
+            changed[0]['operations'].reverse()
+            self.assertEqual(check(changed)['hits'], 0)
+            self.assertEqual(check(changed)['misses'], 0)
+
+            # Pamięć wyników to JSON; wartości złego typu unieważniają ją w całości
+            memo_path = os.path.join(cache_dir, 'patch_memo.json')
+            with open(memo_path, encoding='utf-8') as f:
+                data = json.load(f)
+            data['templates'] = {fingerprint: [1] for fingerprint in data['templates']}
+            with open(memo_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            self.assertEqual(check(changed)['hits'], 0)
+
+
+class TestTemplateModel(unittest.TestCase):
+
+    def test_compact_record_round_trip(self):
+        """Test modelu zwartego - bezstratna konwersja i współdzielenie powtarzalnych wartości"""
+        env = [{'name': 'PUID', 'label': 'PUID', 'default': '1000'}, {'name': 'TZ', 'label': 'Timezone'}]
+        templates = [
+            {'id': 1, 'title': 'A', 'env': copy.deepcopy(env), 'ports': ['80:80/tcp'], 'labels': []},
+            {'id': 2, 'title': 'B', 'env': copy.deepcopy(env), 'ports': ['80:80/tcp'], 'labels': []},
+            # Kolejność pól, typy (1 / 1.0 / True, 0.0 / -0.0), lista a słownik, pola spoza schema
+            {'type': 1, 'id': 3, 'privileged': True, 'extra': [[1], [True], [1.0], {'1': None}, [-0.0], [0.0]],
+             'volumes': [{'bind': '/a', 'readonly': True}, {'bind': '/a', 'readonly': 1}],
+             'description': 'x' * 500, 'repository': {}, 'note': ''},
+        ]
+        compactor = TemplateCompactor()
+        records = [compactor.compact(copy.deepcopy(template)) for template in templates]
+        for record, template in zip(records, templates):
+            restored = record.to_dict()
+            self.assertEqual(json.dumps(restored), json.dumps(template))
+            self.assertEqual(list(restored), list(template))
+        self.assertEqual(records[2].get('privileged'), True)
+        self.assertIsNone(records[0].get('missing'))
+
+        # Identyczne env i układ pól to jeden obiekt; wartości z liczbami nie są współdzielone
+        self.assertIs(records[0].values[2], records[1].values[2])
+        self.assertIs(records[0].fields, records[1].fields)
+        with self.assertRaises(TypeError):
+            compactor.compact({'ports': (80,)})
+
+    def test_compact_run_matches_default(self):
+        """Test --compact - ten sam plik wynikowy co ścieżka na słownikach (jedno i wiele źródeł)"""
+        with tempfile.TemporaryDirectory() as tmp:
+            sources = []
+            for number, category in enumerate(("Tools", "Media")):
+                sources.append(os.path.join(tmp, f'source{number}.json'))
+                with open(sources[-1], 'w', encoding='utf-8') as f:
+                    json.dump({"version": "2", "templates": [
+                        {"type": 1, "title": f"App {i}", "name": f"app{i % 5}", "image": f"img/app{i}",
+                         "description": "App" * (i % 3), "categories": [category],
+                         "ports": [f"{i}:80/tcp"] * (i % 2),
+                         "env": [{"name": "PUID", "default": "1000"}], "restart_policy": "always"}
+                        for i in range(12)] + [
+                        # Bez nazwy - deduplikacja nadaje ją z tytułu
+                        {"type": 1, "title": "No Name", "image": "img/noname", "description": "No name"}]}, f)
+
+            for urls in ([sources[0]], sources):
+                outputs = []
+                for compact in (False, True):
+                    converter = PortainerTemplateConverter()
+                    converter.use_cache = False
+                    converter.compact = compact
+                    outputs.append(os.path.join(tmp, f"out{len(urls)}{int(compact)}.json"))
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        if len(urls) > 1:
+                            converter.run(multiple_sources=urls, output_file=outputs[-1])
+                        else:
+                            converter.run(source_url=urls[0], output_file=outputs[-1])
+                with open(outputs[0], 'rb') as f, open(outputs[1], 'rb') as g:
+                    self.assertEqual(f.read(), g.read())
+
+    def test_string_interner_shares_source_values(self):
+        """Test internowania - powtarzalne wartości źródeł i patch-y to jeden obiekt"""
+        template = {"type": 3, "title": "App", "categories": ["Tools"], "maintainer": "https://github.com/m",
+                    "repository": {"url": "https://github.com/r", "stackfile": "stacks/app/docker-compose.yml"},
+                    "env": [{"name": "PUID", "label": "PUID", "default": "1000"}, {"name": "TZ", "default": 1}],
+                    "labels": [{"name": "com.example.enable", "value": "true"}]}
+        body = json.dumps({"version": "2", "templates": [template, template]}).encode('utf-8')
+
+        # Domyślnie bez internowania - parsowanie nie płaci za wyszukania w tablicy
+        converter = PortainerTemplateConverter()
+        converter._parse_v2_body(body)
+        self.assertEqual(converter.interner.stats['lookups'], 0)
+
+        converter.intern_strings = True
+        first = converter._parse_v2_body(body)['templates']
+        second = converter._parse_v2_body(body)['templates']
+        self.assertEqual(first + second, [template] * 4)
+        for other in (first[1], second[0], second[1]):
+            self.assertIs(other['categories'][0], first[0]['categories'][0])
+            self.assertIs(other['repository']['stackfile'], first[0]['repository']['stackfile'])
+            self.assertIs(other['env'][0]['label'], first[0]['env'][0]['label'])
+            self.assertIs(other['labels'][0]['name'], first[0]['labels'][0]['name'])
+        # Tytuł nie jest internowany, liczba nie jest ciągiem znaków
+        self.assertIsNot(second[0]['title'], first[0]['title'])
+        self.assertEqual(second[0]['env'][1]['default'], 1)
+
+        interner = converter.interner
+        self.assertEqual(interner.stats['lookups'], 4 * 9)
+        self.assertEqual(len(interner.table), 8)       # 'PUID' jako nazwa i etykieta to jedna wartość
+        self.assertEqual(interner.stats['hits'], 4 * 9 - 8)
+        self.assertGreater(interner.stats['saved_bytes'], 0)
+
+        # Patch-e współdzielą tablicę - wartości szablonów ADD trafiają do niej przy ładowaniu
+        if converter.patch_loader:
+            with contextlib.redirect_stdout(io.StringIO()):
+                converter._load_patches()
+            self.assertGreater(interner.stats['lookups'], 4 * 9)
+
+
+class LocalSourceHandler(BaseHTTPRequestHandler):
+    """Lokalny zamiennik źródła v2 - ścieżka /<opóźnienie>/<nazwa>"""
+
+    def do_GET(self):
+        _, delay, name = self.path.split('/', 2)
+        time.sleep(float(delay))
+        body = json.dumps({
+            "version": "2",
+            "templates": [{"type": 1, "title": name, "name": name, "image": f"{name}:latest"}]
+        }).encode('utf-8')
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+        self.server.requests_seen.append((self.path, self.headers.get('If-None-Match')))
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FlakySourceHandler(LocalSourceHandler):
+    """Źródło zwracające 503 dla pierwszych N żądań - ścieżka /<N>/<nazwa>"""
+
+    def do_GET(self):
+        _, failures, name = self.path.split('/', 2)
+        with self.server.lock:
+            count = self.server.counts.get(self.path, 0)
+            self.server.counts[self.path] = count + 1
+        if count < int(failures):
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.path = f"/0/{name}"
+        super().do_GET()
+
+
+class LocalServerTestCase(unittest.TestCase):
+    """Bazowa klasa testów uruchamiająca lokalny serwer HTTP ze źródłami v2"""
+
+    handler_class = LocalSourceHandler
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), cls.handler_class)
+        cls.server.requests_seen = []
+        cls.server.counts = {}
+        cls.server.lock = threading.Lock()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.converter = PortainerTemplateConverter()
+        self.converter.use_cache = False
+
+
+class TestConcurrentDownload(LocalServerTestCase):
+
+    def test_wall_time_is_slowest_source(self):
+        """Test równoległego pobierania - czas ≈ najwolniejsze źródło, nie suma"""
+        delays = [0.4, 0.2, 0.6, 0.3]
+        urls = [f"{self.base_url}/{d}/app{i}" for i, d in enumerate(delays)]
+
+        start = time.monotonic()
+        results = self.converter.download_multiple_sources(urls, max_concurrency=4)
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, sum(delays) * 0.75)
+        self.assertGreaterEqual(elapsed, max(delays))
+        # Kolejność wyników zgodna z kolejnością wejściową
+        self.assertEqual([url for url, _ in results], urls)
+        self.assertEqual([data['templates'][0]['name'] for _, data in results],
+                         ['app0', 'app1', 'app2', 'app3'])
+
+    def test_source_and_total_timeouts(self):
+        """Test limitów czasu - wolne źródła są pomijane"""
+        self.converter.download_timeout = 0.5
+        urls = [f"{self.base_url}/0.05/fast", f"{self.base_url}/2/slow"]
+        results = self.converter.download_multiple_sources(urls, max_concurrency=2)
+        self.assertEqual([url for url, _ in results], urls[:1])
+
+        self.converter.download_timeout = 30
+        start = time.monotonic()
+        results = self.converter.download_multiple_sources(urls, total_timeout=0.5)
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertEqual([url for url, _ in results], urls[:1])
+
+
+class TestSourceCache(LocalServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.converter.cache_dir = self.cache_dir.name
+        self.converter.use_cache = True
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_conditional_request_reuses_cached_body(self):
+        """Test cache źródeł - drugie pobranie wysyła If-None-Match i dostaje 304"""
+        url = f"{self.base_url}/0/cached"
+        first = self.converter.download_v2_templates(url)
+        second = self.converter.download_v2_templates(url)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.converter.cache_stats, {'hits': 1, 'misses': 1})
+        seen = [etag for path, etag in self.server.requests_seen if path == '/0/cached']
+        self.assertIsNone(seen[0])
+        self.assertIsNotNone(seen[1])
+
+    def test_stream_verifies_cached_body(self):
+        """Test strumieniowego pobierania - uszkodzona treść w cache nie jest używana przy 304"""
+        url = f"{self.base_url}/0/streamcached"
+        self.assertEqual([t['name'] for t in self.converter.stream_v2_templates(url)], ['streamcached'])
+        _, body_path = self.converter._http_cache_paths(url)
+        with open(body_path, 'wb') as f:
+            f.write(b'{"version": "2", "templates": [{"name": "tampered"}]}')
+
+        self.assertEqual([t['name'] for t in self.converter.stream_v2_templates(url)], ['streamcached'])
+        self.assertEqual(self.converter.cache_stats, {'hits': 0, 'misses': 2})
+        seen = [etag for path, etag in self.server.requests_seen if path == '/0/streamcached']
+        self.assertEqual(seen, [None, None])
+
+    def test_stream_source_deadline(self):
+        """Test limitu czasu źródła w trybie strumieniowym - czas konsumenta się nie liczy"""
+        self.converter.download_timeout = 0.2
+        chunks = self.converter._iter_before_deadline(iter([b'a', b'b']), time.monotonic() + 0.2)
+        for chunk in chunks:
+            time.sleep(0.3)     # przetwarzanie kawałka przez kolejne etapy
+        with self.assertRaises(requests.Timeout):
+            list(self.converter._iter_before_deadline(iter([b'a']), time.monotonic() - 1))
+
+    def test_build_unchanged_detection(self):
+        """Test wczesnego zakończenia - identyczne wejścia i nienaruszony plik wynikowy"""
+        url = f"{self.base_url}/0/manifest"
+        output_file = os.path.join(self.cache_dir.name, 'out.json')
+        self.converter.download_v2_templates(url)
+        with open(output_file, 'w') as f:
+            f.write('{}')
+
+        fingerprint = self.converter.build_fingerprint([url], output_file)
+        self.assertFalse(self.converter.is_build_unchanged(fingerprint))
+        self.converter.save_build_manifest(fingerprint)
+        self.assertTrue(self.converter.is_build_unchanged(fingerprint))
+
+        # Zmiana pliku wynikowego unieważnia manifest
+        with open(output_file, 'w') as f:
+            f.write('{"changed": true}')
+        self.assertFalse(self.converter.is_build_unchanged(fingerprint))
+
+
+class TestRetrySession(LocalServerTestCase):
+
+    handler_class = FlakySourceHandler
+
+    def setUp(self):
+        super().setUp()
+        self.converter.backoff_base = 0.01
+
+    def tearDown(self):
+        self.converter.close()
+
+    def test_transient_errors_are_retried(self):
+        """Test ponowień - przejściowe 503 nie wykluczają źródła"""
+        url = f"{self.base_url}/2/flaky"
+        data = self.converter.download_v2_templates(url)
+
+        self.assertIsNotNone(data)
+        self.assertEqual(data['templates'][0]['name'], 'flaky')
+        statuses = [r['status'] for r in self.converter.fetch_attempts]
+        self.assertEqual(statuses, [503, 503, 200])
+        self.assertTrue(all(r['seconds'] >= 0 for r in self.converter.fetch_attempts))
+
+    def test_retry_limit(self):
+        """Test limitu ponowień - po wyczerpaniu prób źródło jest pomijane"""
+        self.converter.max_retries = 1
+        self.assertIsNone(self.converter.download_v2_templates(f"{self.base_url}/5/broken"))
+        self.assertEqual(len(self.converter.fetch_attempts), 2)
+
+    def test_session_is_shared(self):
+        """Test puli połączeń - wszystkie pobrania używają jednej sesji"""
+        session = self.converter.get_session()
+        self.converter.download_multiple_sources([f"{self.base_url}/0/a", f"{self.base_url}/0/b"])
+        self.assertIs(self.converter.get_session(), session)
+
+    def test_session_created_once_across_threads(self):
+        """Test leniwej sesji - jednoczesne pierwsze wywołania z wątków tworzą jedną sesję"""
+        create_session = requests.Session
+
+        def slow_session():
+            time.sleep(0.05)
+            return create_session()
+
+        with patch.object(requests, 'Session', side_effect=slow_session) as factory:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                sessions = list(pool.map(lambda _: self.converter.get_session(), range(4)))
+        self.assertEqual(factory.call_count, 1)
+        self.assertTrue(all(session is sessions[0] for session in sessions))
+
+
+class TestStreamingIngest(LocalServerTestCase):
+
+    def test_iter_json_array_items_small_chunks(self):
+        """Test parsera strumieniowego - wynik niezależny od podziału na kawałki"""
+        document = {
+            "version": "2",
+            "templates": [{"title": f"App {i}", "ports": [i, 1.5e3], "note": "zażółć ☃"} for i in range(20)],
+            "extra": 123
+        }
+        raw = json.dumps(document, ensure_ascii=False, indent=2).encode('utf-8')
+
+        for chunk_size in (1, 3, 64, len(raw)):
+            meta = {}
+            chunks = (raw[i:i + chunk_size] for i in range(0, len(raw), chunk_size))
+            items = list(iter_json_array_items(chunks, 'templates', meta))
+            self.assertEqual(items, document['templates'])
+            self.assertEqual(meta, {"version": "2", "extra": 123})
+
+    def test_iter_json_array_items_invalid(self):
+        """Test parsera strumieniowego - niepoprawny JSON zgłasza błąd"""
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array_items([b'{"templates": [{"a": 1},]}']))
+
+    def test_stream_v2_templates_into_conversion(self):
+        """Test strumieniowego pobierania - szablony trafiają wprost do konwersji"""
+        v2_data = {}
+        v2_data['templates'] = self.converter.stream_v2_templates(f"{self.base_url}/0/streamed", meta=v2_data)
+        v3_data = self.converter.convert_v2_to_v3(v2_data)
+
+        self.assertEqual(v2_data['version'], '2')
+        self.assertEqual([t['name'] for t in v3_data['templates']], ['streamed'])
+        self.assertEqual(self.converter.source_templates_count, 1)
+
+
+class TestLocalSources(unittest.TestCase):
+
+    def setUp(self):
+        self.converter = PortainerTemplateConverter()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = {}
+        for name, opener in (('a.json', open), ('b.json.gz', gzip.open), ('c.json.xz', lzma.open)):
+            path = os.path.join(self.tmp.name, name)
+            data = {"version": "2", "templates": [{"type": 1, "title": name, "name": name, "image": "x"}]}
+            with opener(path, 'wt', encoding='utf-8') as f:
+                json.dump(data, f)
+            self.files[name] = path
+        with open(os.path.join(self.tmp.name, 'notes.txt'), 'w') as f:
+            f.write('not a template')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_plain_compressed_and_file_url(self):
+        """Test źródeł lokalnych - zwykły plik, gzip, xz i file://"""
+        for name, path in self.files.items():
+            data = self.converter.download_v2_templates(path)
+            self.assertEqual(data['templates'][0]['name'], name)
+            self.assertIn(path, self.converter.source_fingerprints)
+
+        file_url = 'file://' + self.files['a.json']
+        data = self.converter.download_v2_templates(file_url)
+        self.assertEqual(data['templates'][0]['name'], 'a.json')
+
+    @unittest.skipUnless(ZSTD_AVAILABLE, "pakiet 'zstandard' nie jest zainstalowany")
+    def test_corrupt_zstd_is_skipped(self):
+        """Test uszkodzonego pliku .zst - błąd jest zgłaszany, a źródło pomijane"""
+        path = os.path.join(self.tmp.name, 'd.json.zst')
+        compressed = zstandard.ZstdCompressor().compress(json.dumps({"version": "2", "templates": []}).encode())
+        with open(path, 'wb') as f:
+            f.write(compressed[:4] + b'\xff' * (len(compressed) - 4))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertIsNone(self.converter.download_v2_templates(path))
+        self.assertIn("Błąd odczytu pliku", output.getvalue())
+
+    def test_directory_expansion(self):
+        """Test katalogu źródłowego - rozwijany do plików v2 w kolejności nazw"""
+        expanded = self.converter.expand_sources([self.tmp.name, 'https://example.com/t.json'])
+        self.assertEqual(expanded, [self.files['a.json'], self.files['b.json.gz'],
+                                    self.files['c.json.xz'], 'https://example.com/t.json'])
+
+    def test_streaming_local_compressed(self):
+        """Test strumieniowego odczytu skompresowanego pliku lokalnego"""
+        meta = {}
+        templates = list(self.converter.stream_v2_templates(self.files['c.json.xz'], meta=meta))
+        self.assertEqual([t['name'] for t in templates], ['c.json.xz'])
+        self.assertEqual(meta['version'], '2')
+
+    def test_incremental_build_reports_template_changes(self):
+        """Test budowania przyrostowego - zbiory zmian i pominięcie budowania bez zmian w szablonach"""
+        source = os.path.join(self.tmp.name, 'incremental.json')
+        output_file = os.path.join(self.tmp.name, 'out.json')
+        self.converter.cache_dir = os.path.join(self.tmp.name, 'cache')
+        self.converter.incremental = True
+        templates = [{"type": 1, "title": f"App {i}", "name": f"app{i}", "image": f"img/app{i}", "description": "App",
+                      "categories": ["b", "a"]} for i in range(3)]
+
+        def build(templates, **dump_options):
+            with open(source, 'w', encoding='utf-8') as f:
+                json.dump({"version": "2", "templates": templates}, f, **dump_options)
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.converter.run(source_url=source, output_file=output_file)
+            return output.getvalue()
+
+        build(templates)
+        self.assertEqual(len(self.converter.template_changes['added']), 3)
+
+        # Inne formatowanie, kolejność pól i kategorii - szablony bez zmian
+        reordered = [dict(reversed(list(t.items())), categories=["a", "b"]) for t in templates]
+        log = build(reordered, indent=4)
+        self.assertIn("Brak zmian w szablonach", log)
+        self.assertNotIn("Rozpoczynanie konwersji", log)
+
+        templates[1]['description'] = 'changed'
+        log = build(templates[1:] + [{"type": 1, "title": "New", "name": "new", "image": "img/new",
+                                             "description": "New"}])
+        self.assertIn("Rozpoczynanie konwersji", log)
+        self.assertEqual(self.converter.template_changes, {
+            'added': ['new|img/new'], 'changed': ['app1|img/app1'], 'removed': ['app0|img/app0']})
+        with open(os.path.join(self.converter.cache_dir, 'template_changes.json'), encoding='utf-8') as f:
+            self.assertEqual(json.load(f), self.converter.template_changes)
+
+        # Uszkodzony stan jest pomijany - wszystkie szablony są nowe
+        state_path = os.path.join(self.converter.cache_dir, 'conversion_state.json')
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+        state['raw'][1] = state['raw'][1][:-2]
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        build(templates[1:])
+        self.assertEqual(len(self.converter.template_changes['added']), 2)
+
+    def test_resume_from_checkpoints(self):
+        """Test checkpointów - wznowienie po błędzie zapisu i po zmianie patch-y bez pobierania źródeł"""
+        sources = []
+        for n in range(2):
+            sources.append(os.path.join(self.tmp.name, f"source{n}.json"))
+            with open(sources[-1], 'w', encoding='utf-8') as f:
+                json.dump({"version": "2", "templates": [
+                    {"type": 1, "title": f"App {n}{i}", "name": f"app{n}{i}", "image": f"img/app{i}",
+                     "description": "App", "categories": [f"c{n}"]} for i in range(3)]}, f)
+        expected_file = os.path.join(self.tmp.name, 'expected.json')
+        output_file = os.path.join(self.tmp.name, 'out.json')
+
+        def build(converter, output_file):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                converter.run(multiple_sources=sources, output_file=output_file)
+            return output.getvalue()
+
+        plain = PortainerTemplateConverter()
+        plain.use_cache = False
+        build(plain, expected_file)
+
+        self.converter.cache_dir = os.path.join(self.tmp.name, 'cache')
+        self.converter.checkpoints = True
+        with patch.object(self.converter, 'save_v3_templates', side_effect=OSError('disk full')):
+            with self.assertRaises(SystemExit):
+                build(self.converter, output_file)
+        index = self.converter.load_checkpoint_index()
+        self.assertEqual(sorted(index), ['convert', 'fetch', 'merge', 'patch', 'validate'])
+
+        # Wznowienie nie pobiera źródeł
+        self.converter.resume = True
+        with patch.object(self.converter, '_fetch_sources', side_effect=AssertionError('pobieranie')):
+            log = build(self.converter, output_file)
+        self.assertIn("Wznawianie od checkpointu 'validate'", log)
+        self.assertNotIn("Rozpoczynanie konwersji", log)
+        with open(output_file, 'rb') as f, open(expected_file, 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+
+        # Zmiana patch-y - konwersja z checkpointu, patch-e i walidacja od nowa
+        with patch.object(self.converter.patch_loader, 'fingerprint', return_value='changed'):
+            log = build(self.converter, output_file)
+        self.assertIn("Wznawianie od checkpointu 'convert'", log)
+        self.assertIn("Aplikowanie patch-ów", log)
+        self.assertIn("Walidacja formatu v3", log)
+        with open(output_file, 'rb') as f, open(expected_file, 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+
+        # Zmieniony plik lokalny unieważnia checkpoint pobierania - źródła są czytane od nowa
+        with open(sources[1], 'w', encoding='utf-8') as f:
+            json.dump({"version": "2", "templates": [
+                {"type": 1, "title": "Changed", "name": "changed", "image": "img/changed",
+                 "description": "Changed"}]}, f)
+        log = build(self.converter, output_file)
+        self.assertNotIn("Checkpoint 'fetch'", log)
+        self.assertIn("Rozpoczynanie konwersji", log)
+        with open(output_file, encoding='utf-8') as f:
+            self.assertIn('changed', [t['name'] for t in json.load(f)['templates']])
+
+    def test_tampered_checkpoint_is_ignored(self):
+        """Test checkpointu w JSON - niepoprawny jest traktowany jak jego brak i nie zmienia konwertera"""
+        self.converter.cache_dir = os.path.join(self.tmp.name, 'cache')
+        self.converter.checkpoints = True
+        conversion_state = {'templates': {'app': [b'\x01' * 16]}, 'raw': {b'\x02' * 16: b'\x01' * 16},
+                            'sequence': 'abc'}
+        data = {'v3': {'version': '3', 'templates': []}, 'merge_stats': None, 'version': '2'}
+        self.converter.source_templates_count = 3
+        self.converter._conversion_state = conversion_state
+        self.converter.save_checkpoint('convert', 'key', data)
+
+        self.converter.source_templates_count, self.converter._conversion_state = 0, None
+        self.assertEqual(self.converter.load_checkpoint('convert', 'key'), data)
+        self.assertEqual(self.converter.source_templates_count, 3)
+        self.assertEqual(self.converter._conversion_state, conversion_state)
+
+        path = self.converter._checkpoint_path('convert.json')
+        with open(path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        cache_dir, patch_loader = self.converter.cache_dir, self.converter.patch_loader
+        self.converter.source_templates_count = 0
+        tampered = [
+            dict(checkpoint, state={'cache_dir': '/etc', 'patch_loader': None}),
+            dict(checkpoint, state=dict(checkpoint['state'], cache_dir='/etc')),
+            dict(checkpoint, state=dict(checkpoint['state'], source_templates_count='3')),
+            dict(checkpoint, state=dict(checkpoint['state'], _conversion_state={'templates': []})),
+            dict(checkpoint, state=[]),
+            {'key': 'key', 'data': data},
+            dict(checkpoint, data={'v3': {}}),
+            [checkpoint],
+        ]
+        for content in tampered:
+            with self.subTest(content=content):
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(content, f)
+                self.assertIsNone(self.converter.load_checkpoint('convert', 'key'))
+                self.assertEqual(self.converter.cache_dir, cache_dir)
+                self.assertIs(self.converter.patch_loader, patch_loader)
+                self.assertEqual(self.converter.source_templates_count, 0)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{broken')
+        self.assertIsNone(self.converter.load_checkpoint('convert', 'key'))
+
+    def test_streaming_pipeline_matches_list_path(self):
+        """Test potoku strumieniowego - ten sam plik co ścieżka listowa, błąd walidacji porzuca plik"""
+        sources = []
+        for n in range(2):
+            sources.append(os.path.join(self.tmp.name, f"source{n}.json"))
+            templates = [{"type": 1, "title": f"App {i}", "name": f"app{i}", "image": f"img/app{i}",
+                          "description": "App" * (n + 1), "categories": [f"c{n}"]} for i in range(4)]
+            # Ta sama nazwa z innym obrazem - deduplikacja wybiera pełniejszy szablon
+            templates.append({"type": 1, "title": "Dup", "name": "dup", "image": f"img/dup{n}",
+                              "description": "Dup", "ports": ["80/tcp"] * n})
+            templates.append({"type": 1, "title": f"No Name {n}", "image": "img/x", "description": "X",
+                              "restart_policy": "always", "platform": "linux"})
+            with open(sources[-1], 'w', encoding='utf-8') as f:
+                json.dump({"version": "2", "templates": templates}, f)
+
+        def build(stream, output_file, sources=sources):
+            converter = PortainerTemplateConverter()
+            converter.use_cache = False
+            converter.stream = stream
+            with contextlib.redirect_stdout(io.StringIO()):
+                converter.run(multiple_sources=sources, output_file=output_file)
+            return converter
+
+        expected_file = os.path.join(self.tmp.name, 'expected.json')
+        output_file = os.path.join(self.tmp.name, 'out.json')
+        build(False, expected_file)
+        converter = build(True, output_file)
+        with open(output_file, 'rb') as f, open(expected_file, 'rb') as g:
+            expected = g.read()
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(converter.source_templates_count, 8)
+        self.assertEqual(converter.output_summary['count'], len(json.loads(expected)['templates']))
+
+        # Źródło urwane w połowie jest pomijane w całości, jak na ścieżce listowej
+        truncated = os.path.join(self.tmp.name, 'truncated.json')
+        with open(truncated, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"version": "2", "templates": [
+                {"type": 1, "title": "Partial", "name": "partial", "image": "img/partial"}] * 3})[:-40])
+        build(False, expected_file, sources + [truncated])
+        converter = build(True, output_file, sources + [truncated])
+        with open(output_file, 'rb') as f, open(expected_file, 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+        self.assertEqual(converter.source_templates_count, 8)
+
+        # Szablon bez tytułu nie przechodzi schema - plik nie powstaje
+        broken = os.path.join(self.tmp.name, 'broken.json')
+        with open(broken, 'w', encoding='utf-8') as f:
+            json.dump({"version": "2", "templates": [{"type": 1, "name": "x", "image": "img/x"}]}, f)
+        failed_file = os.path.join(self.tmp.name, 'failed.json')
+        with self.assertRaises(SystemExit):
+            build(True, failed_file, [broken])
+        self.assertFalse(os.path.exists(failed_file))
+
+    def test_stream_logos_written_only_after_successful_save(self):
+        """Test ekstrakcji logo w potoku strumieniowym - pliki logo dopiero po udanym zapisie wyniku"""
+        logo = 'data:image/png;base64,' + base64.b64encode(b'\x89PNG logo').decode()
+        logos_dir = os.path.join(self.tmp.name, 'logos')
+
+        def build(templates, output_file):
+            source = os.path.join(self.tmp.name, 'logos.json')
+            with open(source, 'w', encoding='utf-8') as f:
+                json.dump({"version": "2", "templates": templates}, f)
+            converter = PortainerTemplateConverter()
+            converter.use_cache = False
+            converter.stream = True
+            converter.logo_assets_dir = logos_dir
+            converter.logo_base_url = 'https://example.com/logos'
+            with contextlib.redirect_stdout(io.StringIO()):
+                converter.run(source_url=source, output_file=output_file)
+
+        app = {"type": 1, "title": "App", "name": "app", "image": "img/app", "description": "App", "logo": logo}
+        # Szablon bez tytułu nie przechodzi walidacji - logo nie może zostać w katalogu
+        with self.assertRaises(SystemExit):
+            build([app, {"type": 1, "name": "x", "image": "img/x"}], os.path.join(self.tmp.name, 'failed.json'))
+        self.assertEqual(os.listdir(logos_dir), [])
+
+        output_file = os.path.join(self.tmp.name, 'out.json')
+        build([app], output_file)
+        files = os.listdir(logos_dir)
+        self.assertEqual(len(files), 1)
+        with open(output_file, encoding='utf-8') as f:
+            logos = [t.get('logo') for t in json.load(f)['templates']]
+        self.assertIn(f"https://example.com/logos/{files[0]}", logos)
+
+
 if __name__ == '__main__':
     print("🧪 Uruchamianie testów jednostkowych...")
     unittest.main(verbosity=2)